@@ -0,0 +1,143 @@
+"""
+End-to-end scrape throughput against the local replay server.
+
+Starts a ReplayServer, points the scrapers at it through their ARGUS_*_URL
+variables and runs whole pipelines in a scratch copy of the data directory, so
+nothing under utils/data is touched and no request leaves the machine.
+
+With --rerun every news pipeline runs a second time, and the run exits with
+status 1 when the second snapshot lost articles of the first.
+
+Usage (from the repository root):
+    python -m benchmarks.e2e cnbc stockanalysis renatus --latency 0.1 --jitter 0.05 --error-rate 0.01
+    python -m benchmarks.e2e cnbc stockanalysis --rerun
+    python -m benchmarks.e2e marketinsights   # needs the embedding model and utils/data/Scrape/worldcities.csv
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.replay_server import ReplayServer
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PIPELINES = ('cnbc', 'stockanalysis', 'marketinsights', 'renatus')
+# Data the scrapers read, copied into the scratch directory
+INPUT_DIRECTORIES = ('utils/data/Scrape',)
+OUTPUT_DIRECTORIES = ('utils/data/Scraped News', 'utils/data/Renatus Newsletter')
+
+def run_pipeline(name):
+    """Run one scraper; imported here so the modules read the replay environment."""
+    if name in ('cnbc', 'stockanalysis', 'marketinsights'):
+        from utils.pipeline import scrape_and_publish
+        df, _ = scrape_and_publish(name)
+        return len(df)
+    if name == 'renatus':
+        from utils.renatus import scrape_newsletters
+        return len(scrape_newsletters(backfill=True))
+    raise ValueError(f"Unknown pipeline: {name}")
+
+def snapshot_keys(name):
+    """Article keys (utils.snapshot_diff.KEY_COLUMNS) of the latest snapshot of a news pipeline."""
+    import pandas as pd
+    from utils.snapshot_diff import KEY_COLUMNS
+    files = glob.glob(os.path.join('utils/data/Scraped News', f"{name}_data_*.csv"))
+    if not files:
+        return set()
+    df = pd.read_csv(max(files, key=os.path.getctime), usecols=list(KEY_COLUMNS[name]))
+    return set(df.itertuples(index=False, name=None))
+
+def run(pipelines, server_options, rerun=False):
+    """
+    Time each pipeline against a fresh replay server.
+
+    :param pipelines: Names from PIPELINES.
+    :param server_options: Keyword arguments for ReplayServer.
+    :param rerun: Run every news pipeline again and count the articles its second snapshot lost.
+    :return: List of result dicts (pipeline, seconds, rows, requests, statuses, mb, error, lost).
+    """
+    results = []
+    cwd = os.getcwd()
+    sys.path.insert(0, REPOSITORY)
+    with tempfile.TemporaryDirectory() as workdir, ReplayServer(port=0, **server_options) as server:
+        for directory in INPUT_DIRECTORIES:
+            shutil.copytree(os.path.join(REPOSITORY, directory), os.path.join(workdir, directory))
+        for directory in OUTPUT_DIRECTORIES:
+            os.makedirs(os.path.join(workdir, directory), exist_ok=True)
+        os.environ.update(server.environment())
+        os.chdir(workdir)
+        try:
+            for name in pipelines:
+                server.reset_stats()
+                error, rows = None, None
+                start = time.perf_counter()
+                try:
+                    rows = run_pipeline(name)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                seconds = time.perf_counter() - start
+                from utils import metrics
+                stats = json.loads(server.stats_json())
+                statuses = {}
+                for site in stats.values():
+                    for status, count in site['statuses'].items():
+                        statuses[status] = statuses.get(status, 0) + count
+                results.append({
+                    'pipeline': name, 'seconds': seconds, 'rows': rows,
+                    'requests': sum(site['requests'] for site in stats.values()),
+                    'statuses': statuses,
+                    'mb': sum(site['bytes'] for site in stats.values()) / 1e6,
+                    'error': error,
+                    'report': metrics.current().report(),
+                    'lost': None,
+                })
+                if rerun and error is None and name != 'renatus':
+                    # A second run the same day replaces the snapshot, it must keep the first run's articles
+                    first = snapshot_keys(name)
+                    try:
+                        run_pipeline(name)
+                        results[-1]['lost'] = len(first - snapshot_keys(name))
+                    except Exception as e:
+                        results[-1]['error'] = f"rerun {type(e).__name__}: {e}"
+        finally:
+            os.chdir(cwd)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the scrapers end to end against the replay server.')
+    parser.add_argument('pipelines', nargs='*', choices=PIPELINES, default=['cnbc', 'stockanalysis', 'renatus'])
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- seconds around the latency.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500.')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second per site before answering 429.')
+    parser.add_argument('--burst', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--every-sunday', action='store_true', help='Serve a newsletter for every Sunday.')
+    parser.add_argument('--json', help='Also write the results to this file.')
+    parser.add_argument('--rerun', action='store_true', help='Run every news pipeline twice and check the second snapshot kept the first one\'s articles.')
+    args = parser.parse_args()
+
+    results = run(args.pipelines, {
+        'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate, 'rate_limit': args.rate_limit,
+        'burst': args.burst, 'seed': args.seed, 'every_sunday': args.every_sunday,
+    }, rerun=args.rerun)
+    print(f"{'pipeline':16} {'seconds':>8} {'rows':>6} {'requests':>9} {'req/s':>7} {'MB':>7}  statuses")
+    for result in results:
+        rows = '-' if result['rows'] is None else result['rows']
+        print(
+            f"{result['pipeline']:16} {result['seconds']:8.2f} {rows:>6} {result['requests']:9d} "
+            f"{result['requests'] / result['seconds']:7.1f} {result['mb']:7.2f}  {result['statuses']}"
+        )
+        if result['error']:
+            print(f"  failed: {result['error']}")
+        if result['lost']:
+            print(f"  REGRESSION: the rerun's snapshot lost {result['lost']} articles of the first run")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if any(result['lost'] or result['error'] for result in results if args.rerun):
+        sys.exit(1)
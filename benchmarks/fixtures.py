@@ -0,0 +1,269 @@
+"""
+Versioned HTML fixtures for the parser benchmarks.
+
+Every fixture is a page saved under benchmarks/fixtures/<source>/ and listed in
+manifest.json with the URL it stands for, how it was obtained, a version that
+is bumped whenever the file is replaced, and its sha256. Baselines record the
+hash they were measured on, so a replaced fixture is never silently compared
+against numbers from another page.
+
+Origins:
+    recorded   fetched live with `python -m benchmarks.fixtures record`
+    snapshot   raw HTML kept in a scraped news snapshot
+    synthetic  rebuilt from a snapshot's parsed fields in the markup the parser
+               expects, for pages whose HTML was never kept; replace them with
+               recorded pages when the sites are reachable
+
+Usage:
+    python -m benchmarks.fixtures build    # (re)build snapshot and synthetic fixtures
+    python -m benchmarks.fixtures record   # fetch LIVE_PAGES and record them
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+from ast import literal_eval
+from datetime import datetime
+
+import pandas as pd
+import requests
+
+FIXTURES_DIRECTORY = "./benchmarks/fixtures/"
+MANIFEST_PATH = "./benchmarks/fixtures/manifest.json"
+SNAPSHOT_DATE = '2024-08-26'
+SCRAPED_NEWS_DIRECTORY = "./utils/data/Scraped News/"
+RENATUS_SNAPSHOT_PATH = "./utils/data/Renatus Newsletter/renatus_04-08-2024.csv"
+PHONE_EXTENSIONS_PATH = "./utils/data/Scrape/phoneextensions.csv"
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
+}
+
+# Pages fetched by `record`, by fixture name
+LIVE_PAGES = {
+    'cnbc/listing': 'https://www.cnbc.com/ipos/',
+    'cnbc/article': 'https://www.cnbc.com/2024/08/22/hong-kong-ipos-signal-rebound-amid-cautious-optimism-says-hkex-ceo-.html',
+    'marketinsights/news_table': 'https://www.marketscreener.com/news/companies/IPO/',
+    'marketinsights/article': 'https://www.marketscreener.com/quote/stock/FUNSHINE-CULTURE-GROUP-CO-119082502/news/Certain-A-Shares-of-Beijing-FengShangShiJi-Culture-Media-Co-Ltd-are-subject-to-a-Lock-Up-Agreemen-47725386/',
+    'marketinsights/company': 'https://www.marketscreener.com/quote/stock/FUNSHINE-CULTURE-GROUP-CO-119082502/company/',
+    'marketinsights/governance': 'https://www.marketscreener.com/quote/stock/FUNSHINE-CULTURE-GROUP-CO-119082502/company-governance/',
+    'stockanalysis/news': 'https://stockanalysis.com/ipos/news/',
+    'stockanalysis/company_cava': 'https://stockanalysis.com/stocks/cava/company/',
+    'stockanalysis/company_bmy': 'https://stockanalysis.com/stocks/bmy/company/',
+    'stockanalysis/company_azi': 'https://stockanalysis.com/stocks/azi/company/',
+    'renatus/newsletter': 'https://renatus.ie/renatus-private-equity-mampa-newsletter-04-08-2024/',
+    'countrycode/countries': 'https://www.countrycode.org',
+}
+
+def fixture_path(name):
+    return os.path.join(FIXTURES_DIRECTORY, f"{name}.html")
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(manifest):
+    temp_path = f"{MANIFEST_PATH}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(temp_path, MANIFEST_PATH)
+
+def sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def save_fixture(manifest, name, text, url, origin):
+    """Write a fixture and its manifest entry, bumping the version if the content changed."""
+    os.makedirs(os.path.dirname(fixture_path(name)), exist_ok=True)
+    with open(fixture_path(name), 'w', encoding='utf-8') as f:
+        f.write(text)
+    digest = sha256(text)
+    previous = manifest.get(name, {})
+    if previous.get('sha256') == digest and previous.get('origin') == origin:
+        return
+    manifest[name] = {
+        'url': url, 'origin': origin, 'version': previous.get('version', 0) + 1, 'sha256': digest,
+        'saved_at': datetime.now().isoformat(timespec='seconds'), 'bytes': len(text.encode('utf-8')),
+    }
+
+def load_fixture(name):
+    """
+    Fixture HTML, checked against the manifest.
+
+    :param name: Fixture name, e.g. 'cnbc/listing'.
+    :return: Tuple of (html, manifest entry).
+    """
+    entry = load_manifest()[name]
+    with open(fixture_path(name), encoding='utf-8') as f:
+        text = f.read()
+    if sha256(text) != entry['sha256']:
+        raise ValueError(f"Fixture {name} does not match its manifest entry, rebuild or re-record it")
+    return text, entry
+
+def record(names=None):
+    """Fetch live pages and save them as recorded fixtures."""
+    manifest = load_manifest()
+    for name, url in LIVE_PAGES.items():
+        if names and name not in names:
+            continue
+        try:
+            response = requests.get(url, headers=HEADERS, timeout=30)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Could not record {name}: {e}")
+            continue
+        save_fixture(manifest, name, response.text, url, 'recorded')
+        print(f"Recorded {name} ({len(response.text)} characters)")
+    save_manifest(manifest)
+
+# Site chrome around the synthetic content, so parsers also have to walk the
+# navigation, scripts and footers a real page carries
+def _page(title, body, links=150):
+    nav = ''.join(f'<li class="nav-item"><a class="nav-link" href="/section/{i}/">Section {i}</a></li>' for i in range(links))
+    footer = ''.join(f'<a class="footer-link" href="/legal/{i}/">Footer link {i}</a>' for i in range(links // 3))
+    script = '<script>window.__STATE__ = {' + ','.join(f'"k{i}": {i}' for i in range(400)) + '};</script>'
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"/><title>{html.escape(title)}</title>{script}</head>'
+        f'<body><header><nav><ul>{nav}</ul></nav></header><main>{body}</main><footer>{footer}</footer></body></html>'
+    )
+
+def _latest_snapshot(source):
+    return pd.read_csv(os.path.join(SCRAPED_NEWS_DIRECTORY, f"{source}_data_{SNAPSHOT_DATE}.csv"), dtype=str, keep_default_na=False)
+
+def _paragraphs(text):
+    return ''.join(f'<p>{html.escape(line)}</p>' for line in str(text).split('\n') if line.strip())
+
+def synthetic_cnbc():
+    df = _latest_snapshot('cnbc')
+    cards = ''.join(
+        f'<div class="Card-card"><div class="Card-media"><img src="{html.escape(row.Image)}" alt=""/></div>'
+        f'<div class="Card-textContent"><a class="Card-title" href="{html.escape(row.Link)}">{html.escape(row.Title)}</a>'
+        f'<span class="Card-time">{pd.Timestamp(row.Time).strftime("%a, %b %d %Y")}</span></div></div>'
+        for row in df.itertuples()
+    )
+    listing = _page('IPOs', f'<div class="PageBuilder-pageWrapper">{cards}</div>')
+    article = _page(df['Title'].iloc[0], f'<div class="ArticleBody-articleBody">{_paragraphs(df["Article content"].iloc[0])}</div>')
+    return {'cnbc/listing': listing, 'cnbc/article': article}
+
+def synthetic_marketinsights():
+    df = _latest_snapshot('marketinsights')
+    rows = ''.join(
+        f'<tr><td><time>{pd.Timestamp(row.Time).strftime("%b. %d")}</time></td>'
+        f'<td><a class="link--blue" href="/quote/stock/{html.escape(row.ticker)}/"><span class="txt-s1">{html.escape(row.ticker)}</span></a></td>'
+        f'<td><a class="link--no-underline" href="{html.escape(row.link.replace("https://www.marketscreener.com", ""))}">{html.escape(row.title)}</a></td>'
+        f'<td><span class="badge badge--small" title="{html.escape(row.source)}">{html.escape(row.source[:3])}</span></td></tr>'
+        for row in df.itertuples()
+    )
+    news_table = _page('Companies: IPO', f'<table class="table"><tbody>{rows}</tbody></table>')
+
+    row = df[(df['People'] != '[]') & (df['Contact Information'] != '{}')].iloc[0]
+    contact = literal_eval(row['Contact Information'])
+    company = _page(contact['Company Name'], (
+        f'<div class="card"><div class="card-header">Sector</div><div class="card-content">\n{html.escape(row.Industry)}\n</div></div>'
+        f'<div class="card mb-15 pos-next"><h3 class="card-title">Company details: {html.escape(contact["Company Name"])}</h3>'
+        f'<p class="m-0">{html.escape(contact["Company Name"])}</p><p class="m-0">{html.escape(contact["Address Line 1"])}</p>'
+        f'<p class="m-0">{html.escape(contact["Address Line 2"])}</p><p class="m-0">{html.escape(contact["Phone Number"])}</p>'
+        f'<a class="m-0" href="{html.escape(contact["Website"])}">{html.escape(contact["Website"])}</a></div>'
+    ))
+
+    people = {}
+    for person in literal_eval(row['People']):
+        people.setdefault((person['Name'], person['Age']), []).append((person['Position'], person['Date']))
+    person_rows = ''.join(
+        f'<tr><td class="table-child--w240 table-child--top"><p class="m-0">{html.escape(name)}</p><p class="m-0 txt-muted">{html.escape(age)}</p></td>'
+        f'<td class="table-child--top"><table>' + ''.join(
+            f'<tr><td class="table-child--w240">{html.escape(position)}</td><td class="table-child--right table-child--w80">{html.escape(date)}</td></tr>'
+            for position, date in roles
+        ) + '</table></td></tr>'
+        for (name, age), roles in people.items()
+    )
+    governance = _page(contact['Company Name'], ''.join(
+        f'<div class="card"><div class="card-content"><table class="table"><thead><tr><th>{title}</th><th>Title</th></tr></thead>'
+        f'<tbody>{person_rows}</tbody></table></div></div>'
+        for title in ('Manager', 'Director')
+    ))
+    article = _page(row.title, f'<div class="txt-s4 article-text">{_paragraphs(row["Article content"])}</div>')
+    return {
+        'marketinsights/news_table': news_table, 'marketinsights/company': company,
+        'marketinsights/governance': governance, 'marketinsights/article': article,
+    }
+
+def synthetic_stockanalysis():
+    df = _latest_snapshot('stockanalysis')
+    articles = ''.join(
+        '<div class="gap-4 border-gray-300 bg-white p-4 shadow last:pb-1 last:shadow-none dark:border-dark-600 dark:bg-dark-800 '
+        'sm:border-b sm:px-0 sm:shadow-none sm:last:border-b-0 lg:gap-5 sm:grid sm:grid-cols-news sm:py-6">'
+        f'<img class="rounded" src="{html.escape(row["Image URL"])}" alt=""/>'
+        f'<div class="mt-1 text-sm text-faded sm:order-1 sm:mt-0" title="{pd.Timestamp(row.Time).strftime("%b %d, %Y, %I:%M %p")} EDT">{html.escape(row.Source)}</div>'
+        f'<h3 class="mb-2 mt-3 text-xl font-bold leading-snug sm:order-2 sm:mt-0 sm:leading-tight">{html.escape(row.Title)}</h3>'
+        f'<p class="overflow-auto text-[0.95rem] text-light sm:order-3">{html.escape(row.Description)}</p>'
+        + ''.join(f'<a class="ticker" href="/stocks/{ticker.strip().lower()}/">{html.escape(ticker.strip())}</a>' for ticker in row.Tickers.split(','))
+        + '</div>'
+        for _, row in df.iterrows()
+    )
+    return {'stockanalysis/news': _page('IPO News', articles)}
+
+def snapshot_stockanalysis():
+    """Company pages kept in the 'raw' column of the stockanalysis snapshot."""
+    df = _latest_snapshot('stockanalysis')
+    pages = {}
+    for ticker in ('CAVA', 'BMY', 'AZI'):
+        row = df[df['Tickers'].str.split(',').str[0].str.strip() == ticker].iloc[0]
+        pages[f'stockanalysis/company_{ticker.lower()}'] = row['raw']
+    return pages
+
+def synthetic_renatus():
+    df = pd.read_csv(RENATUS_SNAPSHOT_PATH, index_col=0).applymap(literal_eval)
+    sections = []
+    for heading in df.columns:
+        sections.append(f'<section class="elementor-section"><h2 class="elementor-heading-title">{html.escape(heading)}</h2></section>')
+        for content, links in zip(df.at['Content', heading], df.at['Links', heading]):
+            anchors = ''
+            for link in filter(None, links.split(', ')):
+                text, _, url = link.rpartition(' (')
+                anchors += f'<a href="{html.escape(url.rstrip(")"))}">{html.escape(text)}</a>'
+            sections.append(f'<section class="elementor-section"><div class="elementor-widget-text-editor">{_paragraphs(content)}<p>{anchors}</p></div></section>')
+    sections.append('<section class="elementor-section"><h2 class="elementor-heading-title">Renatus Capital Partners</h2></section>')
+    return {'renatus/newsletter': _page('Renatus Private Equity M&A Newsletter', ''.join(sections))}
+
+def synthetic_countrycode():
+    df = pd.read_csv(PHONE_EXTENSIONS_PATH, dtype=str, keep_default_na=False)
+    rows = ''.join(
+        f'<tr><td><a href="/{html.escape(country.lower().replace(" ", ""))}">{html.escape(country)}</a></td>'
+        f'<td>{html.escape(code)}</td><td>-</td><td>-</td><td>-</td><td>-</td></tr>'
+        for country, code in zip(df['COUNTRY'], df['COUNTRY CODE'])
+    )
+    table = (
+        '<table class="main-table"><thead><tr><th>COUNTRY</th><th>COUNTRY CODE</th><th>ISO CODES</th>'
+        f'<th>POPULATION</th><th>AREA KM2</th><th>GDP $USD</th></tr></thead><tbody>{rows}</tbody></table>'
+    )
+    return {'countrycode/countries': _page('Country Codes', table)}
+
+def build():
+    """(Re)build the snapshot and synthetic fixtures, leaving recorded ones in place."""
+    manifest = load_manifest()
+    for origin, builder in (
+        ('snapshot', snapshot_stockanalysis), ('synthetic', synthetic_cnbc), ('synthetic', synthetic_marketinsights),
+        ('synthetic', synthetic_stockanalysis), ('synthetic', synthetic_renatus), ('synthetic', synthetic_countrycode),
+    ):
+        for name, text in builder().items():
+            if manifest.get(name, {}).get('origin') == 'recorded':
+                continue
+            save_fixture(manifest, name, text, LIVE_PAGES[name], origin)
+            print(f"Built {name} ({origin})")
+    save_manifest(manifest)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or record the HTML fixtures used by the parser benchmarks.')
+    parser.add_argument('command', choices=['build', 'record'])
+    parser.add_argument('names', nargs='*', help='Only record these fixtures.')
+    args = parser.parse_args()
+    if args.command == 'build':
+        build()
+    else:
+        record(args.names)
@@ -0,0 +1,103 @@
+"""
+Memory ceiling of the marketinsights item extraction.
+
+Runs the per-item part of the marketinsights scrape (article, company and
+governance page of every news link) against the replay server for a small and
+a large number of distinct links, each in a fresh process, and compares how
+far their peak RSS rose above the RSS before the first item. Pages are
+reduced to their extracted fields a batch at a time (utils/parsing.py), so
+only the extracted values may grow with the number of items; the run exits with status
+1 when the large run's rise exceeds the small one's by more than
+--max-growth-kb per additional item.
+
+Usage (from the repository root):
+    python -m benchmarks.memory
+    python -m benchmarks.memory --sizes 50 1000 --max-growth-kb 40
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+from benchmarks.replay_server import ReplayServer
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_GROWTH_KB = 40  # Allowed peak RSS growth per additional item, about the size of its extracted values
+
+def peak_rss_kb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def measure(items):
+    """
+    Extract `items` distinct news links in this process.
+
+    :return: Dict with items, seconds, baseline_kb, peak_kb and growth_kb.
+    """
+    with tempfile.TemporaryDirectory() as workdir, ReplayServer(port=0) as server:
+        os.environ.update(server.environment())
+        os.chdir(workdir)
+        # Imported after the environment points the scraper at the replay server
+        import pandas as pd
+        from utils import marketinsights
+        from utils.journal import ScrapeJournal
+        from utils.parsing import ParsePool
+
+        journal = ScrapeJournal('memory', path=os.path.join(workdir, 'journal.sqlite'))
+        journal.begin()
+        df = pd.DataFrame({'link': [f"{marketinsights.BASE_URL}/quote/stock/COMPANY-{i}/news/Item-{i}/" for i in range(items)]})
+        baseline = peak_rss_kb()
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # get_industry and get_contact_information let BeautifulSoup pick the parser
+            warnings.simplefilter('ignore')
+            with ParsePool() as pool:
+                df['Article content'] = marketinsights.article_texts(df['link'].tolist(), journal, pool)
+                marketinsights.extract_company_pages(df, journal, pool)
+        seconds = time.perf_counter() - start
+        peak = peak_rss_kb()
+    return {'items': items, 'seconds': seconds, 'baseline_kb': baseline, 'peak_kb': peak, 'growth_kb': peak - baseline}
+
+def run(sizes, max_growth_kb=MAX_GROWTH_KB):
+    """
+    Measure every size in its own process and check the growth between the smallest and largest.
+
+    :return: Tuple of (results, passed).
+    """
+    results = []
+    for items in sizes:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.memory', '--child', str(items)],
+            cwd=REPOSITORY, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    small, large = min(results, key=lambda r: r['items']), max(results, key=lambda r: r['items'])
+    allowed = (large['items'] - small['items']) * max_growth_kb
+    return results, large['growth_kb'] - small['growth_kb'] <= allowed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that marketinsights item extraction runs in bounded memory.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 400], help='Numbers of distinct news links to extract.')
+    parser.add_argument('--max-growth-kb', type=float, default=MAX_GROWTH_KB, help='Allowed peak RSS growth per additional item.')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(measure(args.child)))
+        sys.exit(0)
+    results, passed = run(args.sizes, args.max_growth_kb)
+    print(f"{'items':>7} {'seconds':>8} {'baseline MB':>12} {'peak MB':>8} {'growth MB':>10} {'KB/item':>8}")
+    for result in results:
+        print(
+            f"{result['items']:7d} {result['seconds']:8.2f} {result['baseline_kb'] / 1024:12.1f} "
+            f"{result['peak_kb'] / 1024:8.1f} {result['growth_kb'] / 1024:10.1f} {result['growth_kb'] / result['items']:8.1f}"
+        )
+    if not passed:
+        print(f"REGRESSION: peak RSS grows by more than {args.max_growth_kb} KB per item")
+        sys.exit(1)
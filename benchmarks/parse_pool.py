@@ -0,0 +1,85 @@
+"""
+Parse throughput of the process pool (utils/parsing.py) by worker count.
+
+Parses a batch of recorded company and governance pages with 1, 2, ... up to
+the number of cores and reports pages per second and the speedup over one
+worker. Every worker count must return exactly the records of the
+single-process run, in the same order; the run exits with status 1 when one
+does not. Speedups only mean something on an otherwise idle machine.
+
+Usage (from the repository root):
+    python -m benchmarks.parse_pool
+    python -m benchmarks.parse_pool --pages 400 --workers 1 4 8
+"""
+import argparse
+import os
+import sys
+import time
+import urllib.parse
+import warnings
+
+from benchmarks.fixtures import load_fixture
+from utils import marketinsights, stockanalysis
+from utils.parsing import ParsePool
+
+# fixture -> parser run in the pool, as the scrapers run them
+PAGES = {
+    'marketinsights/company': marketinsights.parse_company_page,
+    'marketinsights/governance': marketinsights.parse_governance_page,
+    'stockanalysis/company_cava': stockanalysis.parse_company_page,
+    'stockanalysis/company_bmy': stockanalysis.parse_company_page,
+}
+
+def page_batch(pages):
+    """`pages` (parser, html) pairs cycling through the fixtures, grouped by parser."""
+    fixtures = list(PAGES.items())
+    batch = {}
+    for i in range(pages):
+        fixture, parser = fixtures[i % len(fixtures)]
+        html = load_fixture(fixture)[0]
+        # fetch_company_page unquotes marketinsights pages before they are parsed
+        batch.setdefault(parser, []).append(urllib.parse.unquote(html) if fixture.startswith('marketinsights') else html)
+    return batch
+
+def measure(batch, workers):
+    """
+    Parse the batch in a pool of `workers` processes.
+
+    :return: Tuple of (seconds, results); worker start-up is excluded by a warm-up map.
+    """
+    with ParsePool(workers) as pool:
+        for parser, pages in batch.items():
+            pool.map(parser, pages[:workers * 2])
+        start = time.perf_counter()
+        results = [pool.map(parser, pages) for parser, pages in batch.items()]
+        return time.perf_counter() - start, results
+
+def run(pages, worker_counts):
+    """
+    :return: True when every worker count returned the single-process results.
+    """
+    batch = page_batch(pages)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = [[parser(page) for page in parser_pages] for parser, parser_pages in batch.items()]
+        print(f"{'workers':>7} {'seconds':>8} {'pages/s':>8} {'speedup':>8}  results")
+        single = None
+        passed = True
+        for workers in worker_counts:
+            seconds, results = measure(batch, workers)
+            single = single or seconds
+            same = results == expected
+            passed = passed and same
+            print(f"{workers:7d} {seconds:8.2f} {pages / seconds:8.1f} {single / seconds:8.2f}  {'same' if same else 'DIFFERENT'}")
+    return passed
+
+if __name__ == "__main__":
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description='Measure how parse throughput scales with parse pool workers.')
+    parser.add_argument('--pages', type=int, default=200, help='Pages parsed per worker count.')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, max(1, cores // 2), cores}), help='Worker counts to measure.')
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} cores")
+    if not run(args.pages, args.workers):
+        print("REGRESSION: a worker count returned different records than the single-process parse")
+        sys.exit(1)
@@ -0,0 +1,268 @@
+"""
+Local HTTP replay server for end-to-end scrape benchmarks.
+
+Serves the benchmark fixtures for the URL shapes the scrapers request from
+CNBC, MarketScreener, stockanalysis, countrycode.org and renatus.ie, each site
+under its own prefix (http://host:port/<site>/...). Absolute links to a site
+inside served pages are rewritten to the replay prefix so follow-up requests
+stay local. Latency, jitter, server errors and 429 throttling can be injected
+to test concurrency, retries and caching reproducibly.
+
+The scrapers read their site roots from ARGUS_<SITE>_URL environment variables;
+the server prints the values to export when it starts.
+
+Usage:
+    python -m benchmarks.replay_server --port 8765 --latency 0.2 --jitter 0.05 --error-rate 0.02 --rate-limit 5
+
+GET /_stats returns request counts, statuses and bytes per site as JSON;
+GET /_reset clears them.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fixtures import LIVE_PAGES, load_fixture, load_manifest
+
+# site -> (real origin, environment variable read by the scraper)
+SITES = {
+    'cnbc': ('https://www.cnbc.com', 'ARGUS_CNBC_URL'),
+    'marketscreener': ('https://www.marketscreener.com', 'ARGUS_MARKETSCREENER_URL'),
+    'stockanalysis': ('https://stockanalysis.com', 'ARGUS_STOCKANALYSIS_URL'),
+    'countrycode': ('https://www.countrycode.org', 'ARGUS_COUNTRYCODE_URL'),
+    'renatus': ('https://renatus.ie', 'ARGUS_RENATUS_URL'),
+}
+
+# site -> [(path pattern, fixture)]; a fixture of None is resolved by the server
+ROUTES = {
+    'cnbc': [
+        (re.compile(r'^/ipos/?$'), 'cnbc/listing'),
+        (re.compile(r'^(/video)?/\d{4}/\d{2}/\d{2}/.+\.html$'), 'cnbc/article'),
+    ],
+    'marketscreener': [
+        (re.compile(r'^/news/companies/[^/]+/?$'), 'marketinsights/news_table'),
+        (re.compile(r'^/quote/stock/[^/]+/news/.+$'), 'marketinsights/article'),
+        (re.compile(r'^/quote/stock/[^/]+/company/?$'), 'marketinsights/company'),
+        (re.compile(r'^/quote/stock/[^/]+/company-governance/?$'), 'marketinsights/governance'),
+    ],
+    'stockanalysis': [
+        (re.compile(r'^/ipos/news/?$'), 'stockanalysis/news'),
+        (re.compile(r'^/stocks/(?P<ticker>[^/]+)/company/?$'), None),
+    ],
+    'countrycode': [
+        (re.compile(r'^/?$'), 'countrycode/countries'),
+    ],
+    'renatus': [
+        (re.compile(r'^/renatus-private-equity-mampa-newsletter-(?P<date>\d{2}-\d{2}-\d{4})/?$'), None),
+    ],
+}
+
+NEWSLETTER_URL_PATTERN = re.compile(r'newsletter-(\d{2}-\d{2}-\d{4})/?$')
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class ReplayServer:
+    """
+    Threaded replay server, usable as a context manager.
+
+    :param host: Interface to bind.
+    :param port: Port to bind, 0 for any free port.
+    :param latency: Seconds added to every response.
+    :param jitter: Maximum seconds randomly added to or removed from the latency.
+    :param error_rate: Fraction of requests answered with a 500.
+    :param rate_limit: Requests per second allowed per site before answering 429, None for no limit.
+    :param burst: Requests a site may make at once before throttling starts.
+    :param seed: Seed of the jitter and error draws.
+    :param every_sunday: Serve the newsletter fixture for every Sunday, not only the recorded issue dates.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit=None, burst=5, seed=0, every_sunday=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.every_sunday = every_sunday
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets = {site: TokenBucket(rate_limit, burst) for site in SITES} if rate_limit else {}
+        self._company_fixtures = sorted(name for name in load_manifest() if name.startswith('stockanalysis/company_'))
+        self._issue_dates = {
+            NEWSLETTER_URL_PATTERN.search(url).group(1)
+            for name, url in LIVE_PAGES.items() if name.startswith('renatus/')
+        }
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        # Pages are read once up front so serving never touches the disk
+        self._pages = {}
+        for fixture in load_manifest():
+            text, _ = load_fixture(fixture)
+            for site, (origin, _) in SITES.items():
+                text = text.replace(origin, f"{self.base_url}/{site}")
+            self._pages[fixture] = text.encode('utf-8')
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        """Environment variables pointing every scraper at this server."""
+        return {variable: f"{self.base_url}/{site}" for site, (_, variable) in SITES.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {site: {'requests': 0, 'bytes': 0, 'statuses': Counter()} for site in SITES}
+
+    def stats_json(self):
+        with self._lock:
+            return json.dumps({site: {**values, 'statuses': dict(values['statuses'])} for site, values in self.stats.items()}, indent=1)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def page(self, fixture):
+        """Fixture HTML with links to the real sites rewritten to the replay prefixes."""
+        return self._pages[fixture]
+
+    def resolve(self, site, path):
+        """Fixture for a request path, or None for a 404."""
+        for pattern, fixture in ROUTES.get(site, []):
+            match = pattern.match(path)
+            if not match:
+                continue
+            if fixture:
+                return fixture
+            if site == 'stockanalysis':
+                # Recorded company page if there is one, otherwise a stable pick among them
+                ticker = match.group('ticker').lower()
+                name = f'stockanalysis/company_{ticker}'
+                if name in self._company_fixtures:
+                    return name
+                return self._company_fixtures[zlib.crc32(ticker.encode()) % len(self._company_fixtures)]
+            if site == 'renatus':
+                date_str = match.group('date')
+                try:
+                    is_sunday = datetime.strptime(date_str, '%d-%m-%Y').weekday() == 6
+                except ValueError:
+                    return None
+                if date_str in self._issue_dates or (self.every_sunday and is_sunday):
+                    return 'renatus/newsletter'
+        return None
+
+    def _fault(self, site):
+        """Delay to apply and the status forced by the fault settings, if any."""
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            if site in self._buckets and not self._buckets[site].take():
+                return delay, 429
+            if self.error_rate and self._random.random() < self.error_rate:
+                return delay, 500
+        return delay, None
+
+    def _record(self, site, status, size):
+        with self._lock:
+            if site in self.stats:
+                self.stats[site]['requests'] += 1
+                self.stats[site]['bytes'] += size
+                self.stats[site]['statuses'][status] += 1
+
+    def _handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/_stats':
+                    return self.reply(200, replay.stats_json().encode('utf-8'), 'application/json')
+                if path == '/_reset':
+                    replay.reset_stats()
+                    return self.reply(200, b'{}', 'application/json')
+
+                site, _, rest = path.lstrip('/').partition('/')
+                delay, forced = replay._fault(site)
+                time.sleep(delay)
+                if forced:
+                    body, status = f'Replay fault {forced}'.encode('utf-8'), forced
+                else:
+                    fixture = replay.resolve(site, '/' + rest)
+                    if fixture:
+                        body, status = replay.page(fixture), 200
+                    else:
+                        body, status = b'Not found', 404
+                replay._record(site, status, len(body))
+                self.reply(status, body)
+
+            def reply(self, status, body, content_type='text/html; charset=utf-8'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay recorded pages for the scrapers without network access.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- seconds around the latency.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500.')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests per second per site before answering 429.')
+    parser.add_argument('--burst', type=int, default=5, help='Requests per site allowed at once under the rate limit.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--every-sunday', action='store_true', help='Serve a newsletter for every Sunday.')
+    args = parser.parse_args()
+    server = ReplayServer(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                          args.rate_limit, args.burst, args.seed, args.every_sunday)
+    print(f"Replaying fixtures on {server.base_url}, point the scrapers at it with:")
+    for variable, value in server.environment().items():
+        print(f"  export {variable}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
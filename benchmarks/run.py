@@ -0,0 +1,224 @@
+"""
+Offline parser benchmarks.
+
+Runs every parser against the HTML fixtures in benchmarks/fixtures/ and
+measures time per page, throughput and allocations (tracemalloc). Results are
+compared with benchmarks/baselines.json and the run exits with status 1 when a
+benchmark is slower or allocates more than the tolerance allows, extracts a
+different number of items, or was baselined on another version of its fixture.
+
+Baselines are machine specific: record them on the machine that runs the
+comparison.
+
+Usage (from the repository root):
+    python -m benchmarks.run                # compare against the baselines
+    python -m benchmarks.run --update       # store the current results as baselines
+    python -m benchmarks.run cnbc renatus   # only benchmarks whose name contains these
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+import urllib.parse
+import warnings
+
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import load_fixture
+from utils import cnbc, marketinsights, renatus, stockanalysis
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
+
+BASELINES_PATH = "./benchmarks/baselines.json"
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+
+def _marketinsights_soup(html):
+    # Same parse as marketinsights.parse_company_page
+    return BeautifulSoup(urllib.parse.unquote(html), 'html.parser')
+
+def _stockanalysis_soup(html):
+    # Same parse as stockanalysis.parse_company_page
+    return BeautifulSoup(html, 'html.parser')
+
+@functools.lru_cache(maxsize=None)
+def _news_table_dates(html):
+    # Parsed once, the benchmark only times the timestamp normalisation
+    return marketinsights.parse_news_table(html)['date']
+
+def _marketinsights_times(html):
+    # Repeated index labels, as listings concatenated without ignore_index have;
+    # values are matched by position, so this must parse every row
+    dates = pd.concat([_news_table_dates(html)] * 3)
+    times = normalize_timestamps(dates, pd.Timestamp('2024-08-26 12:00', tz='UTC'), SOURCE_TIMEZONES['marketinsights'])
+    return times.dropna().tolist()
+
+def _renatus_sections(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return [renatus.process_section(section) for section in soup.find_all('section')]
+
+# name -> (fixture, function of the page HTML); every function parses the page
+# from scratch, as the scrapers do
+BENCHMARKS = {
+    'cnbc.parse_listing': ('cnbc/listing', cnbc.parse_listing),
+    'cnbc.parse_article': ('cnbc/article', cnbc.parse_article),
+    'marketinsights.parse_news_table': ('marketinsights/news_table', marketinsights.parse_news_table),
+    'marketinsights.parse_article_text': ('marketinsights/article', marketinsights.parse_article_text),
+    'marketinsights.scrape_tables': ('marketinsights/governance', lambda html: marketinsights.scrape_tables(_marketinsights_soup(html))),
+    'marketinsights.get_contact_information': ('marketinsights/company', marketinsights.get_contact_information),
+    'marketinsights.get_industry': ('marketinsights/company', marketinsights.get_industry),
+    'marketinsights.normalize_timestamps[dupes]': ('marketinsights/news_table', _marketinsights_times),
+    'stockanalysis.parse_latest_news': ('stockanalysis/news', stockanalysis.parse_latest_news),
+    'stockanalysis.get_key_executives[cava]': ('stockanalysis/company_cava', lambda html: stockanalysis.get_key_executives(_stockanalysis_soup(html))),
+    'stockanalysis.get_key_executives[bmy]': ('stockanalysis/company_bmy', lambda html: stockanalysis.get_key_executives(_stockanalysis_soup(html))),
+    'stockanalysis.get_key_executives[azi]': ('stockanalysis/company_azi', lambda html: stockanalysis.get_key_executives(_stockanalysis_soup(html))),
+    'renatus.process_section': ('renatus/newsletter', _renatus_sections),
+    'renatus.parse_newsletter': ('renatus/newsletter', lambda html: renatus.parse_newsletter(html)[1]),
+}
+
+def count_items(result):
+    """Size of a parser result, used to catch parsers that silently stop extracting."""
+    if result is None:
+        return 0
+    if isinstance(result, str):
+        return len(result)
+    if hasattr(result, 'shape'):
+        return int(result.shape[0] * result.shape[1])
+    return len(result)
+
+def measure(function, html, repeat=5, min_time=0.2):
+    """
+    Time and trace one parser on one page.
+
+    Each of `repeat` rounds calls the parser until `min_time` seconds have
+    passed; the fastest round's time per call is reported, as it is the least
+    disturbed by other load on the machine. Allocations come from a
+    separate traced call so tracing does not inflate the timings.
+
+    :return: Dict with seconds, pages_per_second, mb_per_second, peak_kb, allocated_kb and items.
+    """
+    result = function(html)  # warm-up, also gives the item count
+    rounds = []
+    for _ in range(repeat):
+        calls, start = 0, time.perf_counter()
+        while True:
+            function(html)
+            calls += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        rounds.append(elapsed / calls)
+    seconds = min(rounds)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        function(html)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+
+    size_mb = len(html.encode('utf-8')) / 1e6
+    return {
+        'seconds': seconds,
+        'pages_per_second': 1 / seconds,
+        'mb_per_second': size_mb / seconds,
+        'peak_kb': peak / 1024,
+        'allocated_kb': allocated / 1024,
+        'items': count_items(result),
+    }
+
+def compare(name, result, baseline, time_tolerance, memory_tolerance):
+    """Reasons the result is a regression against its baseline (empty when it is not)."""
+    if baseline is None:
+        return []
+    problems = []
+    if baseline['fixture_sha256'] != result['fixture_sha256']:
+        problems.append(f"fixture changed since the baseline (v{baseline['fixture_version']} -> v{result['fixture_version']}), rerun with --update")
+        return problems
+    if result['items'] != baseline['items']:
+        problems.append(f"extracted {result['items']} items, baseline {baseline['items']}")
+    if result['seconds'] > baseline['seconds'] * (1 + time_tolerance):
+        problems.append(f"{result['seconds'] * 1000:.2f} ms per page, baseline {baseline['seconds'] * 1000:.2f} ms")
+    if result['peak_kb'] > baseline['peak_kb'] * (1 + memory_tolerance):
+        problems.append(f"{result['peak_kb']:.0f} KB peak, baseline {baseline['peak_kb']:.0f} KB")
+    return problems
+
+def load_baselines(path=BASELINES_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baselines(baselines, path=BASELINES_PATH):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(baselines, f, indent=1, sort_keys=True)
+        f.write('\n')
+    os.replace(temp_path, path)
+
+def run(filters=(), update=False, repeat=5, min_time=0.2, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Run the benchmarks and report them against the baselines.
+
+    :param filters: Only run benchmarks whose name contains one of these.
+    :param update: Store the results as the new baselines instead of comparing.
+    :return: Number of regressions found.
+    """
+    baselines = load_baselines()
+    regressions = 0
+    print(f"{'benchmark':44} {'ms/page':>9} {'pages/s':>9} {'MB/s':>7} {'peak KB':>9} {'alloc KB':>9} {'items':>7}  vs baseline")
+    for name, (fixture, function) in BENCHMARKS.items():
+        if filters and not any(f in name for f in filters):
+            continue
+        html, entry = load_fixture(fixture)
+        with warnings.catch_warnings():
+            # get_industry and get_contact_information let BeautifulSoup pick the parser
+            warnings.simplefilter('ignore')
+            result = measure(function, html, repeat, min_time)
+            baseline = baselines.get(name)
+            if not update and baseline and result['seconds'] > baseline['seconds'] * (1 + time_tolerance):
+                # Confirm a slowdown before reporting it, a busy machine can slow one run down
+                result['seconds'] = min(result['seconds'], measure(function, html, repeat, min_time)['seconds'])
+                result['pages_per_second'] = 1 / result['seconds']
+                result['mb_per_second'] = len(html.encode('utf-8')) / 1e6 / result['seconds']
+        result.update({'fixture': fixture, 'fixture_version': entry['version'], 'fixture_sha256': entry['sha256']})
+
+        if update:
+            baselines[name] = result
+            change = 'updated'
+        elif baseline is None:
+            change = 'no baseline'
+        else:
+            change = f"{(result['seconds'] / baseline['seconds'] - 1) * 100:+.0f}% time, {(result['peak_kb'] / baseline['peak_kb'] - 1) * 100:+.0f}% peak"
+        print(
+            f"{name:44} {result['seconds'] * 1000:9.2f} {result['pages_per_second']:9.1f} {result['mb_per_second']:7.2f} "
+            f"{result['peak_kb']:9.0f} {result['allocated_kb']:9.0f} {result['items']:7d}  {change}"
+        )
+        if not update:
+            for problem in compare(name, result, baseline, time_tolerance, memory_tolerance):
+                print(f"  REGRESSION {name}: {problem}")
+                regressions += 1
+    if update:
+        save_baselines(baselines)
+        print(f"Baselines saved to {BASELINES_PATH}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the HTML parsers against recorded fixtures.')
+    parser.add_argument('filters', nargs='*', help='Only run benchmarks whose name contains one of these.')
+    parser.add_argument('--update', action='store_true', help='Store the results as the new baselines.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed rounds per benchmark.')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per timed round.')
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE, help='Allowed slowdown, e.g. 0.25 for 25%%.')
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help='Allowed growth of peak allocations.')
+    args = parser.parse_args()
+    regressions = run(args.filters, args.update, args.repeat, args.min_time, args.time_tolerance, args.memory_tolerance)
+    sys.exit(1 if regressions else 0)
@@ -1,20 +1,15 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-from utils.pipeline import load_or_scrape_file
-from utils.marketinsights import safe_literal_eval
-from xlsxwriter import Workbook
-from io import BytesIO
-
-def to_excel(df1, df2, df3):
-    output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df1.to_excel(writer, index=False, sheet_name='CNBC')
-    df2.to_excel(writer, index=False, sheet_name='Market Insights')
-    df3.to_excel(writer, index=False, sheet_name='Stock Analysis')
-    writer.close()
-    processed_data = output.getvalue()
-    return processed_data
+from datetime import timedelta
+import os
+from utils.data_access import load_latest_news, latest_news_file, load_unique_values, snapshot_key
+from utils.data_access import load_ipo_data, load_cb_deals, load_company_ids, news_company_ids, company_names, CB_DEALS_PATH
+from utils.data_access import load_changed_rows
+from utils.snapshot_diff import last_visit, record_visit
+from utils.jobs import enqueue
+from utils.export import export_widget
+from utils.tables import paginated_table
+from utils.render_timing import render_timer
 
 st.set_page_config(  # Alternate names: setup_page, page, layout
 	layout="wide",  # Can be "centered" or "wide". In the future also "dashboard", etc.
@@ -22,6 +17,7 @@ st.set_page_config(  # Alternate names: setup_page, page, layout
 	page_title='News',  # String or None. Strings get appended with "• Streamlit". 
 	page_icon=None,  # String, anything supported by st.image, or None.
 )
+timer = render_timer()
 
 
 # Streamlit dashboard
@@ -30,42 +26,80 @@ st.write("---")
 
 st.sidebar.header("Filter News")
 max_days = st.sidebar.slider("Select how many past days of news to display:", 1, 7, 7)
-cutoff_date = datetime.now() - timedelta(days=max_days + 7) #Temporary measure to display more news until scheduler is up
+cutoff_date = pd.Timestamp.now(tz='UTC') - timedelta(days=max_days + 7) #Temporary measure to display more news until scheduler is up
 
 load_news_button = st.sidebar.button("Load News")
 source = st.sidebar.radio("Choose a news source", ("CNBC", "Market Insights", "Stock Analysis"))
+# Visits are only remembered for a named visitor, kept in the URL so a bookmark finds them again
+visitor = st.sidebar.text_input("Your name, to remember your visits", value=st.experimental_get_query_params().get('user', [''])[0]).strip()
+if visitor:
+    st.experimental_set_query_params(user=visitor)
+only_new = st.sidebar.checkbox("Only new since my last visit", disabled=not visitor)
+
+# The snapshots seen on the previous visit stay the baseline for the whole session,
+# the ones shown now become the baseline of the next visit
+visit_baseline = {}
+if visitor:
+    visit_baselines = st.session_state.get('visit_baselines', {})
+    if visitor not in visit_baselines:
+        visit_baselines[visitor] = {}
+        for selection in ('cnbc', 'marketinsights', 'stockanalysis'):
+            visit_baselines[visitor][selection] = last_visit(visitor, selection)
+            if latest_news_file(selection):
+                record_visit(visitor, selection, latest_news_file(selection))
+        st.session_state['visit_baselines'] = visit_baselines
+    visit_baseline = visit_baselines[visitor]
+
+news_columns = {
+    'CNBC': ['Time', 'Title', 'Article content', 'Link'],
+    'Market Insights': ['Time', 'title', 'Article content', 'ticker', 'People', 'Country', 'Industry', 'link'],
+    'Stock Analysis': ['Time', 'Title', 'Description', 'Tickers', 'Executives', 'Country', 'Industry', 'Image URL'],
+}
+
+def load_news(source_name):
+    # Cached per snapshot file, so reruns only pay for the date filter below
+    selection = source_name.replace(' ', '').lower()
+    df = load_latest_news(selection, news_columns[source_name])
+    if df is None:
+        # Scraping happens in the worker process, ask it for a first snapshot
+        enqueue(selection)
+        st.sidebar.info(f"No {source_name} news has been scraped yet, a scrape has been queued.")
+        return pd.DataFrame({column: pd.Series(dtype='datetime64[ns, UTC]' if column == 'Time' else 'object') for column in news_columns[source_name]})
+    df = df[df['Time'] >= cutoff_date][news_columns[source_name]]
+    baseline = visit_baseline.get(selection)
+    if only_new and baseline:
+        # Added and updated articles only, from the snapshot hashes
+        df = df[df.index.isin(load_changed_rows(selection, baseline[1]))]
+    return df
+
+df1 = load_news('CNBC')
+df2 = load_news('Market Insights')
+df3 = load_news('Stock Analysis')
+timer.lap('load data')
 
-for source2 in ("CNBC", "Market Insights", "Stock Analysis"):
-    # Filter the DataFrame based on the selected number of days
-    if source2 == 'CNBC':
-        df1 = load_or_scrape_file(source2.replace(' ', '').lower())
-        df1['Time'] = pd.to_datetime(df1['Time'])
-        df1 = df1[df1['Time'] >= cutoff_date][['Time', 'Title', 'Article content', 'Link']]
-    if source2 == 'Market Insights':
-        df2 = load_or_scrape_file(source2.replace(' ', '').lower())
-        df2['Time'] = pd.to_datetime(df2['Time'])
-        df2 = df2[df2['Time'] >= cutoff_date][['Time', 'title', 'Article content', 'ticker', 'People', 'Country', 'Industry', 'link']]
-    if source2 == 'Stock Analysis':
-        df3 = load_or_scrape_file(source2.replace(' ', '').lower())
-        df3['Time'] = pd.to_datetime(df3['Time'])
-        df3 = df3[df3['Time'] >= cutoff_date][['Time', 'Title', 'Description', 'Tickers', 'Executives', 'Country', 'Industry', 'Image URL']]
-# Filter dataframes
 # Get unique industries and countries from both dataframes
-unique_industries = pd.concat([df2['Industry'], df3['Industry']]).unique()
-unique_countries = pd.concat([df2['Country'], df3['Country']]).unique()
+def snapshot_unique_values(column):
+    values = set()
+    for selection in ('marketinsights', 'stockanalysis'):
+        latest_file = latest_news_file(selection)
+        if latest_file:
+            values.update(load_unique_values(latest_file, column))
+    return sorted(values)
+
+unique_industries = snapshot_unique_values('Industry')
+unique_countries = snapshot_unique_values('Country')
 
 default = {'Ireland', 'United Kingdom', 'Turkey', 'Sweden', 'Guernsey', 'Switzerland', 'Luxembourg', 'Monaco', 'Hong Kong', 'Singapore', 'Unknown'}
 
 selected_industries = st.sidebar.multiselect("Select Industry", ["All"] + list(unique_industries), default=["All"])
 selected_countries = st.sidebar.multiselect("Select Country", ["All", "Default"] + list(unique_countries), default=["All"])
+timer.lap('widgets')
 
-def explode_col(col_name):
-    if col_name != col_name:
-        return list(safe_literal_eval(col_name).values())
-    else:
-        return col_name
-    
+# Keep the news loaded across reruns so filter and export widgets don't hide it again
 if load_news_button:
+    st.session_state['news_loaded'] = True
+
+if st.session_state.get('news_loaded'):
         # Apply filters
     if "All" not in selected_industries:
         df2 = df2[df2['Industry'].isin(selected_industries)]
@@ -85,15 +119,47 @@ if load_news_button:
         filtered_news_df = df2
     if source == 'Stock Analysis':
         filtered_news_df = df3
-    # Display the entire filtered dataframe
-    st.dataframe(filtered_news_df)
-
-    excel_data = to_excel(df1,df2,df3)
-    st.download_button(
-        label="Download Excel",
-        data=excel_data,
-        file_name=f"filtered_data_{cutoff_date}.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    timer.lap('filter')
+    baseline = visit_baseline.get(source.replace(' ', '').lower())
+    if only_new:
+        if baseline:
+            st.caption(f"{len(filtered_news_df)} articles added or updated since the snapshot of your last visit ({baseline[0]['snapshot']}).")
+        else:
+            st.caption("No earlier visit recorded, showing all articles.")
+    # Display the filtered dataframe one page at a time
+    paginated_table(filtered_news_df, key=f"news_{source}", text_columns=['Title', 'title', 'Article content', 'Description', 'People', 'Executives'])
+    timer.lap('tables')
+
+    # IPOs and deals of a company in the table, joined on the company index ids
+    if source != 'CNBC' and not filtered_news_df.empty:
+        with st.expander("Company history"):
+            ids = news_company_ids(filtered_news_df, source.replace(' ', '').lower()).dropna().unique()
+            companies = company_names(ids)
+            company_id = st.selectbox("Company", list(companies), format_func=companies.get, key=f"company_{source}")
+            if company_id is not None:
+                ipo_df = load_ipo_data()
+                st.write("IPOs")
+                st.dataframe(ipo_df[(load_company_ids('ipo') == company_id).fillna(False)], hide_index=True)
+                if os.path.exists(CB_DEALS_PATH):
+                    deals_df = load_cb_deals()
+                    st.write("Deals")
+                    st.dataframe(deals_df[(load_company_ids('deals') == company_id).fillna(False)], hide_index=True)
+        timer.lap('company history')
+
+    # The export is only generated when requested, and cached per snapshot and filter state
+    export_state = (
+        tuple(latest_news_file(selection) and snapshot_key(latest_news_file(selection)) for selection in ('cnbc', 'marketinsights', 'stockanalysis')),
+        cutoff_date.date(), tuple(selected_industries), tuple(selected_countries),
+        only_new, tuple(baseline and (baseline[0]['snapshot'], baseline[0]['mtime_ns']) for baseline in visit_baseline.values()),
+    )
+    export_widget(
+        lambda: {'CNBC': df1, 'Market Insights': df2, 'Stock Analysis': df3},
+        export_state,
+        f"filtered_data_{cutoff_date.date()}",
+        key='news_export',
     )
+    timer.lap('export')
 else:
-    st.write(f"Select a news lookback period in the sidebar to load the news!")
\ No newline at end of file
+    st.write(f"Select a news lookback period in the sidebar to load the news!")
+
+timer.render()
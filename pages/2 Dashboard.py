@@ -3,7 +3,12 @@ import streamlit as st
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from io import BytesIO
+from utils.export import export_widget
+from utils.tables import paginated_table
+from utils.filters import resolve_mask
+from utils.cube import slice_cube, daily_totals, choose_bucket, bucket_totals, BUCKETS, MAX_CHART_POINTS
+from utils.render_timing import render_timer
+from utils.data_access import load_cb_deals, load_ipo_data, load_deal_cube, load_ipo_cube, load_deal_mask_index, load_ipo_mask_index, load_unique_values, snapshot_key, CB_DEALS_PATH, IPO_DATASET_PATH
 
 st.set_page_config(  # Alternate names: setup_page, page, layout
 	layout="wide",  # Can be "centered" or "wide". In the future also "dashboard", etc.
@@ -11,23 +16,18 @@ st.set_page_config(  # Alternate names: setup_page, page, layout
 	page_title='Historical Dashboard 🔍',  # String or None. Strings get appended with "• Streamlit". 
 	page_icon=None,  # String, anything supported by st.image, or None.
 )
+timer = render_timer()
 
-def to_excel(df1, df2):
-    output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df1.to_excel(writer, index=False, sheet_name='Deals')
-    df2.to_excel(writer, index=False, sheet_name='IPOs')
-    writer.close()
-    processed_data = output.getvalue()
-    return processed_data
+# Load the data (parsed once per snapshot and shared across reruns and sessions)
+cb_deals = load_cb_deals()
+ipo_data = load_ipo_data()
+deal_cube = load_deal_cube()
+ipo_cube = load_ipo_cube()
+deal_index = load_deal_mask_index()
+ipo_index = load_ipo_mask_index()
+timer.lap('load data')
 
-# Load the data
-cb_deals = pd.read_csv('./utils/data/CB Insights/cleaned_cb_deals.csv')
-ipo_data = pd.read_csv('./utils/data/IPO dataset/ipo_dataset.csv')
-
-# Ensure 'Deal Date' is in datetime format
-cb_deals['Deal Date'] = pd.to_datetime(cb_deals['Deal Date'])
-ipo_data['IPO Date'] = pd.to_datetime(ipo_data['IPO Date'])
+deal_text_columns = ['Companies', 'Description', 'All People', 'All Investors']
 
 # Streamlit app
 st.title("Historical Dashboard 🔍")
@@ -37,49 +37,41 @@ st.sidebar.title("Filters")
 st.sidebar.header("Deals")
 
 # Multiselect with 'All' option for Industry
-all_industries = ['All'] + sorted(list(map(lambda x:str(x), cb_deals['Industry'].unique())))
+all_industries = ['All'] + load_unique_values(CB_DEALS_PATH, 'Industry')
 selected_industries = st.sidebar.multiselect("Select Industry", all_industries, default=["All"])
 
 # Multiselect with 'All' option for Country
-all_countries = ['All'] + sorted(list(map(lambda x:str(x), cb_deals['Country'].unique())))
+all_countries = ['All'] + load_unique_values(CB_DEALS_PATH, 'Country')
 selected_countries = st.sidebar.multiselect("Select Country", all_countries, default=["All"])
 
 # Entry box for minimum deal size
 min_deal_size = st.sidebar.number_input("Minimum Deal Size (M)", min_value=0, step=1, value=0)
 
 # Multiselect with 'All' option for Country
-investment_stage = ['All'] + sorted(list(set(map(lambda x: str(x).split('-')[0].strip(), cb_deals['Investment Stage']))))
+investment_stage = ['All'] + load_unique_values(CB_DEALS_PATH, 'Investment Stage', transform='stage')
 selected_stage = st.sidebar.multiselect("Select Investment Stages", investment_stage, default=["All"])
 
 # Sidebar filters
 st.sidebar.header("IPOs")
 
 # Multiselect with 'All' option for IPO Industry
-all_ipo_industries = ['All'] + sorted(list(map(lambda x:str(x), ipo_data['Industry'].unique())))
+all_ipo_industries = ['All'] + load_unique_values(IPO_DATASET_PATH, 'Industry')
 selected_ipo_industries = st.sidebar.multiselect("Select IPO Industry", all_ipo_industries, default=["All"])
 
 # Multiselect with 'All' option for IPO Country
-all_ipo_countries = ['All'] + sorted(list(map(lambda x:str(x), ipo_data['Country'].unique())))
+all_ipo_countries = ['All'] + load_unique_values(IPO_DATASET_PATH, 'Country')
 selected_ipo_countries = st.sidebar.multiselect("Select IPO Country", all_ipo_countries, default=["All"])
+timer.lap('widgets')
 
-# Apply filters
-filtered_deals = cb_deals.copy()
-if "All" not in selected_industries:
-    filtered_deals = filtered_deals[filtered_deals['Industry'].isin(selected_industries)]
-if "All" not in selected_countries:
-    filtered_deals = filtered_deals[filtered_deals['Country'].isin(selected_countries)]
-if "All" not in selected_stage:
-    filtered_deals = filtered_deals[filtered_deals['Investment Stage'].apply(lambda x: x.split('-')[0].strip()).isin(selected_stage)]
-
-filtered_deals = filtered_deals.dropna(subset=['Deal Size (M)'])  # Drop rows where 'Deal Size (M)' is NaN
-filtered_deals = filtered_deals[filtered_deals['Deal Size (M)'] >= min_deal_size]
+# Apply filters by combining the per-value masks precomputed at load
+deal_mask = resolve_mask(deal_index, {'Industry': selected_industries, 'Country': selected_countries, 'Stage': selected_stage}, len(cb_deals))
+deal_mask &= cb_deals['Deal Size (M)'].to_numpy() >= min_deal_size  # Also drops rows where 'Deal Size (M)' is NaN
+filtered_deals = cb_deals[deal_mask]
 
 # Filter IPOs based on selected filters
-filtered_ipos = ipo_data.copy()
-if "All" not in selected_ipo_industries:
-    filtered_ipos = filtered_ipos[filtered_ipos['Industry'].isin(selected_ipo_industries)]
-if "All" not in selected_ipo_countries:
-    filtered_ipos = filtered_ipos[filtered_ipos['Country'].isin(selected_ipo_countries)]
+ipo_mask = resolve_mask(ipo_index, {'Industry': selected_ipo_industries, 'Country': selected_ipo_countries}, len(ipo_data))
+filtered_ipos = ipo_data[ipo_mask]
+timer.lap('filter')
 
 # Date range selection
 date_string = "2024-04-19"
@@ -92,6 +84,7 @@ selected_date_range = None
 
 # Date input widget
 selected_date_range = st.date_input("Select date range:", value=(start_date, end_date))
+selected_granularity = st.selectbox("Chart granularity:", ['Auto'] + list(BUCKETS), index=0)
 
 # Convert selected_date_range to datetime format
 try:
@@ -110,76 +103,97 @@ try:
             (filtered_ipos['IPO Date'] >= start_date_dt) &
             (filtered_ipos['IPO Date'] <= end_date_dt)
         ]
+        timer.lap('filter')
 
         
 
-        # Create a dataframe to count deals and IPOs per day
-        deal_counts = deals_in_range.groupby(deals_in_range['Deal Date'].dt.date).size()
-        ipo_counts = ipos_in_range.groupby(ipo_data['IPO Date'].dt.date).size()
-
-        # Ensure all dates between start_date_dt and end_date_dt are included
-        all_dates = pd.date_range(start=start_date_dt, end=end_date_dt, freq='D')
+        # Count deals and IPOs per day from the pre-aggregated cubes, without scanning raw rows
+        deal_slice = slice_cube(deal_cube, {'Industry': selected_industries, 'Country': selected_countries, 'Stage': selected_stage}, start_date_dt, end_date_dt, min_size=min_deal_size)
+        ipo_slice = slice_cube(ipo_cube, {'Industry': selected_ipo_industries, 'Country': selected_ipo_countries}, start_date_dt, end_date_dt)
+        deal_counts = daily_totals(deal_slice, 'Deals', start_date_dt, end_date_dt)
+        ipo_counts = daily_totals(ipo_slice, 'IPOs', start_date_dt, end_date_dt)
         daily_counts = pd.DataFrame({
-            'Date': all_dates,
-            'Number of Deals': deal_counts.reindex(all_dates, fill_value=0).values,
-            'Number of IPOs': ipo_counts.reindex(all_dates, fill_value=0).values
+            'Date': deal_counts.index,
+            'Number of Deals': deal_counts.values,
+            'Number of IPOs': ipo_counts.values
         })
+        timer.lap('aggregate')
 
-        # Plot number of deals and IPOs per day in the selected date range using plotly
+        # Bucket the counts so the number of bars sent to the browser stays capped on long ranges
+        bucket = choose_bucket(start_date_dt, end_date_dt, requested=selected_granularity)
+        if selected_granularity not in ('Auto', bucket):
+            st.caption(f"{selected_granularity} buckets would exceed {MAX_CHART_POINTS} bars for this range, showing {bucket.lower()}s instead. Narrow the date range to drill down.")
+        bucketed_deals = bucket_totals(deal_counts, bucket)
+        bucketed_ipos = bucket_totals(ipo_counts, bucket)
+
+        # Plot number of deals and IPOs per bucket in the selected date range using plotly
         fig = go.Figure()
-        fig.add_trace(go.Bar(x=daily_counts['Date'], y=daily_counts['Number of Deals'], name='Number of Deals'))
-        fig.add_trace(go.Bar(x=daily_counts['Date'], y=daily_counts['Number of IPOs'], name='Number of IPOs'))
-        fig.update_layout(title='Number of Deals and IPOs per Day', xaxis_title='Date', yaxis_title='Count', barmode='stack', width = 1500)
-        st.plotly_chart(fig)
+        fig.add_trace(go.Bar(x=bucketed_deals.index, y=bucketed_deals.values, name='Number of Deals'))
+        fig.add_trace(go.Bar(x=bucketed_ipos.index, y=bucketed_ipos.values, name='Number of IPOs'))
+        fig.update_layout(title=f'Number of Deals and IPOs per {bucket}', xaxis_title='Date', yaxis_title='Count', barmode='stack')
+        st.plotly_chart(fig, use_container_width=True)
+        timer.lap('figures')
 
         selected_date = st.date_input("Select a Date to display deals:", value=daily_counts['Date'].min(), min_value=daily_counts['Date'].min(), max_value=daily_counts['Date'].max())
         selected_date = selected_date if selected_date else None
 
+        # Remember the displayed date so the export widgets below survive their own reruns
         if st.button("Display Deals"):
+            st.session_state['displayed_deals_date'] = selected_date
+        if st.session_state.get('displayed_deals_date', False) == selected_date:
             if selected_date:
                 deals_of_the_day = deals_in_range[
                     (deals_in_range['Deal Date'].dt.date > selected_date - timedelta(days=1)) &
                     (deals_in_range['Deal Date'].dt.date < selected_date + timedelta(days=1))
                 ]
+                timer.lap('filter')
                 if not deals_of_the_day.empty:
                     deals_of_the_day['Deal Size (M)'] = deals_of_the_day['Deal Size (M)'].astype(int)
                     st.write(f"Deals of the Day for {selected_date}:")
                     if 'All' in selected_industries:
-                        st.table(deals_of_the_day[['Deal Size (M)', 'Companies', 'Company Status', 'Industry', 'Description', 'All People', 'All Investors']].assign(hack='').set_index('hack'))
+                        paginated_table(deals_of_the_day[['Deal Size (M)', 'Companies', 'Company Status', 'Industry', 'Description', 'All People', 'All Investors']], key='deals', text_columns=deal_text_columns, static=True)
                     else:
                         for industry in selected_industries:
                             temp = deals_of_the_day[deals_of_the_day['Industry'] == industry]
                             if len(temp) > 0:
                                 st.header(f"{industry}")
-                                st.table(temp[['Deal Size (M)', 'Companies', 'Company Status', 'Description', 'All People', 'All Investors']].assign(hack='').set_index('hack'))
+                                paginated_table(temp[['Deal Size (M)', 'Companies', 'Company Status', 'Description', 'All People', 'All Investors']], key=f"deals_{industry}", text_columns=deal_text_columns, static=True)
                 else:
                     st.write(f"No deals around {selected_date}.")
+                timer.lap('tables')
                 # Display IPOs for the selected date
                 ipos_of_the_day = ipos_in_range[
                     (ipo_data['IPO Date'].dt.date > selected_date - timedelta(days=1)) &
                     (ipo_data['IPO Date'].dt.date < selected_date + timedelta(days=1))
                 ]
+                timer.lap('filter')
                 if not ipos_of_the_day.empty:
                     st.write(f"IPOs on {selected_date}:")
-                    st.table(ipos_of_the_day[['Company Name', 'Industry', 'Description', 'Related People']].assign(hack='').set_index('hack'))
+                    paginated_table(ipos_of_the_day[['Company Name', 'Industry', 'Description', 'Related People']], key='ipos', text_columns=['Company Name', 'Description', 'Related People'], static=True)
                 else:
                     st.write(f"No IPOs on {selected_date}.")
+                timer.lap('tables')
                 
-                # Add download button
-                a = deals_of_the_day.copy()
-                b = ipos_of_the_day.copy()
-                a['Deal Date'] = str(selected_date)
-                b['IPO Date'] = str(selected_date)
-                excel_data = to_excel(a, b)
-                st.download_button(
-                    label="Download Excel",
-                    data=excel_data,
-                    file_name=f"filtered_data_{selected_date}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                # Add download, generated only on request
+                def build_sheets():
+                    a = deals_of_the_day.copy()
+                    b = ipos_of_the_day.copy()
+                    a['Deal Date'] = str(selected_date)
+                    b['IPO Date'] = str(selected_date)
+                    return {'Deals': a, 'IPOs': b}
+
+                export_state = (
+                    snapshot_key(CB_DEALS_PATH), snapshot_key(IPO_DATASET_PATH), selected_date,
+                    tuple(selected_industries), tuple(selected_countries), tuple(selected_stage), min_deal_size,
+                    tuple(selected_ipo_industries), tuple(selected_ipo_countries),
                 )
+                export_widget(build_sheets, export_state, f"filtered_data_{selected_date}", key='deals_export')
+                timer.lap('export')
             else:
                 st.write("Select a date from the dropdown to display deal information.")
     else:
         st.write("Please select a valid date range.")
 except:
-    st.write('Select end of date range')
\ No newline at end of file
+    st.write('Select end of date range')
+
+timer.render()
\ No newline at end of file
@@ -1,116 +1,105 @@
-import os
-import glob
-import re
 import pandas as pd
 import streamlit as st
-import textwrap
-import ast
 
-from utils.renatus import scrape_newsletters
+from utils.data_access import load_renatus_deals
+from utils.tables import search_rows
+from utils.jobs import enqueue, latest_job
+from utils.render_timing import render_timer
 from datetime import datetime, timedelta
 
-def extract_date_from_filename(filename):
-    # Use regex to extract the date from the filename
-    match = re.search(r'\d{2}-\d{2}-\d{4}', filename)
-    if match:
-        date_str = match.group()
-        # Parse the date string into a datetime object
-        date_obj = datetime.strptime(date_str, '%d-%m-%Y')
-        return date_obj
-    else:
-        return None
+STALE_AFTER = timedelta(days=7)
+REFRESH_COOLDOWN = 60 * 60  # Issues can be late, don't re-probe on every visit
+SECTIONS = ['M&A Activity', 'Deal Updates & Other News', 'Fundraisings']
 
-def get_latest_file(directory, file_pattern):
+def load_latest_newsletter():
     """
-    Get the latest file in the directory that matches the file pattern.
-    
-    :param directory: Directory where to look for files.
-    :param file_pattern: Pattern to match files (e.g., 'cnbc_data_*.csv').
-    :return: Path to the latest file.
-    """
-    files = glob.glob(os.path.join(directory, file_pattern))
-    if not files:
-        return None
-    latest_file = max(files, key=os.path.getctime)
-    return latest_file
-
-def load_or_scrape_file():
-    # Directory and file pattern
-    directory = "./utils/data/Renatus Newsletter/"
-    file_pattern = f"renatus_*.csv"
-
-    # Get the latest file
-    latest_file = get_latest_file(directory, file_pattern)
-    if datetime.strptime(latest_file.split('_')[-1].split('.')[0], '%d-%m-%Y') + timedelta(days=7) < datetime.today():
-        scrape_newsletters()
-    latest_file = get_latest_file(directory, file_pattern)
-    df = pd.read_csv(latest_file)
-    return df, latest_file
-
-def format_markdown(paragraphs):
-    markdown_articles = []
-    for i, paragraph in enumerate(paragraphs, start=1):
-        title = f"#### {paragraph.split('. ')[0]}".replace('Deal Details:', '').replace('Deal Details', '')
-        paragraph = '. '.join([x.strip() for x in paragraph.replace('$', '\$').replace('Source', '\n Source: ').split('.')[1:]])
-        #formatted_paragraph = "\n - " + paragraph.replace(". ", ".\n\n - ")
-        markdown_articles.append(f"{title}\n\n{paragraph}")
-    return "\n\n---\n\n".join(markdown_articles) + "\n\n---\n\n"
-
-def string_to_markdown_table(s):
-    # Define the labels
-    labels = ["Who", "What", "Why", "Adviser", "Source"]
+    Serve the saved deal records right away, queueing a refresh for the worker when stale.
 
-    # Split the string by the labels, keeping the labels
-    parts = re.split(r'(Who:|What:|Why:|Adviser:|Source:)', s)
-    
-    # Filter out empty strings and strip whitespace
-    parts = [part.strip() for part in parts if part.strip()]
-
-    # Combine labels with their corresponding text
-    data = dict(zip(parts[::2], parts[1::2]))
-
-    # Create the markdown table
-    markdown_table = "| Label | Details |\n|---|---|\n"
-    for label in labels:
-        markdown_table += f"| {label} | {data.get(label + ':', '')} |\n"
-
-    return markdown_table
+    :return: Tuple of (deal records DataFrame or None, latest newsletter date or None).
+    """
+    deals = load_renatus_deals()
+    newsletter_date = deals['Newsletter Date'].max().to_pydatetime() if deals is not None and not deals.empty else None
+    if newsletter_date is None or newsletter_date + STALE_AFTER < datetime.today():
+        enqueue('renatus', cooldown=REFRESH_COOLDOWN)
+    return deals, newsletter_date
+
+def escape(text):
+    return str(text).replace('$', '\\$')
+
+def record_markdown(record):
+    """Markdown for one deal record, laid out per newsletter section."""
+    if record['Section'] == 'Fundraisings':
+        markdown_table = "| Label | Details |\n|---|---|\n"
+        for label in ["Who", "What", "Why", "Adviser", "Source"]:
+            markdown_table += f"| {label} | {escape(record[label])} |\n"
+        return markdown_table
+    parts = []
+    if record['Section'] == 'M&A Activity':
+        parts.append(f"#### {escape(record['Heading'])}")
+    parts.append(escape(record['Details']))
+    if record['Adviser']:
+        parts.append(f"**Advisers:** {escape(record['Adviser'])}")
+    if record['Comment']:
+        parts.append(f"**Renatus Comment:** {escape(record['Comment'])}")
+    if record['Source']:
+        parts.append(f"Source: {escape(record['Source'])}")
+    return "\n\n".join(parts)
+
+def render_records(records):
+    for _, record in records.iterrows():
+        st.write(record_markdown(record))
+        st.write("---")
 
 st.set_page_config(layout="wide")
+timer = render_timer()
 
-df, filename = load_or_scrape_file()
+deals, date_obj = load_latest_newsletter()
+timer.lap('load data')
 
 # Streamlit dashboard
 st.title("Latest Renatus Newsletter")
-date_obj = extract_date_from_filename(filename)
+status = latest_job('renatus')
 if date_obj:
     formatted_date = date_obj.strftime('%B %d, %Y')
     # Display the date in a Streamlit header
     st.header(f"Newsletter Dated: {formatted_date}")
+    age = (datetime.today() - date_obj).days
+    freshness = f"Data is {age} day{'s' if age != 1 else ''} old."
+    if status and status['status'] in ('queued', 'running'):
+        freshness += f" Checking renatus.ie for a newer issue in the background ({status['progress']}), reload the page shortly."
+    elif status and status['status'] == 'failed':
+        freshness += f" Last refresh failed: {status['error']}"
+    st.caption(freshness)
+
+if deals is None or deals.empty:
+    st.write("No newsletter has been saved yet. Fetching the latest issue in the background, reload the page shortly.")
+    timer.render()
+    st.stop()
+
+# Search across every saved newsletter
+st.sidebar.header("Search Renatus Deals")
+query = st.sidebar.text_input("Company, person or keyword")
+if query:
+    matches = search_rows(deals, query, ['Heading', 'Details', 'Who', 'What', 'Why', 'Adviser', 'Comment', 'Source'])
+    timer.lap('filter')
+    st.subheader(f"{len(matches)} deal{'s' if len(matches) != 1 else ''} matching '{query}' across all newsletters")
+    for newsletter_date, records in matches.groupby('Newsletter Date', sort=False):
+        st.caption(f"Newsletter dated {newsletter_date.strftime('%B %d, %Y')}")
+        render_records(records)
+    timer.lap('tables')
+    timer.render()
+    st.stop()
 
 st.write("---")
 
-df = df.drop('Unnamed: 0', axis = 1)
-for header in df.columns:
-    # Display each DataFrame
+latest = deals[deals['Newsletter Date'] == deals['Newsletter Date'].max()]
+timer.lap('filter')
+for header in SECTIONS:
+    records = latest[latest['Section'] == header]
+    if records.empty:
+        continue
     st.subheader(header)
-    df_temp = df[[header]]
-    df_temp = df_temp.to_dict()
-    content = ast.literal_eval(df_temp[header][0])
-
-    if header == 'M&A Activity':
-        st.write(format_markdown(content))
-    
-    elif header == 'Deal Updates & Other News':
-        for paragraphs in content:
-            st.write(paragraphs.replace('Deal Details:', '').replace('$', '\$'))
-            st.write("---")
-    else:
-        for paragraphs in content:
-            st.write(string_to_markdown_table(paragraphs))
-            st.write("---")
+    render_records(records)
+timer.lap('tables')
 
-    # links = ast.literal_eval(df_temp[header][1])
-    # rows = zip(content, links)
-    # displayed_df = pd.DataFrame(rows, columns = ['Content', 'Links'])
-    # st.table(displayed_df['Content'].apply(lambda x: x.replace(':', ':\n\n')))
\ No newline at end of file
+timer.render()
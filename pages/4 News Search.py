@@ -1,5 +1,5 @@
 import streamlit as st
-from serpapi.google_search import GoogleSearch
+from utils.search import cached_search
 import pandas as pd
 import json
 from datetime import datetime
@@ -29,10 +29,9 @@ def search_news(selected_countries, selected_categories, time_range, country_map
         params["gl"] = ','.join([country_mapping[item] for item in selected_countries if item in country_mapping])  # Set the country code for geolocation
     else:
         query = f"({' OR '.join(selected_categories)}) ' AND ' ({' OR '.join(selected_countries)})"
-    params["q"] = query,
+    params["q"] = query
     #print(params)
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    results = cached_search(params)
     if "news_results" in results:
         return results["news_results"]
     else:
@@ -1,37 +1,16 @@
 import streamlit as st
-from serpapi.google_search import GoogleSearch
+from datetime import datetime
+from utils.enrichment import ProfileStore, normalize_name, search_person
+from utils.people import PeopleIndex
 
-def search_person(person_name, company_name=None):
-    if company_name:
-        query = f'{person_name} {company_name}'
-    else:
-        query = f'{person_name} startup'
-        
-    params = {
-        "q": query,
-        "google_domain": "google.com",
-        # Add more parameters as needed for better targeting
-        "tbm": "nws",  # Search only in news for timely information
-        "num": 10,     # Number of results to fetch
-        "api_key": st.secrets["serp_api_key"],
-    }
+@st.cache_resource
+def profile_store():
+    return ProfileStore()
 
-    search = GoogleSearch(params)
-    results = search.get_dict()
-    if "news_results" in results:
-        return results["news_results"]
-    else:
-        params = {
-        "q": query,
-        "engine": "google",
-        "google_domain": "google.com",
-        # Add more parameters as needed for better targeting
-        "num": 10,     # Number of results to fetch
-        "api_key":st.secrets["serp_api_key"],
-        }
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        return results
+@st.cache_resource
+def people_index():
+    # Kept up to date by the scrape worker and `python -m utils.people`
+    return PeopleIndex()
 
 st.title("Profile Searcher 👤")
 st.write("---")
@@ -43,7 +22,23 @@ company_name = st.sidebar.text_input("Enter company's name (optional)")
 
 if st.sidebar.button("Search"):
     if person_name:
-        results = search_person(person_name, company_name)
+        # Every deal, IPO and news appearance of the person, straight from the people index
+        appearances = people_index().appearances(person_name)
+        if not appearances.empty:
+            st.subheader(f"{len(appearances)} appearance{'s' if len(appearances) != 1 else ''} across deals, IPOs and news")
+            st.dataframe(appearances[['Date', 'Role', 'Company', 'Ticker', 'Source']], hide_index=True, use_container_width=True)
+        else:
+            similar = people_index().search(person_name, limit=10)
+            if not similar.empty:
+                st.caption(f"Not in the scraped data. Similar names: {', '.join(similar['Name'])}")
+        # Profiles enriched in batch are served straight from the store
+        profile = profile_store().get(person_name)
+        if profile and (not company_name or normalize_name(company_name) in normalize_name(profile['company'])):
+            fetched = datetime.fromtimestamp(profile['fetched_at']).strftime('%Y-%m-%d')
+            st.caption(f"Stored profile from {fetched} ({', '.join(profile['sources'])}): {', '.join(profile['roles'])} at {profile['company']}")
+            results = profile['results']
+        else:
+            results = search_person(person_name, company_name, st.secrets["serp_api_key"])
 
         for result in results:
             # Display article info and thumbnail side by side
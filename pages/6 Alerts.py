@@ -0,0 +1,68 @@
+import streamlit as st
+from utils.alerts import AlertEngine, CRITERIA
+from utils.data_access import latest_news_file, load_unique_values
+from utils.tables import paginated_table
+
+@st.cache_resource
+def alert_engine():
+    # New snapshots are checked by the scrape worker after every scrape
+    return AlertEngine()
+
+def snapshot_unique_values(column):
+    values = set()
+    for selection in ('marketinsights', 'stockanalysis'):
+        latest_file = latest_news_file(selection)
+        if latest_file:
+            values.update(load_unique_values(latest_file, column))
+    return sorted(values)
+
+def split_terms(text):
+    return [term.strip() for term in text.split(',') if term.strip()]
+
+engine = alert_engine()
+st.title("Alerts 🔔")
+st.write("---")
+
+# New watchlist
+st.sidebar.header("New watchlist")
+with st.sidebar.form("new_watchlist", clear_on_submit=True):
+    name = st.text_input("Name")
+    names = st.text_input("People (comma separated)")
+    companies = st.text_input("Companies (comma separated)")
+    tickers = st.text_input("Tickers (comma separated)")
+    keywords = st.text_input("Keywords (comma separated)")
+    countries = st.multiselect("Countries", snapshot_unique_values('Country'))
+    industries = st.multiselect("Industries", snapshot_unique_values('Industry'))
+    if st.form_submit_button("Save watchlist"):
+        try:
+            engine.save_watchlist(
+                name or "Untitled", names=split_terms(names), companies=split_terms(companies), tickers=split_terms(tickers),
+                keywords=split_terms(keywords), countries=countries, industries=industries,
+            )
+            st.success(f"Saved {name or 'Untitled'}, checked against the latest news")
+        except ValueError as e:
+            st.error(str(e))
+
+# Inbox
+watchlists = engine.watchlists()
+unread_only = st.checkbox("Unread only", value=True)
+selected = st.selectbox("Watchlist", [None] + list(watchlists), format_func=lambda watchlist_id: "All" if watchlist_id is None else watchlists[watchlist_id]['name'])
+hits = engine.hits(selected, unread_only=unread_only)
+st.subheader(f"Inbox ({engine.unread_count()} unread)")
+if hits.empty:
+    st.write("No alerts yet. Save a watchlist in the sidebar; new news is checked after every scrape.")
+else:
+    paginated_table(hits.drop(columns=['Hit Id']), key="alerts_inbox", text_columns=['Title'])
+    if st.button("Mark as read"):
+        engine.mark_read(hits['Hit Id'])
+        st.experimental_rerun()
+
+# Saved watchlists
+with st.expander(f"Watchlists ({len(watchlists)})"):
+    for watchlist_id, watchlist in watchlists.items():
+        criteria = '; '.join(f"{field}: {', '.join(watchlist['criteria'][field])}" for field in CRITERIA if watchlist['criteria'].get(field))
+        col1, col2 = st.columns([5, 1])
+        col1.write(f"**{watchlist['name']}**: {criteria}")
+        if col2.button("Delete", key=f"delete_watchlist_{watchlist_id}"):
+            engine.delete_watchlist(watchlist_id)
+            st.experimental_rerun()
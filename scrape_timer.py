@@ -1,33 +1,27 @@
+import argparse
 import schedule
 import time
 import csv
 import os
 import shutil
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-from utils.pipeline import load_or_scrape_file
+from utils.pipeline import scrape_and_publish
+from utils.profiling import profile_run
 
-def generate_csv():
-    # Define the directory and archive folder
-    print("Moving files")
-    directory = os.getcwd() 
-    directory = os.path.join(directory, 'utils/data/Scraped News')
-    archive_folder = os.path.join(directory, 'Archive')
-    # Create the archive folder if it doesn't exist
-    if not os.path.exists(archive_folder):
-        os.makedirs(archive_folder)
-    
-    # Move existing CSV files to the archive folder
-    for filename in os.listdir(directory):
-        if filename.endswith(".csv"):
-            shutil.move(os.path.join(directory, filename), os.path.join(archive_folder, filename))
-    print(f"Files moved to {archive_folder}")
-    # Load or scrape files from sources
+def generate_csv(profile=False):
+    # Scrape each source and publish its snapshot; older snapshots are archived once the new one is in place
     for source in ['marketinsights']:#['cnbc', 'stockanalysis']:#, 'marketinsights']:
         print(f'Generating {source} file')
-        load_or_scrape_file(source, scrape=True)
+        # One profile per source so the flamegraphs don't mix scrapers
+        with profile_run(source) if profile else nullcontext():
+            scrape_and_publish(source)
     return
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape and publish the news sources.')
+    parser.add_argument('--profile', action='store_true', help='Write cProfile and folded-stack profiles per source to utils/data/Profiling.')
+    args = parser.parse_args()
 # Run the script immediately
-    generate_csv()
\ No newline at end of file
+    generate_csv(profile=args.profile)
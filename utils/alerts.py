@@ -0,0 +1,378 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import defaultdict, deque
+
+import pandas as pd
+
+from utils.people import file_key, moved_files, parse_literal
+
+ALERTS_PATH = "./utils/data/Alerts/alerts.sqlite"
+# Only the current snapshots are checked, archived ones were checked before they were archived
+SNAPSHOT_GLOB = "./utils/data/Scraped News/{source}_data_*.csv"
+SOURCES = ('cnbc', 'marketinsights', 'stockanalysis')
+CRITERIA = ('names', 'companies', 'tickers', 'countries', 'industries', 'keywords')
+# Criteria matched as words anywhere in an item's text, with their hit labels
+TEXT_CRITERIA = {'names': 'name', 'companies': 'company', 'keywords': 'keyword'}
+
+# source -> snapshot columns of each item field
+ITEM_COLUMNS = {
+    'cnbc': {'title': 'Title', 'text': 'Article content', 'link': 'Link'},
+    'marketinsights': {
+        'title': 'title', 'text': 'Article content', 'link': 'link', 'tickers': 'ticker', 'people': 'People',
+        'contact': 'Contact Information', 'country': 'Country', 'industry': 'Industry',
+    },
+    'stockanalysis': {
+        'title': 'Title', 'text': 'Description', 'tickers': 'Tickers', 'people': 'Executives',
+        'country': 'Country', 'industry': 'Industry',
+    },
+}
+
+def normalize_text(text):
+    """
+    Text as lower-case words without diacritics or punctuation, separated and
+    surrounded by single spaces, so ' ipo ' only matches the whole word.
+    """
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' ' + ' '.join(re.sub(r'[^\w]+', ' ', text).split()) + ' '
+
+class AhoCorasick:
+    """
+    Finds every occurrence of many patterns in one pass over a text.
+
+    The patterns are compiled into a trie whose failure links point to the
+    longest proper suffix that is also in the trie, so the text is read once
+    whatever the number of patterns.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: Dict of pattern -> list of values reported when it occurs.
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern, values in patterns.items():
+            state = 0
+            for char in pattern:
+                following = self._goto[state].get(char)
+                if following is None:
+                    following = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = following
+                state = following
+            self._out[state].extend(values)
+        # Breadth first, so the failure target of every state is already final
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[following] = self._goto[fail].get(char, 0)
+                self._out[following] = self._out[following] + self._out[self._fail[following]]
+
+    def search(self, text):
+        """Values of every pattern occurring in the text, in order of occurrence."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.extend(out[state])
+        return found
+
+class WatchlistMatcher:
+    """
+    Every watchlist compiled into one matcher.
+
+    Names, companies and keywords go into a single Aho-Corasick automaton over
+    the item text; tickers, countries and industries are dict lookups. A
+    watchlist matches an item when one of its terms (names, companies,
+    tickers, keywords) occurs and the item is in one of its countries and
+    industries, when it has any. Watchlists with only countries or industries
+    match every item there. Only watchlists hit by a lookup are ever looked
+    at, so the cost of an item depends on its text and hits, not on the
+    number of watchlists.
+    """
+
+    def __init__(self, watchlists):
+        """
+        :param watchlists: Dict of watchlist id -> criteria dict (see CRITERIA).
+        """
+        patterns = defaultdict(list)
+        self._tickers = defaultdict(list)
+        self._filter_only = defaultdict(set)  # country or industry -> watchlists without terms
+        self._filters = {}
+        for watchlist_id, criteria in watchlists.items():
+            for field, label in TEXT_CRITERIA.items():
+                for term in criteria.get(field, []):
+                    if normalize_text(term).strip():
+                        patterns[normalize_text(term)].append((watchlist_id, f"{label}: {term}"))
+            for ticker in criteria.get('tickers', []):
+                self._tickers[ticker.strip().upper()].append((watchlist_id, f"ticker: {ticker.strip().upper()}"))
+            countries = {country.lower() for country in criteria.get('countries', [])}
+            industries = {industry.lower() for industry in criteria.get('industries', [])}
+            self._filters[watchlist_id] = (countries, industries)
+            if not any(criteria.get(field) for field in ('names', 'companies', 'tickers', 'keywords')):
+                # Indexed by one of its filters, the other is checked in match()
+                for value in (countries or {f"industry:{industry}" for industry in industries}):
+                    self._filter_only[value].add(watchlist_id)
+        self._automaton = AhoCorasick(patterns)
+
+    def match(self, item):
+        """
+        :param item: Item dict from build_items.
+        :return: Dict of watchlist id -> list of matched terms.
+        """
+        hits = defaultdict(list)
+        for watchlist_id, label in self._automaton.search(item['document']):
+            if label not in hits[watchlist_id]:
+                hits[watchlist_id].append(label)
+        for ticker in item['tickers']:
+            for watchlist_id, label in self._tickers.get(ticker, ()):
+                if label not in hits[watchlist_id]:
+                    hits[watchlist_id].append(label)
+        for watchlist_id in self._filter_only.get(item['country'], set()) | self._filter_only.get(f"industry:{item['industry']}", set()):
+            hits[watchlist_id].append(f"country: {item['country']}" if self._filters[watchlist_id][0] else f"industry: {item['industry']}")
+
+        matched = {}
+        for watchlist_id, labels in hits.items():
+            countries, industries = self._filters[watchlist_id]
+            if (not countries or item['country'] in countries) and (not industries or item['industry'] in industries):
+                matched[watchlist_id] = labels
+        return matched
+
+def _people_names(value):
+    # marketinsights: [{'Name': ..., 'Position': ...}], stockanalysis: [[name, title, ...]]
+    names = []
+    for person in parse_literal(value, None) or []:
+        name = person.get('Name') if isinstance(person, dict) else person[0] if person else None
+        if isinstance(name, str):
+            names.append(name)
+    return names
+
+def _cell(row, columns, field):
+    value = row.get(columns.get(field)) if columns.get(field) else None
+    return value if isinstance(value, str) else ''
+
+def build_items(source, df):
+    """
+    Items of a snapshot in the shape the matcher reads.
+
+    :return: List of dicts with key, source, title, link, time, document (normalised
+        text of the title, body, people and company), tickers, country and industry.
+    """
+    columns = ITEM_COLUMNS[source]
+    items = []
+    for row in df.to_dict('records'):
+        title, link = _cell(row, columns, 'title'), _cell(row, columns, 'link')
+        time_value = row['Time'] if isinstance(row.get('Time'), str) else ''
+        company = parse_literal(row.get(columns['contact']), {}).get('Company Name', '') if 'contact' in columns else ''
+        people = _people_names(row.get(columns['people'])) if 'people' in columns else []
+        tickers = {ticker.strip().upper() for ticker in _cell(row, columns, 'tickers').split(',') if ticker.strip()}
+        items.append({
+            # stockanalysis items have no article link
+            'key': f"{source}|{link or title + '|' + time_value}",
+            'source': source,
+            'title': title,
+            'link': link,
+            'time': time_value,
+            'document': normalize_text(' \n '.join([title, _cell(row, columns, 'text'), company, *people])),
+            'tickers': tickers,
+            'country': _cell(row, columns, 'country').lower(),
+            'industry': _cell(row, columns, 'industry').lower(),
+        })
+    return items
+
+def snapshot_files():
+    """(source, path) of every current news snapshot, oldest first."""
+    files = []
+    for source in SOURCES:
+        paths = sorted(glob.glob(SNAPSHOT_GLOB.format(source=source)), key=os.path.basename)
+        files.extend((source, path) for path in paths)
+    return files
+
+def read_items(source, path):
+    columns = set(ITEM_COLUMNS[source].values()) | {'Time'}
+    return build_items(source, pd.read_csv(path, usecols=lambda c: c in columns))
+
+class AlertEngine:
+    """
+    Saved watchlists and their hits on newly scraped news.
+
+    refresh() reads only snapshots that changed since the last run and only
+    items it has not seen before, matches them against all watchlists at once
+    (WatchlistMatcher) and stores the hits for the inbox. Run it after every
+    scrape; its cost grows with the new items, not with the archive or the
+    number of watchlists.
+    """
+
+    def __init__(self, path=ALERTS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS watchlists (watchlist_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, criteria TEXT, created_at REAL);"
+            "CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, checked_at REAL);"
+            "CREATE TABLE IF NOT EXISTS seen (item_key TEXT PRIMARY KEY) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS hits (hit_id INTEGER PRIMARY KEY AUTOINCREMENT, watchlist_id INTEGER, item_key TEXT, "
+            "source TEXT, title TEXT, link TEXT, time TEXT, matched TEXT, created_at REAL, read INTEGER DEFAULT 0, "
+            "UNIQUE (watchlist_id, item_key));"
+            "CREATE INDEX IF NOT EXISTS hits_inbox ON hits (read, created_at);"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def watchlists(self):
+        """:return: Dict of watchlist id -> {'name', 'criteria', 'created_at'}."""
+        with self._lock:
+            rows = self._db.execute("SELECT watchlist_id, name, criteria, created_at FROM watchlists ORDER BY watchlist_id").fetchall()
+        return {row[0]: {'name': row[1], 'criteria': json.loads(row[2]), 'created_at': row[3]} for row in rows}
+
+    def save_watchlist(self, name, backfill=True, **criteria):
+        """
+        Save a watchlist.
+
+        :param name: Display name.
+        :param backfill: Also check it against the items of the current snapshots.
+        :param criteria: Lists of names, companies, tickers, countries, industries and keywords.
+        :return: Watchlist id.
+        """
+        unknown = set(criteria) - set(CRITERIA)
+        if unknown:
+            raise ValueError(f"Unknown watchlist criteria: {', '.join(sorted(unknown))}")
+        criteria = {field: [value.strip() for value in criteria.get(field) or [] if value and value.strip()] for field in CRITERIA}
+        if not any(criteria.values()):
+            raise ValueError("A watchlist needs at least one name, company, ticker, country, industry or keyword")
+        with self._lock, self._db:
+            watchlist_id = self._db.execute(
+                "INSERT INTO watchlists (name, criteria, created_at) VALUES (?, ?, ?)", (name, json.dumps(criteria), time.time())
+            ).lastrowid
+        if backfill:
+            # Only this watchlist, over the current snapshots; older news stays unchecked
+            matcher = WatchlistMatcher({watchlist_id: criteria})
+            for source, path in snapshot_files():
+                self._store_hits(matcher, read_items(source, path))
+        return watchlist_id
+
+    def delete_watchlist(self, watchlist_id):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM watchlists WHERE watchlist_id = ?", (watchlist_id,))
+            self._db.execute("DELETE FROM hits WHERE watchlist_id = ?", (watchlist_id,))
+
+    def _unseen(self, items):
+        keys = [item['key'] for item in items]
+        seen = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                seen.update(row[0] for row in self._db.execute(
+                    f"SELECT item_key FROM seen WHERE item_key IN ({','.join('?' * len(chunk))})", chunk
+                ))
+        return [item for item in items if item['key'] not in seen]
+
+    def _store_hits(self, matcher, items):
+        rows = []
+        for item in items:
+            for watchlist_id, labels in matcher.match(item).items():
+                rows.append((watchlist_id, item['key'], item['source'], item['title'], item['link'], item['time'], json.dumps(labels), time.time()))
+        with self._lock, self._db:
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO hits (watchlist_id, item_key, source, title, link, time, matched, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        # Hits already stored (e.g. by a save_watchlist backfill) are ignored, not new
+        return max(cursor.rowcount, 0)
+
+    def refresh(self, files=None):
+        """
+        Check the items of new and changed snapshots against every watchlist.
+
+        :param files: (source, path) pairs, defaults to snapshot_files().
+        :return: Number of new hits.
+        """
+        files = snapshot_files() if files is None else files
+        with self._lock:
+            known = {row[0]: (row[1], row[2]) for row in self._db.execute("SELECT file, mtime_ns, size FROM files")}
+        moved = moved_files(files, known)
+        if moved:
+            with self._lock, self._db:
+                self._db.executemany("UPDATE files SET file = ? WHERE file = ?", [(new, old) for old, new in moved.items()])
+            known = {moved.get(file, file): stat for file, stat in known.items()}
+        matcher, hits = None, 0
+        for source, path in files:
+            file = file_key(source, path)
+            stat = os.stat(path)
+            if known.get(file) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            # Items carried over from an earlier snapshot were checked with it
+            items = self._unseen(read_items(source, path))
+            if items:
+                matcher = matcher or WatchlistMatcher({watchlist_id: watchlist['criteria'] for watchlist_id, watchlist in self.watchlists().items()})
+                hits += self._store_hits(matcher, items)
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", [(item['key'],) for item in items])
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (file, stat.st_mtime_ns, stat.st_size, time.time()))
+        return hits
+
+    def hits(self, watchlist_id=None, unread_only=False, limit=500):
+        """
+        Stored hits, newest first.
+
+        :return: DataFrame with Hit Id, Watchlist, Source, Time, Title, Link, Matched and Read.
+        """
+        query = (
+            "SELECT hits.hit_id, watchlists.name, hits.source, hits.time, hits.title, hits.link, hits.matched, hits.read "
+            "FROM hits JOIN watchlists USING (watchlist_id) WHERE 1 = 1"
+        )
+        args = []
+        if watchlist_id is not None:
+            query += " AND hits.watchlist_id = ?"
+            args.append(watchlist_id)
+        if unread_only:
+            query += " AND hits.read = 0"
+        query += " ORDER BY hits.created_at DESC, hits.time DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        return pd.DataFrame(
+            [(*row[:6], ', '.join(json.loads(row[6])), bool(row[7])) for row in rows],
+            columns=['Hit Id', 'Watchlist', 'Source', 'Time', 'Title', 'Link', 'Matched', 'Read'],
+        )
+
+    def unread_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM hits JOIN watchlists USING (watchlist_id) WHERE read = 0").fetchone()[0]
+
+    def mark_read(self, hit_ids):
+        with self._lock, self._db:
+            self._db.executemany("UPDATE hits SET read = 1 WHERE hit_id = ?", [(int(hit_id),) for hit_id in hit_ids])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check new news snapshots against the saved watchlists.')
+    parser.add_argument('--add', metavar='NAME', help='Save a watchlist with the criteria below before checking.')
+    for field in CRITERIA:
+        parser.add_argument(f'--{field}', nargs='*', default=[], help=f'Watchlist {field}.')
+    parser.add_argument('--list', action='store_true', help='Print the unread hits.')
+    args = parser.parse_args()
+    engine = AlertEngine()
+    if args.add:
+        engine.save_watchlist(args.add, **{field: getattr(args, field) for field in CRITERIA})
+    start = time.perf_counter()
+    print(f"{engine.refresh()} new hits in {time.perf_counter() - start:.2f}s")
+    if args.list:
+        print(engine.hits(unread_only=True)[['Watchlist', 'Source', 'Time', 'Title', 'Matched']].to_string(index=False))
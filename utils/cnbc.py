@@ -1,49 +1,52 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import urllib
-import dateutil.parser
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
+from utils import metrics
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
 
-def scrape_cnbc():
-    """Scrape news articles from CNBC's IPO page and return them as a DataFrame."""
-    
-    #print('***** Beginning CNBC news scraping *****')
-    
-    def datetime_to_relative(dt):
-        """Convert a datetime object to a human-readable relative time string."""
-        now = datetime.now()
-        diff = now - dt
-        
-        if diff < timedelta(minutes=1):
-            return "just now"
-        elif diff < timedelta(hours=1):
-            return f"{int(diff.total_seconds() // 60)} minutes ago"
-        elif diff < timedelta(days=1):
-            hours = int(diff.total_seconds() // 3600)
-            return f"{hours} hour{'s' if hours != 1 else ''} ago"
-        elif diff < timedelta(weeks=1):
-            days = int(diff.total_seconds() // 86400)
-            return f"{days} day{'s' if days != 1 else ''} ago"
-        elif diff < timedelta(weeks=4):
-            weeks = int(diff.total_seconds() // 604800)
-            return f"{weeks} week{'s' if weeks != 1 else ''} ago"
-        else:
-            months = int(diff.total_seconds() // 2592000)
-            return f"{months} month{'s' if months != 1 else ''} ago"
+# Site root, overridable to scrape a local replay server (benchmarks/replay_server.py)
+BASE_URL = os.environ.get('ARGUS_CNBC_URL', 'https://www.cnbc.com')
 
-    # URL of the news page
-    url = 'https://www.cnbc.com/ipos/'
-    
-    headerx = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
-                      'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
-        }
-    response = requests.get(url, headers = headerx)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
+    }
+
+def datetime_to_relative(dt, now=None):
+    """Convert a timezone-aware datetime to a human-readable relative time string."""
+    if pd.isna(dt):
+        return "unknown time"
+    now = now or datetime.now(timezone.utc)
+    diff = now - dt
     
+    if diff < timedelta(minutes=1):
+        return "just now"
+    elif diff < timedelta(hours=1):
+        return f"{int(diff.total_seconds() // 60)} minutes ago"
+    elif diff < timedelta(days=1):
+        hours = int(diff.total_seconds() // 3600)
+        return f"{hours} hour{'s' if hours != 1 else ''} ago"
+    elif diff < timedelta(weeks=1):
+        days = int(diff.total_seconds() // 86400)
+        return f"{days} day{'s' if days != 1 else ''} ago"
+    elif diff < timedelta(weeks=4):
+        weeks = int(diff.total_seconds() // 604800)
+        return f"{weeks} week{'s' if weeks != 1 else ''} ago"
+    else:
+        months = int(diff.total_seconds() // 2592000)
+        return f"{months} month{'s' if months != 1 else ''} ago"
+
+def parse_listing(html):
+    """
+    Extract the article cards from CNBC's IPO page.
+
+    :param html: Page HTML.
+    :return: DataFrame with Title, Link, Image and Time columns, Time as shown on the page.
+    """
     # Get the HTML content of the page
-    html_content = urllib.parse.unquote(response.text)
+    html_content = urllib.parse.unquote(html)
     soup = BeautifulSoup(html_content, 'html.parser')
     
     # Find all article cards
@@ -61,47 +64,62 @@ def scrape_cnbc():
             title = title_tag.text
             link = title_tag['href']
             image = image_tag['src']
-            if 'min ago' in date_str:
-                source = f"{date_str} - CNBC News"
-                date = datetime.now() - timedelta(minutes=int(date_str.split()[0]))
-            elif 'hours ago' in date_str:
-                source = f"{date_str} - CNBC News"
-                date = datetime.now() - timedelta(hours=int(date_str.split()[0]))
-            else:
-                # Parse other date formats
-                date = dateutil.parser.parse(date_str)
-                source = f"{datetime_to_relative(date)} - CNBC News"
             
             data.append({
                 'Title': title,
                 'Link': link,
                 'Image': image,
-                'Source': source,
-                'Time': date
+                'Time': date_str
             })
     
     # Convert to DataFrame for tabular representation
-    df = pd.DataFrame(data)
+    return pd.DataFrame(data, columns=['Title', 'Link', 'Image', 'Time'])
+
+def parse_article(html):
+    """Extract the article text from a CNBC article page, or None if it has no article body."""
+    html_content = urllib.parse.unquote(html)
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    # Find all paragraphs within the specified div
+    article_body = soup.find('div', class_='ArticleBody-articleBody')
+    
+    # Extract text from paragraphs
+    if article_body:
+        paragraphs = article_body.find_all('p')
+        article_text = '\n'.join([para.get_text() for para in paragraphs])
+        return article_text
+
+def get_article_content(url):
+    """Fetch and extract the article content from a given URL."""
+    try:
+        response = metrics.timed_get(url, 'article fetch')
+        with metrics.stage('parse'):
+            return parse_article(response.text)
+    except:
+        return 'Failed to retrieve article content'
+
+def scrape_cnbc():
+    """Scrape news articles from CNBC's IPO page and return them as a DataFrame."""
+    
+    #print('***** Beginning CNBC news scraping *****')
+
+    # URL of the news page
+    url = f'{BASE_URL}/ipos/'
+    
+    scraped_at = datetime.now(timezone.utc)
+    response = metrics.timed_get(url, 'listing fetch', headers = HEADERS)
+    with metrics.stage('parse'):
+        df = parse_listing(response.text)
+    metrics.count_rows('listing', rows_out=len(df))
+
+    # "5 min ago" and "Thu, Aug 22 2024" both become UTC timestamps
+    with metrics.stage('timestamps'):
+        df['Time'] = normalize_timestamps(df['Time'], scraped_at, SOURCE_TIMEZONES['cnbc'])
+    metrics.count_rows('timestamps', rows_in=len(df), rows_out=int(df['Time'].notna().sum()))
+    df.insert(3, 'Source', df['Time'].map(lambda time: f"{datetime_to_relative(time, scraped_at)} - CNBC News"))
     #print(f'***** Total of: {len(df)} CNBC news articles successfully scraped! *****')
     #print('***** Beginning extraction of CNBC news article contents *****')
     
-    def get_article_content(url):
-        """Fetch and extract the article content from a given URL."""
-        try:
-            response = requests.get(url)
-            html_content = urllib.parse.unquote(response.text)
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Find all paragraphs within the specified div
-            article_body = soup.find('div', class_='ArticleBody-articleBody')
-            
-            # Extract text from paragraphs
-            if article_body:
-                paragraphs = article_body.find_all('p')
-                article_text = '\n'.join([para.get_text() for para in paragraphs])
-                return article_text
-        except:
-            return 'Failed to retrieve article content'
     # Apply content extraction to each article link
     df['Article content'] = df['Link'].apply(get_article_content)
     return df
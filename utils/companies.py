@@ -0,0 +1,333 @@
+import argparse
+import difflib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import pandas as pd
+
+from utils.people import file_key, moved_files, parse_literal, source_files
+
+COMPANY_INDEX_PATH = "./utils/data/Companies/companies.sqlite"
+
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited', 'plc', 'llc', 'lp', 'llp',
+    'sa', 'ag', 'nv', 'se', 'spa', 'ab', 'asa', 'oyj', 'bv', 'gmbh', 'kk', 'pte', 'pty', 'the',
+}
+# Names of one block at least this similar are the same company
+NAME_SIMILARITY = 0.92
+# Blocks larger than this are only matched exactly
+MAX_BLOCK_SIZE = 500
+
+def normalize_company(name):
+    """
+    Key used to recognise the same company across sources.
+
+    Lower-cased, without diacritics, punctuation, share classes or legal
+    suffixes, e.g. 'Molecular Data Inc.' -> 'molecular data'.
+    """
+    if not isinstance(name, str):
+        return ''
+    name = unicodedata.normalize('NFD', name)
+    name = ''.join(char for char in name if unicodedata.category(char) != 'Mn').lower()
+    name = re.sub(r'\b(?:class [a-z]|ordinary shares|common stock|ads|adr)\b', ' ', name.replace('&', ' and '))
+    words = re.sub(r'[^\w\s]', ' ', name).split()
+    while words and words[-1] in LEGAL_SUFFIXES:
+        words = words[:-1]
+    while words and words[0] == 'the':
+        words = words[1:]
+    return ' '.join(words)
+
+def normalize_ticker(ticker):
+    """Upper-cased ticker without an exchange prefix, e.g. 'NASDAQ: cava' -> 'CAVA'."""
+    if not isinstance(ticker, str):
+        return ''
+    return ticker.split(':')[-1].strip().upper()
+
+def block_key(name_key):
+    """Candidates for a fuzzy match share the first word of the name."""
+    return name_key.split()[0] if name_key else None
+
+def series_markers(name_key):
+    """
+    Numbers, roman numerals and single letters of a name, which tell apart
+    series of otherwise identical names ('cf acquisition corp vii' / 'viii').
+    """
+    return {word for word in name_key.split() if word.isdigit() or len(word) == 1 or re.fullmatch(r'[ivx]+', word)}
+
+def names_compatible(a, b):
+    """
+    Whether two normalised names can be the same company: same series
+    markers, and either similar or one the other plus extra words
+    ('london stock exchange' / 'london stock exchange group').
+    """
+    if series_markers(a) != series_markers(b):
+        return False
+    shorter, longer = sorted((a.split(), b.split()), key=len)
+    return longer[:len(shorter)] == shorter or difflib.SequenceMatcher(None, a, b).ratio() >= NAME_SIMILARITY
+
+def extract_mentions(source, path):
+    """
+    Company mentions of one file.
+
+    :return: List of (ticker, name, row) tuples, ticker or name None when the source does not give it.
+    """
+    if source == 'marketinsights':
+        df = pd.read_csv(path, usecols=lambda c: c in ('ticker', 'Contact Information'))
+        contacts = df['Contact Information'] if 'Contact Information' in df else [None] * len(df)
+        return [
+            (ticker, parse_literal(contact, {}).get('Company Name'), row)
+            for row, (ticker, contact) in enumerate(zip(df['ticker'], contacts))
+        ]
+    if source == 'stockanalysis':
+        df = pd.read_csv(path, usecols=['Tickers'])
+        return [
+            (ticker, None, row)
+            for row, tickers in enumerate(df['Tickers']) if isinstance(tickers, str)
+            for ticker in tickers.split(',')
+        ]
+    if source == 'ipo_dataset':
+        df = pd.read_csv(path, usecols=['Symbol', 'Company Name'])
+        return [(symbol, name, row) for row, (symbol, name) in enumerate(zip(df['Symbol'], df['Company Name']))]
+    if source == 'cb_deals':
+        df = pd.read_csv(path, usecols=['Companies'])
+        return [(None, name, row) for row, name in enumerate(df['Companies'])]
+    raise ValueError(f"Unknown source: {source}")
+
+class CompanyIndex:
+    """
+    Stable company ids across MarketScreener tickers, stockanalysis tickers,
+    the IPO dataset and the CB Insights deals.
+
+    Every ticker and normalised name is a key mapped to a company id. A new
+    mention takes the id of its known keys; an unknown name is compared only
+    with the names of its block (same first word), never with every company.
+    Resolved keys are stored, so a key is only matched once and later
+    snapshots resolve by lookup. A mention whose ticker and name belong to
+    two ids (e.g. an IPO row linking a ticker to a deal's company name)
+    merges them into the older id, unless the names are incompatible: then
+    the ticker was recycled and moves to the newer company.
+    """
+
+    def __init__(self, path=COMPANY_INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, source TEXT, mtime_ns INTEGER, size INTEGER, indexed_at REAL);"
+            "CREATE TABLE IF NOT EXISTS companies (company_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, ticker TEXT);"
+            "CREATE TABLE IF NOT EXISTS keys (key TEXT PRIMARY KEY, company_id INTEGER, block TEXT);"
+            "CREATE INDEX IF NOT EXISTS keys_company ON keys (company_id);"
+            "CREATE INDEX IF NOT EXISTS keys_block ON keys (block);"
+            "CREATE TABLE IF NOT EXISTS mentions (company_id INTEGER, source TEXT, file TEXT, row INTEGER, ticker TEXT, name TEXT);"
+            "CREATE INDEX IF NOT EXISTS mentions_company ON mentions (company_id);"
+            "CREATE INDEX IF NOT EXISTS mentions_file ON mentions (file);"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(ticker, name):
+        keys = []
+        if normalize_ticker(ticker):
+            keys.append(f"ticker:{normalize_ticker(ticker)}")
+        if normalize_company(name):
+            keys.append(f"name:{normalize_company(name)}")
+        return keys
+
+    def _fuzzy_match(self, name_key, ticker):
+        block = block_key(name_key)
+        candidates = self._db.execute(
+            "SELECT keys.key, keys.company_id, companies.ticker FROM keys JOIN companies USING (company_id) "
+            "WHERE keys.block = ? LIMIT ?", (block, MAX_BLOCK_SIZE + 1)
+        ).fetchall()
+        if len(candidates) > MAX_BLOCK_SIZE:
+            return None
+        markers = series_markers(name_key)
+        best, best_score = None, NAME_SIMILARITY
+        for key, company_id, company_ticker in candidates:
+            other = key[len('name:'):]
+            # A different ticker or series is a different company however close the names are
+            if (ticker and company_ticker and ticker != company_ticker) or series_markers(other) != markers:
+                continue
+            score = difflib.SequenceMatcher(None, name_key, other).ratio()
+            if score >= best_score:
+                best, best_score = company_id, score
+        return best
+
+    def _merge(self, keep, other):
+        for table in ('keys', 'mentions'):
+            self._db.execute(f"UPDATE {table} SET company_id = ? WHERE company_id = ?", (keep, other))
+        self._db.execute(
+            "UPDATE companies SET name = COALESCE(name, (SELECT name FROM companies WHERE company_id = ?)), "
+            "ticker = COALESCE(ticker, (SELECT ticker FROM companies WHERE company_id = ?)) WHERE company_id = ?",
+            (other, other, keep),
+        )
+        self._db.execute("DELETE FROM companies WHERE company_id = ?", (other,))
+
+    def _resolve(self, ticker, name):
+        """Company id of a mention, creating or merging companies as needed. Call with the lock held."""
+        keys = self._keys(ticker, name)
+        if not keys:
+            return None
+        known = {}
+        for key in keys:
+            row = self._db.execute("SELECT company_id FROM keys WHERE key = ?", (key,)).fetchone()
+            if row:
+                known[key] = row[0]
+        ticker_key = keys[0] if keys[0].startswith('ticker:') else None
+        name_key = normalize_company(name)
+        reassign = None
+        if ticker_key in known and name_key and known.get(f"name:{name_key}") != known[ticker_key]:
+            row = self._db.execute("SELECT name FROM companies WHERE company_id = ?", (known[ticker_key],)).fetchone()
+            if row and row[0] and not names_compatible(normalize_company(row[0]), name_key):
+                # A recycled ticker or another exchange's code: it now points at this name's company
+                reassign = known.pop(ticker_key)
+        ids = sorted(set(known.values()))
+        if not ids and name_key:
+            match = self._fuzzy_match(name_key, None if reassign else normalize_ticker(ticker))
+            ids = [match] if match is not None else []
+        if ids:
+            company_id = ids[0]
+            for other in ids[1:]:
+                self._merge(company_id, other)
+            self._db.execute(
+                "UPDATE companies SET name = COALESCE(name, ?), ticker = COALESCE(?, ticker) WHERE company_id = ?",
+                (name if name_key else None, normalize_ticker(ticker) or None, company_id),
+            )
+        else:
+            company_id = self._db.execute(
+                "INSERT INTO companies (name, ticker) VALUES (?, ?)",
+                (name if name_key else None, normalize_ticker(ticker) or None),
+            ).lastrowid
+        for key in keys:
+            if key not in known:
+                block = block_key(key[len('name:'):]) if key.startswith('name:') else None
+                self._db.execute("INSERT OR REPLACE INTO keys VALUES (?, ?, ?)", (key, company_id, block))
+        return company_id
+
+    def refresh(self, files=None):
+        """
+        Resolve the mentions of new and changed files and drop the ones that are gone.
+
+        :param files: (source, path) pairs, defaults to people.source_files().
+        :return: Number of files (re-)indexed.
+        """
+        files = source_files() if files is None else files
+        # Tickers and names from the IPO dataset link the other sources, so resolve it first
+        files = sorted(files, key=lambda item: item[0] != 'ipo_dataset')
+        with self._lock:
+            known = {row[0]: (row[1], row[2]) for row in self._db.execute("SELECT file, mtime_ns, size FROM files")}
+        # Archived snapshots keep their mentions instead of being resolved again
+        moved = moved_files(files, known)
+        if moved:
+            with self._lock, self._db:
+                self._db.executemany("UPDATE files SET file = ? WHERE file = ?", [(new, old) for old, new in moved.items()])
+                self._db.executemany("UPDATE mentions SET file = ? WHERE file = ?", [(new, old) for old, new in moved.items()])
+            known = {moved.get(file, file): stat for file, stat in known.items()}
+        indexed, seen = 0, set()
+        for source, path in files:
+            file = file_key(source, path)
+            seen.add(file)
+            stat = os.stat(path)
+            if known.get(file) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            mentions = extract_mentions(source, path)
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM mentions WHERE file = ?", (file,))
+                for ticker, name, row in mentions:
+                    company_id = self._resolve(ticker, name)
+                    if company_id is not None:
+                        self._db.execute(
+                            "INSERT INTO mentions VALUES (?, ?, ?, ?, ?, ?)",
+                            (company_id, source, file, row, normalize_ticker(ticker) or None, name if isinstance(name, str) else None),
+                        )
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (file, source, stat.st_mtime_ns, stat.st_size, time.time()))
+            indexed += 1
+        stale = set(known) - seen
+        if stale:
+            with self._lock, self._db:
+                self._db.executemany("DELETE FROM mentions WHERE file = ?", [(file,) for file in stale])
+                self._db.executemany("DELETE FROM files WHERE file = ?", [(file,) for file in stale])
+        return indexed
+
+    def lookup(self, ticker=None, name=None):
+        """
+        Company id of a ticker or name, without resolving unknown ones.
+
+        :return: Company id, or None.
+        """
+        with self._lock:
+            for key in self._keys(ticker, name):
+                row = self._db.execute("SELECT company_id FROM keys WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return row[0]
+        return None
+
+    def company_ids(self, tickers=None, names=None):
+        """
+        Company ids for columns of tickers and/or names, by lookup only.
+
+        Each distinct value is looked up once; a ticker's id wins over its name's.
+
+        :param tickers: Series of tickers ('AZI, RITR' uses the first), or None.
+        :param names: Series of company names, or None.
+        :return: Series of nullable integer ids aligned with the input.
+        """
+        base = tickers if tickers is not None else names
+        ids = pd.Series(pd.NA, index=base.index, dtype='Int64')
+        with self._lock:
+            for values, kind in ((names, 'name'), (tickers, 'ticker')):
+                if values is None:
+                    continue
+                if kind == 'ticker':
+                    keys = values.map(lambda value: f"ticker:{normalize_ticker(value.split(',')[0])}" if isinstance(value, str) else None)
+                else:
+                    keys = values.map(lambda value: f"name:{normalize_company(value)}" if isinstance(value, str) else None)
+                distinct = [key for key in keys.dropna().unique()]
+                found = {}
+                for start in range(0, len(distinct), 500):
+                    chunk = distinct[start:start + 500]
+                    found.update(self._db.execute(
+                        f"SELECT key, company_id FROM keys WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall())
+                resolved = keys.map(found).astype('Int64')
+                ids = resolved.fillna(ids) if kind == 'ticker' else ids.fillna(resolved)
+        return ids
+
+    def company(self, company_id):
+        """Name and ticker of a company, or None."""
+        with self._lock:
+            row = self._db.execute("SELECT name, ticker FROM companies WHERE company_id = ?", (company_id,)).fetchone()
+        return {'company_id': company_id, 'name': row[0], 'ticker': row[1]} if row else None
+
+    def mentions(self, company_id):
+        """
+        Every row mentioning a company.
+
+        :return: DataFrame with Source, File, Row, Ticker and Name.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT source, file, row, ticker, name FROM mentions WHERE company_id = ? ORDER BY source, file, row",
+                (company_id,),
+            ).fetchall()
+        return pd.DataFrame(rows, columns=['Source', 'File', 'Row', 'Ticker', 'Name'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Resolve company mentions in every dataset to stable ids.')
+    parser.add_argument('--rebuild', action='store_true', help='Drop the index and resolve from scratch (ids change).')
+    parser.add_argument('--lookup', help='Print the mentions of this ticker or company name afterwards.')
+    args = parser.parse_args()
+    if args.rebuild and os.path.exists(COMPANY_INDEX_PATH):
+        os.remove(COMPANY_INDEX_PATH)
+    index = CompanyIndex()
+    start = time.perf_counter()
+    print(f"Indexed {index.refresh()} files in {time.perf_counter() - start:.1f}s")
+    if args.lookup:
+        company_id = index.lookup(ticker=args.lookup) or index.lookup(name=args.lookup)
+        print(index.company(company_id))
+        if company_id is not None:
+            print(index.mentions(company_id).to_string())
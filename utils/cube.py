@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+DEAL_DIMENSIONS = ['Industry', 'Country', 'Stage', 'Size Floor']
+IPO_DIMENSIONS = ['Industry', 'Country']
+
+def normalize_stage(stage):
+    """Investment stage without its sub-stage, e.g. 'Series A - II' -> 'Series A'."""
+    return str(stage).split('-')[0].strip()
+
+def _encode(df, dimensions):
+    # Categorical dimensions keep the cube compact and make slice masks cheap
+    for dimension in dimensions:
+        if dimension != 'Size Floor':
+            df[dimension] = df[dimension].astype('category')
+    return df
+
+def build_deal_cube(cb_deals):
+    """
+    Pre-aggregate deals into daily counts and deal-size sums.
+
+    One row per Date x Industry x Country x Stage x Size Floor, where Size Floor
+    is the integer part of 'Deal Size (M)'. Because the minimum deal size filter
+    only takes whole numbers, `size >= m` is the same as `Size Floor >= m`, so any
+    sidebar filter combination can be answered from the cube alone.
+    Deals without a size are left out, as the Dashboard always dropped them.
+
+    :param cb_deals: CB Insights deals with 'Deal Date' parsed.
+    :return: DataFrame with the dimension columns plus 'Date', 'Deals' and 'Deal Size Sum'.
+    """
+    deals = cb_deals.dropna(subset=['Deal Size (M)'])
+    keys = pd.DataFrame({
+        'Date': deals['Deal Date'].dt.normalize(),
+        'Industry': deals['Industry'].map(str),
+        'Country': deals['Country'].map(str),
+        'Stage': deals['Investment Stage'].map(normalize_stage),
+        'Size Floor': np.floor(deals['Deal Size (M)']).astype(int),
+        'Deal Size (M)': deals['Deal Size (M)'],
+    })
+    cube = keys.groupby(['Date'] + DEAL_DIMENSIONS, sort=True, observed=True)['Deal Size (M)'].agg(['size', 'sum'])
+    cube = cube.rename(columns={'size': 'Deals', 'sum': 'Deal Size Sum'}).reset_index()
+    return _encode(cube, DEAL_DIMENSIONS)
+
+def build_ipo_cube(ipo_data):
+    """
+    Pre-aggregate IPOs into daily counts by Industry x Country.
+
+    :param ipo_data: IPO dataset with 'IPO Date' parsed.
+    :return: DataFrame with 'Date', 'Industry', 'Country' and 'IPOs' columns.
+    """
+    ipos = ipo_data.dropna(subset=['IPO Date'])
+    keys = pd.DataFrame({
+        'Date': ipos['IPO Date'].dt.normalize(),
+        'Industry': ipos['Industry'].map(str),
+        'Country': ipos['Country'].map(str),
+    })
+    cube = keys.groupby(['Date'] + IPO_DIMENSIONS, sort=True, observed=True).size().rename('IPOs').reset_index()
+    return _encode(cube, IPO_DIMENSIONS)
+
+def slice_cube(cube, selections, start, end, min_size=None):
+    """
+    Select the cube rows matching a filter combination.
+
+    :param cube: Cube built by build_deal_cube or build_ipo_cube.
+    :param selections: Dict of dimension -> selected values; a selection containing 'All' is ignored.
+    :param start: First day of the range (inclusive).
+    :param end: Last day of the range (inclusive).
+    :param min_size: Optional minimum deal size in whole millions.
+    :return: Matching cube rows.
+    """
+    mask = (cube['Date'] >= pd.Timestamp(start).normalize()) & (cube['Date'] <= pd.Timestamp(end))
+    for dimension, selected in selections.items():
+        if 'All' not in selected:
+            mask &= cube[dimension].isin(selected)
+    if min_size:
+        mask &= cube['Size Floor'] >= min_size
+    return cube[mask]
+
+def daily_totals(cube_slice, measure, start, end):
+    """
+    Sum a cube slice per day over every day of the range, filling gaps with 0.
+
+    :param cube_slice: Rows returned by slice_cube.
+    :param measure: Column to sum ('Deals', 'Deal Size Sum' or 'IPOs').
+    :param start: First day of the range.
+    :param end: Last day of the range.
+    :return: Series indexed by day.
+    """
+    all_dates = pd.date_range(start=pd.Timestamp(start).normalize(), end=pd.Timestamp(end).normalize(), freq='D')
+    totals = cube_slice.groupby('Date')[measure].sum()
+    return totals.reindex(all_dates, fill_value=0)
+
+# Chart buckets from finest to coarsest, with the pandas period frequency used for each
+BUCKETS = {'Day': 'D', 'Week': 'W', 'Month': 'M', 'Quarter': 'Q', 'Year': 'Y'}
+MAX_CHART_POINTS = 180
+
+def bucket_count(start, end, bucket):
+    """Number of buckets of the given size needed to cover the range."""
+    return len(pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq=BUCKETS[bucket]))
+
+def choose_bucket(start, end, requested='Auto', max_points=MAX_CHART_POINTS):
+    """
+    Pick the chart bucket for a date range.
+
+    'Auto' picks the finest bucket that fits within max_points. An explicit
+    request is honoured when it fits, otherwise the next coarser bucket that
+    fits is used so the payload sent to the browser stays capped.
+
+    :param start: First day of the range.
+    :param end: Last day of the range.
+    :param requested: 'Auto' or one of the BUCKETS names.
+    :param max_points: Maximum number of bars per trace.
+    :return: Name of the bucket to use.
+    """
+    names = list(BUCKETS)
+    candidates = names if requested == 'Auto' else names[names.index(requested):]
+    for bucket in candidates:
+        if bucket_count(start, end, bucket) <= max_points:
+            return bucket
+    return names[-1]
+
+def bucket_totals(daily, bucket):
+    """
+    Re-aggregate a daily Series into buckets labelled by their first day.
+
+    :param daily: Series indexed by day, e.g. from daily_totals.
+    :param bucket: One of the BUCKETS names.
+    :return: Series indexed by bucket start date.
+    """
+    if bucket == 'Day':
+        return daily
+    periods = daily.index.to_period(BUCKETS[bucket])
+    totals = daily.groupby(periods).sum()
+    totals.index = totals.index.start_time
+    return totals
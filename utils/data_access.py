@@ -0,0 +1,236 @@
+import os
+import glob
+import pandas as pd
+import streamlit as st
+from utils.cube import build_deal_cube, build_ipo_cube, normalize_stage
+from utils.filters import add_filter_columns, build_mask_index
+from utils.renatus import DEAL_RECORDS_PATH, read_deal_records, rebuild_deal_records
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
+from utils.companies import COMPANY_INDEX_PATH, CompanyIndex
+from utils.snapshot_diff import diff_hashes, load_hashes
+
+SCRAPED_NEWS_DIRECTORY = "./utils/data/Scraped News/"
+RENATUS_DIRECTORY = "./utils/data/Renatus Newsletter/"
+CB_DEALS_PATH = "./utils/data/CB Insights/cleaned_cb_deals.csv"
+IPO_DATASET_PATH = "./utils/data/IPO dataset/ipo_dataset.csv"
+DEAL_FILTER_COLUMNS = ('Industry', 'Country', 'Stage')
+IPO_FILTER_COLUMNS = ('Industry', 'Country')
+
+def get_latest_file(directory, file_pattern):
+    """
+    Get the latest file in the directory that matches the file pattern.
+
+    :param directory: Directory where to look for files.
+    :param file_pattern: Pattern to match files (e.g., 'cnbc_data_*.csv').
+    :return: Path to the latest file.
+    """
+    files = glob.glob(os.path.join(directory, file_pattern))
+    if not files:
+        return None
+    latest_file = max(files, key=os.path.getctime)
+    return latest_file
+
+def snapshot_key(path):
+    """
+    Identity of a snapshot file on disk.
+
+    The key changes whenever the scraper rewrites the file, so cache entries
+    built from it are only invalidated when a new snapshot lands.
+
+    :param path: Path to the snapshot file.
+    :return: Tuple of (absolute path, mtime in ns, size in bytes).
+    """
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _read_snapshot(path, mtime_ns, size, columns=None, parse_dates=(), timezone=None):
+    # mtime_ns and size are only part of the cache key
+    df = pd.read_csv(path, usecols=lambda c: columns is None or c in columns)
+    for column in parse_dates:
+        if timezone:
+            df[column] = normalize_timestamps(df[column], timezone=timezone)
+        else:
+            df[column] = pd.to_datetime(df[column])
+    return df
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _unique_values(path, mtime_ns, size, column, transform=None):
+    df = _read_snapshot(path, mtime_ns, size, columns=(column,))
+    values = df[column]
+    if transform == 'stage':
+        values = values.map(normalize_stage)
+    return sorted(set(map(lambda x: str(x), values.unique())))
+
+def load_snapshot(path, columns=None, parse_dates=(), timezone=None):
+    """
+    Load a CSV snapshot, shared across reruns and sessions until the file changes.
+
+    :param path: Path to the CSV file.
+    :param columns: Optional iterable of columns to read; others are skipped at parse time.
+    :param parse_dates: Columns to convert to datetime once at load.
+    :param timezone: Convert parse_dates to UTC with normalize_timestamps, reading values without an offset in this zone.
+    :return: DataFrame with the requested columns.
+    """
+    columns = tuple(columns) if columns is not None else None
+    return _read_snapshot(*snapshot_key(path), columns=columns, parse_dates=tuple(parse_dates), timezone=timezone)
+
+def load_unique_values(path, column, transform=None):
+    """
+    Sorted unique string values of a column, cached per snapshot.
+
+    :param path: Path to the CSV file.
+    :param column: Column to collect values from.
+    :param transform: Optional named normalisation ('stage' keeps the part before '-').
+    :return: Sorted list of strings.
+    """
+    return _unique_values(*snapshot_key(path), column, transform=transform)
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _changed_rows(baseline_hashes, path, mtime_ns, size, selection):
+    # Only the hash sidecars are read, never the article text
+    diff = diff_hashes(baseline_hashes, load_hashes(path, selection))
+    return frozenset(diff.loc[diff['Status'] != 'removed', 'New Row'].astype(int))
+
+def load_changed_rows(selection, baseline_hashes):
+    """
+    Rows of the latest snapshot of a news source added or updated since a baseline snapshot.
+
+    :param selection: Source name as used in snapshot filenames (e.g. 'cnbc').
+    :param baseline_hashes: Hashes of the earlier snapshot (snapshot_diff.last_visit), or None to treat every row as new.
+    :return: Frozenset of row positions in the latest snapshot, matching the index of load_latest_news.
+    """
+    latest_file = latest_news_file(selection)
+    if latest_file is None:
+        return frozenset()
+    return _changed_rows(baseline_hashes, *snapshot_key(latest_file), selection)
+
+def latest_news_file(selection):
+    """Path to the latest scraped snapshot for a news source, or None."""
+    return get_latest_file(SCRAPED_NEWS_DIRECTORY, f"{selection}_data_*.csv")
+
+def load_latest_news(selection, columns=None):
+    """
+    Load the latest scraped snapshot for a news source with 'Time' as UTC timestamps.
+
+    :param selection: Source name as used in snapshot filenames (e.g. 'cnbc').
+    :param columns: Optional iterable of columns to read.
+    :return: DataFrame, or None if no snapshot exists yet.
+    """
+    latest_file = latest_news_file(selection)
+    if latest_file is None:
+        return None
+    # Snapshots from before timestamps were stored in UTC hold the site's local time
+    return load_snapshot(latest_file, columns=columns, parse_dates=('Time',), timezone=SOURCE_TIMEZONES.get(selection, 'UTC'))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cb_deals(path, mtime_ns, size):
+    return add_filter_columns(_read_snapshot(path, mtime_ns, size, parse_dates=('Deal Date',)))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _deal_mask_index(path, mtime_ns, size):
+    return build_mask_index(_cb_deals(path, mtime_ns, size), DEAL_FILTER_COLUMNS)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _ipo_mask_index(path, mtime_ns, size):
+    return build_mask_index(_read_snapshot(path, mtime_ns, size, parse_dates=('IPO Date',)), IPO_FILTER_COLUMNS)
+
+def load_cb_deals():
+    """Load the CB Insights deals dataset with 'Deal Date' parsed and filter columns added."""
+    return _cb_deals(*snapshot_key(CB_DEALS_PATH))
+
+def load_ipo_data():
+    """Load the IPO dataset with 'IPO Date' parsed."""
+    return load_snapshot(IPO_DATASET_PATH, parse_dates=('IPO Date',))
+
+def load_deal_mask_index():
+    """Per-value filter masks over the rows returned by load_cb_deals."""
+    return _deal_mask_index(*snapshot_key(CB_DEALS_PATH))
+
+def load_ipo_mask_index():
+    """Per-value filter masks over the rows returned by load_ipo_data."""
+    return _ipo_mask_index(*snapshot_key(IPO_DATASET_PATH))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _deal_cube(path, mtime_ns, size):
+    return build_deal_cube(_read_snapshot(path, mtime_ns, size, parse_dates=('Deal Date',)))
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _ipo_cube(path, mtime_ns, size):
+    return build_ipo_cube(_read_snapshot(path, mtime_ns, size, parse_dates=('IPO Date',)))
+
+def load_deal_cube():
+    """Daily deal count/size cube for the CB Insights deals, built once per snapshot."""
+    return _deal_cube(*snapshot_key(CB_DEALS_PATH))
+
+def load_ipo_cube():
+    """Daily IPO count cube for the IPO dataset, built once per snapshot."""
+    return _ipo_cube(*snapshot_key(IPO_DATASET_PATH))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _renatus_deals(path, mtime_ns, size):
+    return read_deal_records(path)
+
+def load_renatus_deals():
+    """
+    Structured Renatus deal records across all newsletters.
+
+    The table is written at scrape time; it is built from the saved
+    newsletter snapshots the first time if it does not exist yet.
+    """
+    if not os.path.exists(DEAL_RECORDS_PATH):
+        rebuild_deal_records()
+    if not os.path.exists(DEAL_RECORDS_PATH):
+        return None
+    return _renatus_deals(*snapshot_key(DEAL_RECORDS_PATH))
+
+# dataset -> (path, ticker column, name column)
+COMPANY_ID_COLUMNS = {
+    'ipo': (IPO_DATASET_PATH, 'Symbol', 'Company Name'),
+    'deals': (CB_DEALS_PATH, None, 'Companies'),
+    'marketinsights': (None, 'ticker', None),
+    'stockanalysis': (None, 'Tickers', None),
+}
+
+@st.cache_resource
+def _company_index():
+    return CompanyIndex()
+
+def _company_index_version():
+    # Ids change when the worker resolves a new snapshot into the index
+    return os.stat(COMPANY_INDEX_PATH).st_mtime_ns if os.path.exists(COMPANY_INDEX_PATH) else 0
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _dataset_company_ids(path, mtime_ns, size, version, dataset):
+    _, ticker_column, name_column = COMPANY_ID_COLUMNS[dataset]
+    df = _read_snapshot(path, mtime_ns, size, columns=tuple(column for column in (ticker_column, name_column) if column))
+    return _company_index().company_ids(
+        tickers=df[ticker_column] if ticker_column else None,
+        names=df[name_column] if name_column else None,
+    )
+
+def load_company_ids(dataset):
+    """
+    Company id of every row of load_ipo_data() ('ipo') or load_cb_deals() ('deals').
+
+    Ids come from the company index (utils/companies.py) by lookup only, and
+    are cached until the dataset or the index changes.
+
+    :return: Series of nullable integer ids with the dataset's index.
+    """
+    path = COMPANY_ID_COLUMNS[dataset][0]
+    return _dataset_company_ids(*snapshot_key(path), _company_index_version(), dataset)
+
+def news_company_ids(df, selection):
+    """Company ids of the rows of a 'marketinsights' or 'stockanalysis' news frame, by their tickers."""
+    return _company_index().company_ids(tickers=df[COMPANY_ID_COLUMNS[selection][1]])
+
+def company_names(company_ids):
+    """Dict of company id -> display name ('Name (TICKER)')."""
+    names = {}
+    for company_id in company_ids:
+        company = _company_index().company(int(company_id))
+        if company:
+            label = company['name'] or company['ticker']
+            names[int(company_id)] = f"{label} ({company['ticker']})" if company['name'] and company['ticker'] else label
+    return names
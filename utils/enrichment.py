@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from utils.people import PeopleIndex, normalize_name
+from utils.search import cached_search
+
+PROFILES_PATH = "./utils/data/Profiles/profiles.sqlite"
+SECRETS_PATH = "./.streamlit/secrets.toml"
+# Datasets whose people get searched; the CB Insights deals are left out to keep searches affordable
+ENRICHED_SOURCES = ('marketinsights', 'stockanalysis', 'ipo_dataset')
+
+def collect_people(index=None):
+    """
+    Gather every person mentioned in the scraped news and IPO data.
+
+    Sources: MarketScreener 'People' tables, stockanalysis 'Executives' and
+    the IPO dataset 'People' column, read through the people index, which is
+    brought up to date first.
+
+    :param index: PeopleIndex to read from.
+    :return: DataFrame with Name, Name Key, Role, Company and Source columns.
+    """
+    index = index or PeopleIndex()
+    index.refresh()
+    people = index.table(sources=ENRICHED_SOURCES)
+    return people[['Name', 'Name Key', 'Role', 'Company', 'Source']]
+
+def dedupe_people(people):
+    """
+    One row per person, merging appearances across sources.
+
+    The search company is the one the person appears with most often.
+
+    :param people: DataFrame from collect_people.
+    :return: DataFrame with Name Key, Name, Company, Roles and Sources.
+    """
+    grouped = people.groupby('Name Key', sort=True)
+    return pd.DataFrame({
+        'Name': grouped['Name'].first(),
+        'Company': grouped['Company'].agg(lambda x: x.mode().iloc[0] if not x.mode().empty else ''),
+        'Roles': grouped['Role'].agg(lambda x: sorted(set(map(str, x.dropna())))),
+        'Sources': grouped['Source'].agg(lambda x: sorted(set(x))),
+    }).reset_index()
+
+def search_person(person_name, company_name=None, api_key=None, before_fetch=None):
+    """
+    News results about a person, falling back to a web search when there are none.
+
+    Searches go through the shared search cache; before_fetch is called before
+    each one that is not answered from it.
+    """
+    if company_name:
+        query = f'{person_name} {company_name}'
+    else:
+        query = f'{person_name} startup'
+
+    params = {
+        "q": query,
+        "google_domain": "google.com",
+        "tbm": "nws",  # Search only in news for timely information
+        "num": 10,     # Number of results to fetch
+        "api_key": api_key,
+    }
+    results = cached_search(params, before_fetch)
+    if "news_results" in results:
+        return results["news_results"]
+    params = {
+        "q": query,
+        "engine": "google",
+        "google_domain": "google.com",
+        "num": 10,     # Number of results to fetch
+        "api_key": api_key,
+    }
+    return cached_search(params, before_fetch)
+
+class RateLimiter:
+    """Token bucket shared by all worker threads."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class ProfileStore:
+    """Search results per person, keyed on the normalised name."""
+
+    def __init__(self, path=PROFILES_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles (name_key TEXT PRIMARY KEY, name TEXT, company TEXT, "
+            "roles TEXT, sources TEXT, results TEXT, fetched_at REAL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def known_keys(self, max_age=None):
+        query, args = "SELECT name_key FROM profiles", ()
+        if max_age is not None:
+            query, args = query + " WHERE fetched_at >= ?", (time.time() - max_age,)
+        with self._lock:
+            return {row[0] for row in self._db.execute(query, args)}
+
+    def put(self, person, results):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (person['Name Key'], person['Name'], person['Company'], json.dumps(person['Roles']),
+                 json.dumps(person['Sources']), json.dumps(results), time.time()),
+            )
+            self._db.commit()
+
+    def get(self, name):
+        """
+        Stored profile for a person, or None.
+
+        :param name: Person's name in any capitalisation or with honorifics.
+        :return: Dict with name, company, roles, sources, results and fetched_at.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, company, roles, sources, results, fetched_at FROM profiles WHERE name_key = ?",
+                (normalize_name(name),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'name': row[0], 'company': row[1], 'roles': json.loads(row[2]), 'sources': json.loads(row[3]),
+            'results': json.loads(row[4]), 'fetched_at': row[5],
+        }
+
+def enrich_people(api_key, max_workers=8, rate=2.0, max_age=30 * 24 * 60 * 60, limit=None, store=None):
+    """
+    Search every known person concurrently and store the results.
+
+    People already enriched within max_age are skipped, and searches are
+    throttled to `rate` requests per second across all workers.
+
+    :param api_key: SerpAPI key.
+    :param max_workers: Concurrent searches.
+    :param rate: Searches per second across all workers.
+    :param max_age: Seconds before a stored profile is searched again.
+    :param limit: Optional cap on the number of people searched in this run.
+    :param store: ProfileStore to write to.
+    :return: Number of people enriched.
+    """
+    store = store or ProfileStore()
+    people = dedupe_people(collect_people())
+    people = people[~people['Name Key'].isin(store.known_keys(max_age))]
+    if limit:
+        people = people.head(limit)
+    print(f"Enriching {len(people)} people")
+
+    limiter = RateLimiter(rate)
+
+    def enrich(person):
+        # Only searches that reach SerpAPI count against the rate
+        results = search_person(person['Name'], person['Company'], api_key, before_fetch=limiter.acquire)
+        if isinstance(results, dict) and 'error' in results:
+            # Quota, key and no-result errors are not profiles, the person is searched again next run
+            raise RuntimeError(results['error'])
+        store.put(person, results)
+
+    enriched = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(enrich, person): person['Name'] for _, person in people.iterrows()}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                enriched += 1
+            except Exception as e:
+                print(f"Failed to enrich {futures[future]}: {e}")
+    print(f"Enriched {enriched} people")
+    return enriched
+
+def read_api_key():
+    """SerpAPI key from SERP_API_KEY or the Streamlit secrets file."""
+    if os.environ.get('SERP_API_KEY'):
+        return os.environ['SERP_API_KEY']
+    import toml
+    return toml.load(SECRETS_PATH)['serp_api_key']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Search and store profiles for every person in the scraped data.')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent searches.')
+    parser.add_argument('--rate', type=float, default=2.0, help='Searches per second across all workers.')
+    parser.add_argument('--max-age-days', type=float, default=30, help='Re-search profiles older than this.')
+    parser.add_argument('--limit', type=int, default=None, help='Search at most this many people.')
+    args = parser.parse_args()
+    enrich_people(read_api_key(), args.workers, args.rate, args.max_age_days * 24 * 60 * 60, args.limit)
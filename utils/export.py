@@ -0,0 +1,130 @@
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+from io import BytesIO, TextIOWrapper
+
+import pandas as pd
+import streamlit as st
+from xlsxwriter import Workbook
+
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/octet-stream'),
+}
+
+def _cell(value):
+    """Convert a DataFrame value into something xlsxwriter can write."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set, dict)):
+        return str(value)
+    if pd.isna(value):
+        return None
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # Excel has no timezone support, write UTC wall time
+        return value.tz_convert('UTC').tz_localize(None) if isinstance(value, pd.Timestamp) else value.replace(tzinfo=None)
+    return value
+
+def write_excel(sheets, path):
+    """
+    Write DataFrames to an xlsx file row by row in xlsxwriter's constant-memory mode.
+
+    Each row is flushed to disk as soon as it is written, so memory use does not
+    grow with the number of rows.
+
+    :param sheets: Dict of sheet name -> DataFrame.
+    :param path: Output file path.
+    """
+    workbook = Workbook(path, {'constant_memory': True, 'strings_to_urls': False})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    for sheet_name, df in sheets.items():
+        worksheet = workbook.add_worksheet(sheet_name[:31])
+        worksheet.write_row(0, 0, [str(column) for column in df.columns])
+        for row_number, row in enumerate(df.itertuples(index=False, name=None), start=1):
+            for column_number, value in enumerate(row):
+                value = _cell(value)
+                if value is None:
+                    continue
+                if isinstance(value, datetime):
+                    worksheet.write_datetime(row_number, column_number, value, date_format)
+                else:
+                    worksheet.write(row_number, column_number, value)
+    workbook.close()
+
+def export_bytes(sheets, fmt):
+    """
+    Serialise DataFrames in the requested export format.
+
+    Excel puts each DataFrame on its own sheet. CSV and Parquet return a single
+    file for one DataFrame, or a zip archive with one file per DataFrame.
+
+    :param sheets: Dict of sheet name -> DataFrame.
+    :param fmt: One of EXPORT_FORMATS.
+    :return: Tuple of (file bytes, file extension, mime type).
+    """
+    extension, mime = EXPORT_FORMATS[fmt]
+    if fmt == 'Excel':
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.xlsx')
+            write_excel(sheets, path)
+            with open(path, 'rb') as f:
+                return f.read(), extension, mime
+
+    def write_one(df, f):
+        if fmt == 'CSV':
+            df.to_csv(f, index=False)
+        else:
+            # Parquet needs one type per column, so mixed object columns are written as text
+            objects = df.select_dtypes(include='object').columns
+            df = df.assign(**{column: df[column].map(lambda v: None if _cell(v) is None else str(v)) for column in objects})
+            df.to_parquet(f, index=False)
+
+    if len(sheets) == 1:
+        output = BytesIO()
+        write_one(next(iter(sheets.values())), output)
+        return output.getvalue(), extension, mime
+
+    output = BytesIO()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for sheet_name, df in sheets.items():
+            with archive.open(f'{sheet_name}.{extension}', 'w') as f:
+                if fmt == 'CSV':
+                    with TextIOWrapper(f, encoding='utf-8', newline='') as text:
+                        write_one(df, text)
+                else:
+                    write_one(df, f)
+    return output.getvalue(), 'zip', 'application/zip'
+
+@st.cache_data(show_spinner="Preparing export...", max_entries=16)
+def _cached_export(state, fmt, _build_sheets):
+    # Only the filter state and format form the cache key; the builder is not hashed
+    return export_bytes(_build_sheets(), fmt)
+
+def export_widget(build_sheets, state, file_stem, key):
+    """
+    Offer a download that is only generated when the user asks for it.
+
+    The file is built by calling build_sheets() after the prepare button is
+    pressed, and the bytes are cached per (state, format) so switching back to
+    an already exported filter combination is instant.
+
+    :param build_sheets: Callable returning a dict of sheet name -> DataFrame.
+    :param state: Hashable description of the data, i.e. the snapshot(s) and filters that produced it.
+    :param file_stem: Download file name without extension.
+    :param key: Unique widget key prefix.
+    """
+    fmt = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"{key}_format")
+    requested_key = f"{key}_requested"
+    if st.button(f"Prepare {fmt} export", key=f"{key}_prepare"):
+        st.session_state[requested_key] = (state, fmt)
+    if st.session_state.get(requested_key) == (state, fmt):
+        data, extension, mime = _cached_export(state, fmt, build_sheets)
+        st.download_button(
+            label=f"Download {fmt}",
+            data=data,
+            file_name=f"{file_stem}.{extension}",
+            mime=mime,
+            key=f"{key}_download",
+        )
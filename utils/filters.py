@@ -0,0 +1,55 @@
+import numpy as np
+from utils.cube import normalize_stage
+
+def add_filter_columns(cb_deals):
+    """
+    Add normalised columns used by the Dashboard filters.
+
+    'Stage' holds the investment stage without its sub-stage, so it is computed
+    once at load instead of on every rerun.
+
+    :param cb_deals: CB Insights deals DataFrame.
+    :return: The same DataFrame with a 'Stage' column.
+    """
+    cb_deals['Stage'] = cb_deals['Investment Stage'].map(normalize_stage)
+    return cb_deals
+
+def build_mask_index(df, columns):
+    """
+    Build per-value boolean masks for the given columns.
+
+    Values are keyed by their string form, matching the options shown in the
+    sidebar multiselects.
+
+    :param df: DataFrame to index.
+    :param columns: Columns to build masks for.
+    :return: Dict of column -> {value: numpy boolean array of len(df)}.
+    """
+    index = {}
+    for column in columns:
+        codes, uniques = (df[column].map(str)).factorize()
+        index[column] = {value: codes == code for code, value in enumerate(uniques)}
+    return index
+
+def resolve_mask(index, selections, length):
+    """
+    Combine precomputed masks for a filter combination.
+
+    Values selected within one column are OR-ed, columns are AND-ed. A selection
+    containing 'All' leaves its column unfiltered.
+
+    :param index: Mask index from build_mask_index.
+    :param selections: Dict of column -> selected values.
+    :param length: Number of rows in the indexed DataFrame.
+    :return: Numpy boolean array of matching rows.
+    """
+    mask = np.ones(length, dtype=bool)
+    for column, selected in selections.items():
+        if 'All' in selected:
+            continue
+        column_mask = np.zeros(length, dtype=bool)
+        for value in selected:
+            if value in index[column]:
+                column_mask |= index[column][value]
+        mask &= column_mask
+    return mask
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+JOBS_PATH = "./utils/data/Jobs/jobs.sqlite"
+
+@contextmanager
+def _connect(path=JOBS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, "
+            "status TEXT, progress TEXT, error TEXT, snapshot TEXT, "
+            "enqueued_at REAL, started_at REAL, finished_at REAL, worker TEXT, heartbeat_at REAL)"
+        )
+        # Queues created before heartbeats were recorded
+        if 'heartbeat_at' not in {row[1] for row in db.execute("PRAGMA table_info(jobs)")}:
+            db.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        yield db
+    finally:
+        db.close()
+
+def _as_dict(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)} if row else None
+
+def enqueue(source, cooldown=None, path=JOBS_PATH):
+    """
+    Request a scrape of a source.
+
+    Single-flight: if a job for the source is already queued or running, its
+    id is returned instead of adding another one. With a cooldown (seconds),
+    nothing is queued if a job for the source finished more recently.
+
+    :param source: 'cnbc', 'marketinsights', 'stockanalysis' or 'renatus'.
+    :param cooldown: Optional minimum seconds between finished jobs.
+    :param path: Queue database.
+    :return: Job id, or None when skipped because of the cooldown.
+    """
+    with _connect(path) as db:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT id FROM jobs WHERE source = ? AND status IN ('queued', 'running') ORDER BY id LIMIT 1", (source,)
+            ).fetchone()
+            if row:
+                return row[0]
+            if cooldown:
+                row = db.execute(
+                    "SELECT 1 FROM jobs WHERE source = ? AND finished_at >= ? LIMIT 1", (source, time.time() - cooldown)
+                ).fetchone()
+                if row:
+                    return None
+            cursor = db.execute(
+                "INSERT INTO jobs (source, status, progress, enqueued_at) VALUES (?, 'queued', 'Waiting for a worker', ?)",
+                (source, time.time()),
+            )
+            return cursor.lastrowid
+        finally:
+            db.execute("COMMIT")
+
+def claim_next(worker, path=JOBS_PATH):
+    """
+    Atomically take the oldest queued job.
+
+    :param worker: Name of the claiming worker.
+    :return: Job dict, or None if the queue is empty.
+    """
+    with _connect(path) as db:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+            job = _as_dict(cursor, cursor.fetchone())
+            if job:
+                db.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, worker = ?, progress = 'Started' WHERE id = ?",
+                    (time.time(), time.time(), worker, job['id']),
+                )
+            return job
+        finally:
+            db.execute("COMMIT")
+
+def update_progress(job_id, progress, path=JOBS_PATH):
+    """Set a running job's progress text, which also counts as a heartbeat."""
+    with _connect(path) as db:
+        db.execute("UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ?", (progress, time.time(), job_id))
+
+def heartbeat(job_id, path=JOBS_PATH):
+    """Record that the worker of a running job is still alive."""
+    with _connect(path) as db:
+        db.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+
+def finish(job_id, snapshot=None, path=JOBS_PATH):
+    with _connect(path) as db:
+        db.execute(
+            "UPDATE jobs SET status = 'done', progress = 'Published', snapshot = ?, finished_at = ? WHERE id = ?",
+            (snapshot, time.time(), job_id),
+        )
+
+def fail(job_id, error, path=JOBS_PATH):
+    with _connect(path) as db:
+        db.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+            (str(error), time.time(), job_id),
+        )
+
+def requeue_stale(stale_after, path=JOBS_PATH):
+    """
+    Put back jobs whose worker died, i.e. running without a heartbeat for stale_after seconds.
+
+    A slow job whose worker keeps beating is left alone, so it never runs twice at once.
+    """
+    with _connect(path) as db:
+        db.execute(
+            "UPDATE jobs SET status = 'queued', progress = 'Requeued after worker timeout' "
+            "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?",
+            (time.time() - stale_after,),
+        )
+
+def latest_job(source, path=JOBS_PATH):
+    """Most recent job for a source as a dict, or None."""
+    with _connect(path) as db:
+        cursor = db.execute("SELECT * FROM jobs WHERE source = ? ORDER BY id DESC LIMIT 1", (source,))
+        return _as_dict(cursor, cursor.fetchone())
+
+def publish_csv(df, path, **kwargs):
+    """
+    Write a snapshot so readers only ever see the complete file.
+
+    The CSV is written next to its destination and renamed into place.
+    """
+    temp_path = f"{path}.tmp"
+    df.to_csv(temp_path, **kwargs)
+    os.replace(temp_path, path)
+    return path
@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils import metrics
+
+JOURNAL_PATH = "./utils/data/Cache/scrape_journal.sqlite"
+RESUME_WITHIN = 12 * 60 * 60  # Seconds an unfinished run stays resumable; older runs start over
+
+class ScrapeJournal:
+    """
+    Durable record of the completed items of a long scrape run.
+
+    Every fetched URL is stored with its extracted result as soon as it is
+    done, keyed on (run name, kind, key). A run that crashes is resumed by the
+    next run of the same name: completed items are answered from the journal,
+    so only the unfinished ones are fetched again. finish() drops the run once
+    its output is safe.
+    """
+
+    def __init__(self, name, path=JOURNAL_PATH, resume_within=RESUME_WITHIN):
+        self.name = name
+        self.resume_within = resume_within
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (name TEXT PRIMARY KEY, started_at REAL);
+            CREATE TABLE IF NOT EXISTS items (
+                name TEXT, kind TEXT, key TEXT, result TEXT, completed_at REAL,
+                PRIMARY KEY (name, kind, key)
+            ) WITHOUT ROWID;
+        """)
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """
+        Resume the unfinished run of this name, or start a new one.
+
+        :return: Number of completed items resumed, 0 for a new run.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT started_at FROM runs WHERE name = ?", (self.name,)).fetchone()
+            if row and time.time() - row[0] < self.resume_within:
+                return self._db.execute("SELECT COUNT(*) FROM items WHERE name = ?", (self.name,)).fetchone()[0]
+            self._db.execute("DELETE FROM items WHERE name = ?", (self.name,))
+            self._db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?)", (self.name, time.time()))
+            self._db.commit()
+        return 0
+
+    def get(self, kind, key):
+        """
+        :return: Tuple of (found, result).
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result FROM items WHERE name = ? AND kind = ? AND key = ?", (self.name, kind, key)
+            ).fetchone()
+        return (True, json.loads(row[0])) if row else (False, None)
+
+    def put(self, kind, key, result):
+        # Committed per item, so a crash loses at most the item in progress
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)",
+                (self.name, kind, key, json.dumps(result), time.time()),
+            )
+            self._db.commit()
+
+    def step(self, kind, key, compute):
+        """
+        Result of an item from the journal, or computed and journaled.
+
+        An exception from compute() is raised without journaling anything, so
+        the item is retried by the next run.
+
+        :param kind: Item kind, e.g. 'article'.
+        :param key: Item key, usually its URL.
+        :param compute: Function returning the JSON-serialisable result.
+        """
+        found, result = self.get(kind, key)
+        metrics.cache(f'{kind} journal', hit=found)
+        if not found:
+            result = compute()
+            self.put(kind, key, result)
+        return result
+
+    def finish(self):
+        """Drop the run and its items."""
+        with self._lock:
+            self._db.execute("DELETE FROM items WHERE name = ?", (self.name,))
+            self._db.execute("DELETE FROM runs WHERE name = ?", (self.name,))
+            self._db.commit()
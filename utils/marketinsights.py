@@ -1,15 +1,24 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import urllib
+import argparse
+from contextlib import nullcontext
 from ast import literal_eval
-from datetime import datetime
-from io import BytesIO
+from datetime import datetime, timezone
 import re
 import unicodedata
-from transformers import AutoTokenizer, AutoModel
-import torch
-from scipy.spatial.distance import cosine
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+from utils.journal import ScrapeJournal
+from utils.parsing import ParsePool
+from utils.profiling import profile_run
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
+
+# Site roots, overridable to scrape a local replay server (benchmarks/replay_server.py)
+BASE_URL = os.environ.get('ARGUS_MARKETSCREENER_URL', 'https://www.marketscreener.com')
+COUNTRYCODE_URL = os.environ.get('ARGUS_COUNTRYCODE_URL', 'https://www.countrycode.org')
+REQUEST_TIMEOUT = (10, 30)  # Seconds to connect and between bytes, so a hung request fails instead of stalling the run
 
 def safe_literal_eval(x):
     """
@@ -24,71 +33,140 @@ def safe_literal_eval(x):
     except (ValueError, SyntaxError):
         return {}
 
-def to_excel(df1, df2, df3):
-    output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df1.to_excel(writer, index=False, sheet_name='CNBC')
-    df2.to_excel(writer, index=False, sheet_name='Market Insights')
-    df3.to_excel(writer, index=False, sheet_name='Stock Analysis')
-    writer.close()
-    processed_data = output.getvalue()
-    return processed_data
-  
-def scrape_main_page_marketinsights():
+def parse_article_text(html):
+    """
+    Extracts the article text from a MarketScreener article page.
+    """
+    html_content = urllib.parse.unquote(html)
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    article_div = soup.find('div', class_='txt-s4 article-text')
+    try:
+        article_text = article_div.get_text(separator='\n', strip=True)
+        return article_text
+    except:
+        return 'Error with extracting article text from URL'
+
+def parse_news_table(html):
+    """
+    Extracts the news table of a MarketScreener news page as a DataFrame.
+    """
+    html_content = urllib.parse.unquote(html)
+    soup = BeautifulSoup(html_content, 'html.parser') 
+
+    table = soup.find('table')
+    data = []
+
+    for row in table.find_all('tr'):
+        news_item = row.find('a', class_='link--no-underline')
+        ticker_item = row.find('a', class_='link--blue')
+        time_item = row.find('time')
+        source_item = row.find('span', class_='badge--small')
+
+        if news_item and ticker_item and time_item and source_item:
+            data.append({
+                'title': news_item.get_text(strip=True),
+                'link': f'{BASE_URL}{news_item["href"].strip()}',
+                'ticker': ticker_item.find('span', class_='txt-s1').get_text(strip=True),
+                'date': time_item.get_text(strip=True),
+                'source': source_item['title']
+            })
+
+    return pd.DataFrame(data)
+
+def journaled_pages(journal, kind, keys, fetch, parser, pool, on_error=None):
+    """
+    Parsed page of every key, from the journal or fetched and parsed in the parse pool.
+
+    Missing pages are fetched a batch at a time, parsed together in the pool
+    and journaled as each batch completes. The next batch is fetched in a
+    thread while the current one is parsed, so at most two batches of raw
+    pages are held in memory and a crash loses at most those.
+
+    :param kind: Journal item kind, e.g. 'article'.
+    :param keys: Item keys, usually URLs; duplicates are fetched once.
+    :param fetch: Function of a key returning the page HTML.
+    :param parser: Module-level function of the page HTML returning a JSON-serialisable record.
+    :param pool: ParsePool the pages are parsed in.
+    :param on_error: Result of a key whose fetch failed, not journaled so the next run tries it again;
+        when None the fetch error is raised.
+    :return: Dict of key -> parsed record.
+    """
+    results, missing = {}, []
+    for key in dict.fromkeys(keys):
+        found, result = journal.get(kind, key)
+        metrics.cache(f'{kind} journal', hit=found)
+        if found:
+            results[key] = result
+        else:
+            missing.append(key)
+
+    def fetch_batch(batch):
+        pages, failed = {}, []
+        for key in batch:
+            try:
+                pages[key] = fetch(key)
+            except Exception:
+                if on_error is None:
+                    raise
+                failed.append(key)
+        return pages, failed
+
+    batches = [missing[start:start + pool.batch_size] for start in range(0, len(missing), pool.batch_size)]
+    if not batches:
+        return results
+    pool.start()
+    with ThreadPoolExecutor(max_workers=1) as fetcher:
+        upcoming = fetcher.submit(fetch_batch, batches[0])
+        for i in range(len(batches)):
+            pages, failed = upcoming.result()
+            if i + 1 < len(batches):
+                # Downloads the next batch while this one is parsed
+                upcoming = fetcher.submit(fetch_batch, batches[i + 1])
+            for key in failed:
+                results[key] = on_error
+            with metrics.stage('parse'):
+                parsed = pool.map(parser, list(pages.values()))
+            for key, result in zip(pages, parsed):
+                journal.put(kind, key, result)
+                results[key] = result
+    return results
+
+def fetch_article_page(url):
+    """HTML of a MarketScreener article page."""
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
+                      'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
+    }
+    return metrics.timed_get(url, 'article fetch', headers=headers, timeout=REQUEST_TIMEOUT).text
+
+def article_texts(urls, journal, pool):
+    """
+    Extracts the article text of every MarketScreener article URL, journaled per article.
+    """
+    texts = journaled_pages(journal, 'article', urls, fetch_article_page, parse_article_text, pool,
+                            on_error='Error with URL GET request (Could be blocked)')
+    return [texts[url] for url in urls]
+
+def scrape_main_page_marketinsights(journal, pool):
     """
     Scrapes market insights from MarketScreener and extracts article content.
+    News tables and articles are journaled, so a resumed run skips the ones already fetched.
+    Articles are parsed in the parse pool.
     Returns a DataFrame with the extracted data.
     """
-    def extract_marketscreener_article(url):
-        """
-        Extracts the article text from a MarketScreener article URL.
-        """
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
-                              'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers)
-        except:
-            return 'Error with URL GET request (Could be blocked)'
-        
-        html_content = urllib.parse.unquote(response.text)
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def fetch_table(url, headers):
+        response = metrics.timed_get(url, 'listing fetch', headers=headers, timeout=REQUEST_TIMEOUT)
+        with metrics.stage('parse'):
+            table = parse_news_table(response.text)
+        metrics.count_rows('listing', rows_out=len(table))
+        return table.to_dict('records')
 
-        article_div = soup.find('div', class_='txt-s4 article-text')
-        try:
-            article_text = article_div.get_text(separator='\n', strip=True)
-            return article_text
-        except:
-            return 'Error with extracting article text from URL'
-        
     def marketinsights_table(url, headers):
         """
         Extracts table data from MarketScreener URL and returns it as a DataFrame.
         """
-        response = requests.get(url, headers=headers)
-        html_content = urllib.parse.unquote(response.text)
-        soup = BeautifulSoup(html_content, 'html.parser') 
-
-        table = soup.find('table')
-        data = []
-
-        for row in table.find_all('tr'):
-            news_item = row.find('a', class_='link--no-underline')
-            ticker_item = row.find('a', class_='link--blue')
-            time_item = row.find('time')
-            source_item = row.find('span', class_='badge--small')
-
-            if news_item and ticker_item and time_item and source_item:
-                data.append({
-                    'title': news_item.get_text(strip=True),
-                    'link': f'https://www.marketscreener.com{news_item["href"].strip()}',
-                    'ticker': ticker_item.find('span', class_='txt-s1').get_text(strip=True),
-                    'date': time_item.get_text(strip=True),
-                    'source': source_item['title']
-                })
-
-        return pd.DataFrame(data)
+        return pd.DataFrame(journal.step('listing', url, lambda: fetch_table(url, headers)))
     
     endpoint_list = ['IPO', 'mergers-acquisitions', 'rumors']
     df = pd.DataFrame()
@@ -98,11 +176,11 @@ def scrape_main_page_marketinsights():
     }
     
     for endpoint in endpoint_list:
-        url = f'https://www.marketscreener.com/news/companies/{endpoint}/'
+        url = f'{BASE_URL}/news/companies/{endpoint}/'
         temp_df = marketinsights_table(url, headers)
-        df = pd.concat([df, temp_df])
+        df = pd.concat([df, temp_df], ignore_index=True)
     
-    df['Article content'] = df['link'].apply(extract_marketscreener_article)
+    df['Article content'] = article_texts(df['link'].tolist(), journal, pool)
     return df
 
 def process_names(names):
@@ -110,24 +188,41 @@ def process_names(names):
     name = elements[:-1]
     return ' '.join(name)
 
-def scrape_url(url, context='Contact'):
+def fetch_company_page(url, context='Contact'):
+    """
+    HTML of the company page ('Contact') or governance page ('People') behind a news link.
+    """
     if context == "People":
         url = url.split('news')[0] + 'company-governance/'
     else:
         url = url.split('news')[0] + 'company/'
-    """
-    Scrapes tables of managers, members of the board, and shareholders from a given URL.
-    Returns a dictionary with the extracted data.
-    """
 
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
                       'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
     }
-    response = requests.get(url, headers=headers)
-    html_content = urllib.parse.unquote(response.text)
-    soup = BeautifulSoup(html_content, 'html.parser')
-    return soup
+    response = metrics.timed_get(url, 'governance fetch' if context == 'People' else 'company fetch', headers=headers, timeout=REQUEST_TIMEOUT)
+    return urllib.parse.unquote(response.text)
+
+def parse_company_page(html):
+    """
+    Extracts the industry and contact information from a company page.
+    Runs in the parse pool, so it returns plain values and no soup.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    details = {'Industry': get_industry(soup), 'Contact Information': get_contact_information(soup)}
+    # The tree's parent/child links are cycles; break them so the page is freed now, not at the next full collection
+    soup.decompose()
+    return details
+
+def parse_governance_page(html):
+    """
+    Extracts the managers and directors from a governance page.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    people = scrape_tables(soup)
+    soup.decompose()
+    return people
 
 def scrape_tables(soup):
     """
@@ -184,7 +279,8 @@ def scrape_tables(soup):
     return data
 
 def get_industry(soup):
-    soup = BeautifulSoup(soup)
+    if not isinstance(soup, BeautifulSoup):
+        soup = BeautifulSoup(soup)
     card_headers = soup.find_all('div', class_='card-header')
 
     # Iterate through each card-header div and extract the required information
@@ -205,7 +301,8 @@ def get_industry(soup):
 
 def get_contact_information(soup):
     result = {}
-    soup = BeautifulSoup(soup)
+    if not isinstance(soup, BeautifulSoup):
+        soup = BeautifulSoup(soup)
     try:
     # Extract company details
         company_details_section = soup.find_all('div', class_='card mb-15 pos-next')
@@ -233,13 +330,14 @@ def get_contact_information(soup):
     return result
 
 def get_phone_mapping(existing):
+    metrics.cache('phone extensions table', hit=not existing.empty)
     if existing.empty:
-        url = "https://www.countrycode.org"
+        url = COUNTRYCODE_URL
         headerx = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
                       'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/50.0.2661.102 Safari/537.36'
         }
-        response = requests.get(url, headers = headerx)
+        response = metrics.timed_get(url, 'countrycode fetch', headers = headerx, timeout=REQUEST_TIMEOUT)
 
         # Parse the HTML content
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -262,7 +360,7 @@ def get_phone_mapping(existing):
 
         # Create a DataFrame
         df = pd.DataFrame(rows, columns=headers)[['COUNTRY', 'COUNTRY CODE']]
-        df.to_csv('utils/data/Scrape/worldcities.csv')
+        df.to_csv('utils/data/Scrape/phoneextensions.csv')
     else:
         df = existing
 
@@ -352,6 +450,7 @@ def get_intersection(a, b):
 
 # Function to get embeddings
 def get_embeddings(texts, tokenizer, model):
+    import torch
     inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
     with torch.no_grad():
         outputs = model(**inputs)
@@ -359,6 +458,7 @@ def get_embeddings(texts, tokenizer, model):
 
 # Function to find the most similar country
 def find_country(address, countries, tokenizer, model):
+    from scipy.spatial.distance import cosine
     country_embeddings = get_embeddings(countries, tokenizer, model)
     address_embedding = get_embeddings([address], tokenizer, model)
     address_embedding = address_embedding.flatten() # Convert to 1-D array
@@ -384,85 +484,110 @@ def final_country(contact_information, candidates, tokenizer, model):
         return 'Unknown'
 
 
-# Function to convert time strings to datetime using the current date
-def convert_to_datetime(date_str):
-    formats = ['%I:%M%p', '%b. %d', '%Y-%m-%d']
-    current_year = datetime.now().year
-    for fmt in formats:
-        try:
-            # If the date string is in time format, assume it's from the current date
-            if fmt == '%I:%M%p':
-                return datetime.combine(datetime.today(), datetime.strptime(date_str, fmt).time())
-            elif fmt == '%b. %d':
-            # Append the current year to the date string
-                date_str_with_year = f"{date_str} {current_year}"
-                return datetime.strptime(date_str_with_year, f"{fmt} %Y")
-            else:
-                return datetime.strptime(date_str, fmt)
-        except ValueError:
-            pass
-    # If none of the formats match, return None
-    return None
+def extract_company_pages(df, journal, pool):
+    """
+    Add People, Industry and Contact Information from the company pages of every news link.
+
+    Pages are journaled per company and reduced to those fields a batch at a
+    time in the parse pool, so memory does not grow with the number of links
+    beyond the extracted values.
+    """
+    # News items of the same company share the pages
+    companies = df['link'].map(lambda link: link.split('news')[0])
+    details = journaled_pages(journal, 'company', companies, fetch_company_page, parse_company_page, pool)
+    people = journaled_pages(journal, 'governance', companies, lambda url: fetch_company_page(url, 'People'), parse_governance_page, pool)
+    df['People'] = companies.map(lambda company: people[company])
+    df['Industry'] = companies.map(lambda company: details[company]['Industry'])
+    df['Contact Information'] = companies.map(lambda company: details[company]['Contact Information'])
+    metrics.count_rows('people', rows_in=len(df), rows_out=int(df['People'].map(len).sum()))
+    return df
 
 # Define the scraping and processing functions
-def marketinsights_scraping_part1():
-    """Scrape the main page and article HTML from MarketInsights."""
-    print('Scraping main page')
-    df = scrape_main_page_marketinsights()
+def marketinsights_scraping_part1(journal):
+    """Scrape the main page, articles and company pages from MarketInsights, journaling every item."""
+    with ParsePool() as pool:
+        print('Scraping main page')
+        df = scrape_main_page_marketinsights(journal, pool)
 
-    print('Scraping article HTML')
-    df['raw'] = df['link'].apply(scrape_url)
-    df['raw2'] = df['link'].apply(lambda x: scrape_url(x, 'People'))
+        print('Scraping company pages')
+        return extract_company_pages(df, journal, pool)
 
-    print('Processing article HTML')
-    df['People'] = df['raw2'].apply(scrape_tables)
-    return df
+def marketinsights_scraping_part2(df, tokenizer, model, scraped_at=None):
+    """
+    Label Country and Industry from the scraped data.
 
-def marketinsights_scraping_part2(df, tokenizer, model):
-    """Label Country and Industry from the scraped data."""
+    :param scraped_at: When the news table was fetched; its times ('10:05am', 'Aug. 23') are relative to it.
+    """
     print('Labelling Country and Industry')
     try:
         existing = pd.read_csv('utils/data/Scrape/phoneextensions.csv')
     except FileNotFoundError:
         existing = pd.DataFrame()
 
-    phone_storage = get_phone_mapping(existing)
-    city_storage = get_city_mapping()
-
-    df['Industry'] = df['raw'].apply(get_industry)
-    df['Contact Information'] = df['raw'].apply(get_contact_information)
-    df['Country_phone'] = df['Contact Information'].apply(lambda x: label_country_by_phone(x, phone_storage))
-    df['Country_city'] = df['Contact Information'].apply(lambda x: label_country_by_city(x, city_storage))
-    df['Country_candidates'] = df.apply(lambda x: get_intersection(x.Country_phone, x.Country_city), axis=1)
-    df['Country'] = df.apply(lambda x: final_country(x['Contact Information'], x.Country_candidates, tokenizer, model), axis=1)
-
-    # Apply the conversion functions
-    df['Time'] = df['date'].apply(convert_to_datetime)
+    with metrics.stage('gazetteer'):
+        phone_storage = get_phone_mapping(existing)
+        city_storage = get_city_mapping()
+
+    with metrics.stage('gazetteer'):
+        df['Country_phone'] = df['Contact Information'].apply(lambda x: label_country_by_phone(x, phone_storage))
+        df['Country_city'] = df['Contact Information'].apply(lambda x: label_country_by_city(x, city_storage))
+        df['Country_candidates'] = df.apply(lambda x: get_intersection(x.Country_phone, x.Country_city), axis=1)
+    for lookup in ('phone', 'city'):
+        known = int(df[f'Country_{lookup}'].map(lambda countries: countries != {'Unknown'}).sum())
+        metrics.cache(f'{lookup} gazetteer', hit=True, count=known)
+        metrics.cache(f'{lookup} gazetteer', hit=False, count=len(df) - known)
+
+    # Only rows left with several candidate countries go through the model
+    with metrics.stage('embedding'):
+        df['Country'] = df.apply(lambda x: final_country(x['Contact Information'], x.Country_candidates, tokenizer, model), axis=1)
+    ambiguous = int(df['Country_candidates'].map(lambda candidates: isinstance(candidates, set) and len(candidates) > 1).sum())
+    metrics.count_rows('embedding', rows_in=len(df), rows_out=ambiguous)
+
+    # Clock times and dates without a year to UTC
+    with metrics.stage('timestamps'):
+        df['Time'] = normalize_timestamps(df['date'], scraped_at, SOURCE_TIMEZONES['marketinsights'])
+    metrics.count_rows('timestamps', rows_in=len(df), rows_out=int(df['Time'].notna().sum()))
     df.drop(['date'], axis=1, inplace=True)
     return df
 
-def scrape_marketinsights():
-    """Scrape MarketInsights data and process it."""
+def scrape_marketinsights(journal=None):
+    """
+    Scrape MarketInsights data and process it.
+
+    Every fetched page is journaled (utils/journal.py) until the caller calls
+    journal.finish() once the snapshot is written, so a run after a crash, a
+    failed model load or a failed write resumes where the last one stopped.
+
+    :param journal: ScrapeJournal of the run, defaults to the 'marketinsights' journal.
+    """
+    journal = journal or ScrapeJournal('marketinsights')
+    resumed = journal.begin()
+    if resumed:
+        print(f'Resuming the previous marketinsights run, {resumed} items already done')
+    # Listing times are relative to when the run first fetched them
+    scraped_at = pd.Timestamp(journal.step('run', 'scraped_at', lambda: datetime.now(timezone.utc).isoformat()))
+    df = marketinsights_scraping_part1(journal)
+
+    # Imported here so the parsers above can be used without loading the model stack
+    from transformers import AutoTokenizer, AutoModel
     model_name = 'nomic-ai/nomic-embed-text-v1'
-    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-    model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+    with metrics.stage('model load'):
+        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
 
-    df = marketinsights_scraping_part1()
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    selection = 'marketinsights'
-    directory = "./utils/data/Scraped News/"
-    temp_file_path = f"{directory}/temp_{selection}_data_{current_date}.csv"
-    
-    df.to_csv(temp_file_path, index=False)
-    
-    df_processed = marketinsights_scraping_part2(df, tokenizer, model)
-    return df_processed
+    return marketinsights_scraping_part2(df, tokenizer, model, scraped_at)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape MarketScreener news into a dated CSV.')
+    parser.add_argument('--profile', action='store_true', help='Write cProfile and folded-stack profiles to utils/data/Profiling.')
+    args = parser.parse_args()
     current_date = datetime.now().strftime("%Y-%m-%d")
     selection = 'marketinsights'
     directory = "./utils/data/Scraped News/"
     output_file_path = f"{directory}/{selection}_data_{current_date}.csv"
     
-    df_final = scrape_marketinsights()
-    df_final.to_csv(output_file_path, index=False)
\ No newline at end of file
+    journal = ScrapeJournal(selection)
+    with profile_run(selection) if args.profile else nullcontext():
+        df_final = scrape_marketinsights(journal)
+    df_final.to_csv(output_file_path, index=False)
+    journal.finish()
\ No newline at end of file
@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Directory for Prometheus text files (node_exporter textfile collector), unset to skip them
+PROMETHEUS_DIRECTORY = os.environ.get('ARGUS_PROMETHEUS_DIR')
+
+class RunMetrics:
+    """
+    Counters for one scrape run, safe to update from worker threads.
+
+    Stages are timed blocks (wall and process CPU time); requests are recorded
+    per fetch stage with status counts, bytes and a latency histogram; caches
+    count hits and misses; rows count what went into and came out of a stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.requests = {}
+        self.caches = {}
+        self.rows = {}
+
+    @contextmanager
+    def stage(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self._lock:
+                stage = self.stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+                stage['calls'] += 1
+                stage['wall_seconds'] += wall
+                stage['cpu_seconds'] += cpu
+
+    def request(self, stage, seconds, size, status):
+        """Record one HTTP request; status is the HTTP status or 'error'."""
+        with self._lock:
+            entry = self.requests.setdefault(stage, {
+                'count': 0, 'bytes': 0, 'seconds': 0.0, 'statuses': {}, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+            })
+            entry['count'] += 1
+            entry['bytes'] += size
+            entry['seconds'] += seconds
+            entry['statuses'][str(status)] = entry['statuses'].get(str(status), 0) + 1
+            entry['buckets'][next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))] += 1
+
+    def cache(self, name, hit, count=1):
+        with self._lock:
+            entry = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+            entry['hits' if hit else 'misses'] += count
+
+    def count_rows(self, stage, rows_in=None, rows_out=None):
+        with self._lock:
+            entry = self.rows.setdefault(stage, {'in': 0, 'out': 0})
+            entry['in'] += rows_in or 0
+            entry['out'] += rows_out or 0
+
+    def report(self):
+        """Run summary as a JSON-serialisable dict."""
+        with self._lock:
+            requests_report = {}
+            for stage, entry in self.requests.items():
+                requests_report[stage] = {
+                    'count': entry['count'], 'bytes': entry['bytes'], 'statuses': dict(entry['statuses']),
+                    'latency_seconds': {
+                        'sum': entry['seconds'],
+                        'mean': entry['seconds'] / entry['count'] if entry['count'] else 0.0,
+                        'buckets': {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), entry['buckets'])},
+                    },
+                }
+            return {
+                'run': self.name,
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+                'wall_seconds': time.perf_counter() - self._start,
+                'stages': {name: dict(stage) for name, stage in self.stages.items()},
+                'requests': requests_report,
+                'caches': {
+                    name: {**entry, 'hit_rate': entry['hits'] / (entry['hits'] + entry['misses']) if entry['hits'] + entry['misses'] else None}
+                    for name, entry in self.caches.items()
+                },
+                'rows': {name: dict(entry) for name, entry in self.rows.items()},
+            }
+
+_current = RunMetrics('default')
+_progress_listener = None
+
+def start_run(name):
+    """Start collecting metrics for a new run; instrumented code records into it."""
+    global _current
+    _current = RunMetrics(name)
+    return _current
+
+def current():
+    return _current
+
+def set_progress_listener(listener):
+    """
+    Report every stage and fetch as it starts, e.g. to the progress of a job.
+
+    :param listener: Thread-safe function of the stage name, or None to stop reporting.
+    """
+    global _progress_listener
+    _progress_listener = listener
+
+def _report_progress(stage):
+    listener = _progress_listener
+    if listener is not None:
+        listener(stage)
+
+def stage(name):
+    _report_progress(name)
+    return _current.stage(name)
+
+def cache(name, hit, count=1):
+    _current.cache(name, hit, count)
+
+def count_rows(stage, rows_in=None, rows_out=None):
+    _current.count_rows(stage, rows_in, rows_out)
+
+def timed_get(url, stage, **kwargs):
+    """
+    requests.get that records the request under a fetch stage of the current run.
+
+    :param url: URL to fetch.
+    :param stage: Fetch stage, e.g. 'listing fetch' or 'article fetch'.
+    :return: The response.
+    """
+    _report_progress(stage)
+    start = time.perf_counter()
+    try:
+        response = requests.get(url, **kwargs)
+    except Exception:
+        _current.request(stage, time.perf_counter() - start, 0, 'error')
+        raise
+    _current.request(stage, time.perf_counter() - start, len(response.content), response.status_code)
+    return response
+
+def report_path(snapshot_path):
+    """Location of the JSON report written next to a snapshot."""
+    return os.path.splitext(snapshot_path)[0] + '.metrics.json'
+
+def to_prometheus(report):
+    """Report in the Prometheus text exposition format."""
+    run = report['run']
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{label}"' for key, label in {'run': run, **labels}.items())
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    metric('argus_scrape_run_seconds', 'gauge', 'Wall time of the scrape run.', [({}, report['wall_seconds'])])
+    metric('argus_scrape_run_timestamp_seconds', 'gauge', 'Time the scrape run finished.', [({}, time.time())])
+    metric('argus_scrape_stage_seconds', 'gauge', 'Time spent in a stage.', [
+        ({'stage': name, 'clock': clock}, stage[f'{clock}_seconds'])
+        for name, stage in report['stages'].items() for clock in ('wall', 'cpu')
+    ])
+    metric('argus_scrape_requests_total', 'counter', 'HTTP requests by fetch stage and status.', [
+        ({'stage': name, 'status': status}, count)
+        for name, entry in report['requests'].items() for status, count in entry['statuses'].items()
+    ])
+    metric('argus_scrape_response_bytes_total', 'counter', 'Response bytes by fetch stage.', [
+        ({'stage': name}, entry['bytes']) for name, entry in report['requests'].items()
+    ])
+    histogram = []
+    for name, entry in report['requests'].items():
+        cumulative = 0
+        for bound, count in entry['latency_seconds']['buckets'].items():
+            cumulative += count
+            histogram.append(('_bucket', {'stage': name, 'le': bound}, cumulative))
+        histogram.append(('_sum', {'stage': name}, entry['latency_seconds']['sum']))
+        histogram.append(('_count', {'stage': name}, entry['count']))
+    lines.append("# HELP argus_scrape_request_duration_seconds HTTP request latency by fetch stage.")
+    lines.append("# TYPE argus_scrape_request_duration_seconds histogram")
+    for suffix, labels, value in histogram:
+        label_text = ','.join(f'{key}="{label}"' for key, label in {'run': run, **labels}.items())
+        lines.append(f"argus_scrape_request_duration_seconds{suffix}{{{label_text}}} {value}")
+    metric('argus_scrape_cache_lookups_total', 'counter', 'Cache and lookup-table hits and misses.', [
+        ({'cache': name, 'result': result}, entry[key]) for name, entry in report['caches'].items() for result, key in (('hit', 'hits'), ('miss', 'misses'))
+    ])
+    metric('argus_scrape_rows', 'gauge', 'Rows into and out of a stage.', [
+        ({'stage': name, 'direction': direction}, entry[direction]) for name, entry in report['rows'].items() for direction in ('in', 'out')
+    ])
+    return '\n'.join(lines) + '\n'
+
+def write_report(snapshot_path, metrics=None):
+    """
+    Write the run report next to a snapshot, and a Prometheus text file if
+    ARGUS_PROMETHEUS_DIR is set.
+
+    :param snapshot_path: Snapshot the run produced.
+    :param metrics: RunMetrics to report, defaults to the current run.
+    :return: The report dict.
+    """
+    metrics = metrics or _current
+    report = metrics.report()
+    report['snapshot'] = os.path.basename(snapshot_path)
+    path = report_path(snapshot_path)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(temp_path, path)
+    if PROMETHEUS_DIRECTORY:
+        os.makedirs(PROMETHEUS_DIRECTORY, exist_ok=True)
+        prometheus_path = os.path.join(PROMETHEUS_DIRECTORY, f"argus_{metrics.name}.prom")
+        with open(f"{prometheus_path}.tmp", 'w') as f:
+            f.write(to_prometheus(report))
+        os.replace(f"{prometheus_path}.tmp", prometheus_path)
+    return report
+
+def format_summary(report):
+    """Short per-stage summary for console output."""
+    lines = [f"{report['run']}: {report['wall_seconds']:.1f}s"]
+    for name, entry in report['requests'].items():
+        lines.append(f"  {name}: {entry['count']} requests, {entry['bytes'] / 1e6:.1f} MB, "
+                     f"{entry['latency_seconds']['mean'] * 1000:.0f} ms mean, statuses {entry['statuses']}")
+    for name, stage in report['stages'].items():
+        lines.append(f"  {name}: {stage['wall_seconds']:.1f}s wall, {stage['cpu_seconds']:.1f}s cpu over {stage['calls']} calls")
+    for name, entry in report['caches'].items():
+        if entry['hit_rate'] is not None:
+            lines.append(f"  {name}: {entry['hit_rate']:.0%} hit rate ({entry['hits']}/{entry['hits'] + entry['misses']})")
+    return '\n'.join(lines)
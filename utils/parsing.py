@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Parser processes, one per core unless overridden
+PARSE_WORKERS = int(os.environ.get('ARGUS_PARSE_WORKERS', os.cpu_count() or 1))
+CHUNKS_PER_WORKER = 4  # Pages go to the workers in this many chunks each, balancing uneven pages against IPC overhead
+
+class ParsePool:
+    """
+    Process pool that parses raw pages outside the scraping process.
+
+    BeautifulSoup parsing holds the GIL, so it runs in separate processes
+    while the scraper's threads only wait on the network. Parsers are
+    module-level functions of the page HTML returning a compact, picklable
+    record (never a soup), so only page text goes to the workers and only
+    extracted values come back. With one worker the pages are parsed in this
+    process instead.
+
+    Used as a context manager; the worker processes start with start() or the
+    first batch that needs them and stop when the block exits.
+    """
+
+    def __init__(self, workers=PARSE_WORKERS):
+        self.workers = max(1, workers)
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """
+        Start the worker processes now rather than on the first batch.
+
+        Call it before starting fetch threads, so the workers are not forked
+        while another thread holds a lock.
+        """
+        if self.workers > 1 and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            # Processes are only forked once there is work
+            self._executor.submit(int).result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def batch_size(self):
+        """Pages worth collecting before a map(), enough to give every worker several chunks."""
+        return self.workers * CHUNKS_PER_WORKER * 2
+
+    def map(self, parser, pages):
+        """
+        Parse every page, results in the order of the pages.
+
+        Pages are split into chunks by position only, so the chunking and the
+        result order are the same on every run with the same worker count.
+
+        :param parser: Module-level function of the page HTML (str or bytes).
+        :param pages: List of page HTML; None entries (failed fetches) give None without being parsed.
+        :return: List of parser results.
+        """
+        indices = [i for i, page in enumerate(pages) if page is not None]
+        results = [None] * len(pages)
+        if self.workers == 1 or len(indices) < 2:
+            parsed = [parser(pages[i]) for i in indices]
+        else:
+            self.start()
+            chunksize = max(1, -(-len(indices) // (self.workers * CHUNKS_PER_WORKER)))
+            parsed = self._executor.map(parser, [pages[i] for i in indices], chunksize=chunksize)
+        for i, result in zip(indices, parsed):
+            results[i] = result
+        return results
+
+def parse_pages(parser, pages, workers=PARSE_WORKERS):
+    """
+    Parse pages with a pool of its own, for a one-off batch.
+
+    :return: List of parser results in the order of the pages.
+    """
+    with ParsePool(workers) as pool:
+        return pool.map(parser, pages)
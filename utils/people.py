@@ -0,0 +1,348 @@
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from ast import literal_eval
+
+import pandas as pd
+
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
+
+DATA_DIRECTORY = "./utils/data"
+PEOPLE_INDEX_PATH = "./utils/data/People/people.sqlite"
+SCRAPED_NEWS_GLOBS = [
+    "./utils/data/Scraped News/{source}_data_*.csv",
+    "./utils/data/Scraped News/Archive/{source}_data_*.csv",
+]
+IPO_DATASET_PATH = "./utils/data/IPO dataset/ipo_dataset.csv"
+CB_DEALS_PATH = "./utils/data/CB Insights/cleaned_cb_deals.csv"
+
+HONORIFICS = {'mr', 'mrs', 'ms', 'miss', 'dr', 'prof', 'sir', 'dame', 'lord'}
+# Trailing degrees and designations, e.g. 'Kim R. Tsuchimoto CPA' or 'Patrice P. Rioux M.D., Ph.D.'
+POSTNOMINALS = re.compile(
+    r'(?:[\s,]+(?:(?:[A-Z]\.){2,}|M\.?B\.?A|M\.?D|Ph\.?\s?D|M\.?Sc|B\.?Sc|C\.?P\.?A|C\.?F\.?A|J\.?D|Esq|CBE|OBE|MBE)\.?)+\s*$'
+)
+
+def normalize_name(name):
+    """
+    Key used to recognise the same person across sources.
+
+    Lower-cased, without diacritics, punctuation, leading honorifics or
+    trailing degrees, e.g. 'Dr. Dongliang Chang' -> 'dongliang chang' and
+    'Kim R. Tsuchimoto CPA' -> 'kim r tsuchimoto'.
+    """
+    name = POSTNOMINALS.sub('', str(name).strip())
+    name = unicodedata.normalize('NFD', name)
+    name = ''.join(char for char in name if unicodedata.category(char) != 'Mn')
+    words = [word.strip("'-") for word in re.sub(r"[^\w\s'-]", ' ', name.lower()).split()]
+    words = [word for word in words if word]
+    while words and words[0] in HONORIFICS:
+        words = words[1:]
+    return ' '.join(words)
+
+def parse_literal(value, default):
+    """Python literal stored as a string in a CSV cell, or default."""
+    if not isinstance(value, str):
+        return default
+    try:
+        return literal_eval(value)
+    except (ValueError, SyntaxError):
+        return default
+
+def split_people_text(text):
+    """
+    People in free text such as 'Steven Foo (CEO), Dr. Dongliang Chang (Founder and Chairman)'.
+
+    Commas inside parentheses belong to the role; fragments that are only a
+    degree ('M.D.', 'MBA') stay with the name before them.
+
+    :return: List of (name, role) tuples, role None when not given.
+    """
+    if not isinstance(text, str):
+        return []
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif char in ',;' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    people = []
+    for part in parts:
+        match = re.match(r'\s*(.*?)\s*(?:\((.*)\))?\s*$', part)
+        name, role = match.group(1), match.group(2)
+        if POSTNOMINALS.fullmatch(' ' + name) and people:
+            # A degree split off the previous name by its comma, it may carry that person's role
+            previous_name, previous_role = people[-1]
+            people[-1] = (f"{previous_name}, {name}", previous_role or role)
+        elif normalize_name(name):
+            people.append((name, role))
+    return people
+
+def _dates(values, source):
+    # Day resolution is enough to order appearances
+    if source in SOURCE_TIMEZONES:
+        dates = normalize_timestamps(values, timezone=SOURCE_TIMEZONES[source])
+    else:
+        dates = pd.to_datetime(values, errors='coerce')
+    return dates.dt.strftime('%Y-%m-%d').where(dates.notna(), None)
+
+def extract_marketinsights(df):
+    """People rows from a MarketScreener snapshot: governance tables per article."""
+    rows = []
+    dates = _dates(df['Time'], 'marketinsights') if 'Time' in df else [None] * len(df)
+    contacts = df['Contact Information'] if 'Contact Information' in df else [None] * len(df)
+    for row, (people, ticker, contact, date) in enumerate(zip(df['People'], df['ticker'], contacts, dates)):
+        company = parse_literal(contact, {}).get('Company Name') or ticker
+        for person in parse_literal(people, []):
+            rows.append((person.get('Name'), person.get('Position'), company, ticker, date, row))
+    return rows
+
+def extract_stockanalysis(df):
+    """People rows from a stockanalysis snapshot: key executives of the first ticker."""
+    rows = []
+    dates = _dates(df['Time'], 'stockanalysis') if 'Time' in df else [None] * len(df)
+    for row, (executives, tickers, date) in enumerate(zip(df['Executives'], df['Tickers'], dates)):
+        ticker = str(tickers).split(',')[0].strip()
+        for executive in parse_literal(executives, None) or []:
+            rows.append((executive[0], executive[1], ticker, ticker, date, row))
+    return rows
+
+def extract_ipo_dataset(df):
+    """People rows from the IPO dataset, from 'People' or else the free text in 'Related People'."""
+    rows = []
+    dates = _dates(df['IPO Date'], 'ipo_dataset')
+    for row, (people, related, company, symbol, date) in enumerate(zip(df['People'], df['Related People'], df['Company Name'], df['Symbol'], dates)):
+        people = parse_literal(people, {})
+        pairs = people.items() if isinstance(people, dict) and people else split_people_text(related)
+        for name, role in pairs:
+            rows.append((name, role, company, symbol, date, row))
+    return rows
+
+def extract_cb_deals(df):
+    """People rows from the CB Insights deals, from the free text in 'All People'."""
+    rows = []
+    dates = _dates(df['Deal Date'], 'cb_deals')
+    for row, (people, company, date) in enumerate(zip(df['All People'], df['Companies'], dates)):
+        for name, role in split_people_text(people):
+            rows.append((name, role, company, None, date, row))
+    return rows
+
+# source -> (columns read, extractor)
+EXTRACTORS = {
+    'marketinsights': (('People', 'ticker', 'Contact Information', 'Time'), extract_marketinsights),
+    'stockanalysis': (('Executives', 'Tickers', 'Time'), extract_stockanalysis),
+    'ipo_dataset': (('People', 'Related People', 'Company Name', 'Symbol', 'IPO Date'), extract_ipo_dataset),
+    'cb_deals': (('All People', 'Companies', 'Deal Date'), extract_cb_deals),
+}
+
+def source_files():
+    """Every (source, path) the index is built from, snapshots oldest first."""
+    files = []
+    for source in ('marketinsights', 'stockanalysis'):
+        paths = []
+        for pattern in SCRAPED_NEWS_GLOBS:
+            paths.extend(glob.glob(pattern.format(source=source)))
+        files.extend((source, path) for path in sorted(paths, key=os.path.basename))
+    for source, path in (('ipo_dataset', IPO_DATASET_PATH), ('cb_deals', CB_DEALS_PATH)):
+        if os.path.exists(path):
+            files.append((source, path))
+    return files
+
+def file_key(source, path):
+    """Identity of an indexed file: its source and path under the data directory, so an archived snapshot and a live one of the same name differ."""
+    return f"{source}/{os.path.relpath(path, DATA_DIRECTORY)}"
+
+def moved_files(files, known):
+    """
+    Indexed files that only moved since the last refresh, e.g. snapshots archived by a scrape.
+
+    A file moved when its key is not indexed but a key that is no longer
+    listed has the same source, file name, mtime and size (a move within the
+    data directory keeps both).
+
+    :param files: (source, path) pairs being refreshed.
+    :param known: Dict of indexed file key -> (mtime_ns, size).
+    :return: Dict of old file key -> new file key.
+    """
+    listed = {file_key(source, path) for source, path in files}
+    gone = {}
+    for file, stat in known.items():
+        if file not in listed:
+            gone.setdefault((file.split('/', 1)[0], file.rsplit('/', 1)[-1], tuple(stat)), file)
+    moved = {}
+    for source, path in files:
+        file = file_key(source, path)
+        if file in known or not gone:
+            continue
+        stat = os.stat(path)
+        old = gone.pop((source, os.path.basename(path), (stat.st_mtime_ns, stat.st_size)), None)
+        if old is not None:
+            moved[old] = file
+    return moved
+
+def extract_file(source, path):
+    """
+    People rows of one file.
+
+    :return: List of (name, role, company, ticker, date, row) tuples; empty for
+        snapshots from before the source had people columns.
+    """
+    columns, extractor = EXTRACTORS[source]
+    df = pd.read_csv(path, usecols=lambda c: c in columns)
+    required = [column for column in columns if column not in ('Contact Information', 'Time')]
+    if any(column not in df.columns for column in required):
+        return []
+    return extractor(df)
+
+class PeopleIndex:
+    """
+    Every appearance of a person across news snapshots, the IPO dataset and
+    the CB Insights deals, keyed on the normalised name.
+
+    Files are indexed once and re-indexed only when they change, so refresh()
+    after a scrape only reads the new snapshot. Lookups by name key and by
+    name prefix (of any word) go through SQLite indexes.
+    """
+
+    def __init__(self, path=PEOPLE_INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, source TEXT, mtime_ns INTEGER, size INTEGER, indexed_at REAL);"
+            "CREATE TABLE IF NOT EXISTS appearances (name_key TEXT, name TEXT, role TEXT, company TEXT, ticker TEXT, "
+            "date TEXT, source TEXT, file TEXT, row INTEGER);"
+            "CREATE INDEX IF NOT EXISTS appearances_name_key ON appearances (name_key, date);"
+            "CREATE INDEX IF NOT EXISTS appearances_file ON appearances (file);"
+            "CREATE TABLE IF NOT EXISTS name_tokens (token TEXT, name_key TEXT, PRIMARY KEY (token, name_key)) WITHOUT ROWID;"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def refresh(self, files=None):
+        """
+        Index new and changed files and drop the ones that are gone.
+
+        Files are identified by their path under the data directory; a
+        snapshot moved to the archive keeps its rows without being read again.
+
+        :param files: (source, path) pairs, defaults to source_files().
+        :return: Number of files (re-)indexed.
+        """
+        files = source_files() if files is None else files
+        with self._lock:
+            known = {row[0]: (row[1], row[2]) for row in self._db.execute("SELECT file, mtime_ns, size FROM files")}
+        moved = moved_files(files, known)
+        if moved:
+            with self._lock, self._db:
+                self._db.executemany("UPDATE files SET file = ? WHERE file = ?", [(new, old) for old, new in moved.items()])
+                self._db.executemany("UPDATE appearances SET file = ? WHERE file = ?", [(new, old) for old, new in moved.items()])
+            known = {moved.get(file, file): stat for file, stat in known.items()}
+        indexed, seen = 0, set()
+        for source, path in files:
+            file = file_key(source, path)
+            seen.add(file)
+            stat = os.stat(path)
+            if known.get(file) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            rows = []
+            for name, role, company, ticker, date, row in extract_file(source, path):
+                name_key = normalize_name(name) if isinstance(name, str) else ''
+                if name_key:
+                    rows.append((name_key, name.strip(), role, company, ticker, date, source, file, row))
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM appearances WHERE file = ?", (file,))
+                self._db.executemany("INSERT INTO appearances VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO name_tokens VALUES (?, ?)",
+                    {(token, row[0]) for row in rows for token in row[0].split()},
+                )
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (file, source, stat.st_mtime_ns, stat.st_size, time.time()))
+            indexed += 1
+        stale = set(known) - seen
+        if indexed or stale:
+            with self._lock, self._db:
+                self._db.executemany("DELETE FROM appearances WHERE file = ?", [(file,) for file in stale])
+                self._db.executemany("DELETE FROM files WHERE file = ?", [(file,) for file in stale])
+                self._db.execute("DELETE FROM name_tokens WHERE name_key NOT IN (SELECT name_key FROM appearances)")
+        return indexed
+
+    def appearances(self, name):
+        """
+        Every appearance of a person, newest first.
+
+        :param name: Person's name in any capitalisation or with honorifics.
+        :return: DataFrame with Name, Role, Company, Ticker, Date, Source, File and Row.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, role, company, ticker, date, source, file, row FROM appearances WHERE name_key = ? ORDER BY date DESC",
+                (normalize_name(name),),
+            ).fetchall()
+        return pd.DataFrame(rows, columns=['Name', 'Role', 'Company', 'Ticker', 'Date', 'Source', 'File', 'Row'])
+
+    def search(self, query, limit=20, founders_only=False):
+        """
+        People whose name has words starting with every word of the query,
+        e.g. 'chang' or 'dong ch' both find 'Dongliang Chang'.
+
+        :param query: Name or name prefix.
+        :param limit: Maximum number of people returned.
+        :param founders_only: Only people with 'founder' in one of their roles.
+        :return: DataFrame with Name Key, Name, Appearances and Sources, most appearances first.
+        """
+        words = normalize_name(query).split()
+        if not words:
+            return pd.DataFrame(columns=['Name Key', 'Name', 'Appearances', 'Sources'])
+        with self._lock:
+            keys = None
+            for word in words:
+                matches = {row[0] for row in self._db.execute(
+                    "SELECT name_key FROM name_tokens WHERE token >= ? AND token < ?", (word, word + '\U0010ffff')
+                )}
+                keys = matches if keys is None else keys & matches
+            keys = sorted(keys)
+            having = "HAVING MAX(LOWER(role) LIKE '%founder%')" if founders_only else ""
+            query = (
+                f"SELECT name_key, MAX(name), COUNT(*), GROUP_CONCAT(DISTINCT source) FROM appearances "
+                f"WHERE name_key IN ({','.join('?' * len(keys))}) GROUP BY name_key {having} "
+                f"ORDER BY COUNT(*) DESC, name_key LIMIT ?"
+            )
+            rows = self._db.execute(query, (*keys, limit)).fetchall() if keys else []
+        return pd.DataFrame(
+            [(key, name, count, sorted(sources.split(','))) for key, name, count, sources in rows],
+            columns=['Name Key', 'Name', 'Appearances', 'Sources'],
+        )
+
+    def table(self, sources=None):
+        """
+        All appearances, optionally of some sources only.
+
+        :return: DataFrame with Name Key, Name, Role, Company, Ticker, Date and Source.
+        """
+        query, args = "SELECT name_key, name, role, company, ticker, date, source FROM appearances", ()
+        if sources:
+            query, args = query + f" WHERE source IN ({','.join('?' * len(sources))})", tuple(sources)
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        return pd.DataFrame(rows, columns=['Name Key', 'Name', 'Role', 'Company', 'Ticker', 'Date', 'Source'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or update the people index from every dataset.')
+    parser.add_argument('--rebuild', action='store_true', help='Drop the index and build it from scratch.')
+    parser.add_argument('--lookup', help='Print the appearances of this person afterwards.')
+    args = parser.parse_args()
+    if args.rebuild and os.path.exists(PEOPLE_INDEX_PATH):
+        os.remove(PEOPLE_INDEX_PATH)
+    index = PeopleIndex()
+    start = time.perf_counter()
+    print(f"Indexed {index.refresh()} files in {time.perf_counter() - start:.1f}s")
+    if args.lookup:
+        print(index.appearances(args.lookup).to_string())
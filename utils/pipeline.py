@@ -1,44 +1,90 @@
-import streamlit as st
 import pandas as pd
 import os
 import glob
+import shutil
 from datetime import datetime
 from utils.cnbc import scrape_cnbc
 from utils.marketinsights import scrape_marketinsights
 from utils.stockanalysis import scrape_stockanalysis
+from utils.data_access import get_latest_file
+from utils.jobs import publish_csv
+from utils.people import PeopleIndex
+from utils.companies import CompanyIndex
+from utils.alerts import AlertEngine
+from utils.snapshot_diff import hash_path, load_hashes
+from utils.journal import ScrapeJournal
+from utils import metrics
 
-def get_latest_file(directory, file_pattern):
+SCRAPED_NEWS_DIRECTORY = "./utils/data/Scraped News/"
+ARCHIVE_DIRECTORY = "./utils/data/Scraped News/Archive/"
+
+def scrape_source(selection, **options):
+    if selection == 'cnbc':
+        return scrape_cnbc()
+    if selection == 'marketinsights':
+        return scrape_marketinsights(**options)
+    if selection == 'stockanalysis':
+        return scrape_stockanalysis(**options)
+    raise ValueError(f"Unknown source: {selection}")
+
+def archive_old_snapshots(selection, keep):
+    """Move every snapshot of a source except `keep`, with its run report and hashes, to the archive folder."""
+    os.makedirs(ARCHIVE_DIRECTORY, exist_ok=True)
+    for path in glob.glob(os.path.join(SCRAPED_NEWS_DIRECTORY, f"{selection}_data_*.csv")):
+        if os.path.abspath(path) != os.path.abspath(keep):
+            for moved in (path, metrics.report_path(path), hash_path(path)):
+                if os.path.exists(moved):
+                    shutil.move(moved, os.path.join(ARCHIVE_DIRECTORY, os.path.basename(moved)))
+
+def scrape_and_publish(selection, archive=True, **options):
     """
-    Get the latest file in the directory that matches the file pattern.
-    
-    :param directory: Directory where to look for files.
-    :param file_pattern: Pattern to match files (e.g., 'cnbc_data_*.csv').
-    :return: Path to the latest file.
+    Scrape a source and publish the result as today's snapshot.
+
+    The snapshot is renamed into place once complete, so readers never see a
+    partial file, and older snapshots are archived only after that. A metrics
+    report of the run is written next to the snapshot, the people and
+    companies in it are added to the people and company indexes, and its new
+    items are checked against the alert watchlists.
+
+    :param selection: 'cnbc', 'marketinsights' or 'stockanalysis'.
+    :param archive: Move the previous snapshots of the source to the archive.
+    :param options: Passed to the source's scraper, e.g. since= for stockanalysis.
+    :return: Tuple of (DataFrame, snapshot path).
     """
-    files = glob.glob(os.path.join(directory, file_pattern))
-    if not files:
-        return None
-    latest_file = max(files, key=os.path.getctime)
-    return latest_file
+    metrics.start_run(selection)
+    if selection == 'marketinsights':
+        # Kept until the snapshot is published, so a failed write resumes from it instead of fetching again
+        options['journal'] = ScrapeJournal(selection)
+    df = scrape_source(selection, **options)
+    # Save the dataframe to a CSV file with the current date
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    file_path = os.path.join(SCRAPED_NEWS_DIRECTORY, f"{selection}_data_{current_date}.csv")
+    with metrics.stage('write'):
+        publish_csv(df, file_path, index=False)
+    metrics.count_rows('write', rows_in=len(df), rows_out=len(df))
+    # Article hashes for snapshot diffs, so later diffs never reread the article text
+    with metrics.stage('hashes'):
+        load_hashes(file_path, selection)
+    if archive:
+        archive_old_snapshots(selection, keep=file_path)
+    if 'journal' in options:
+        options['journal'].finish()
+    # Only the new snapshot is read, archived ones keep their entries
+    with metrics.stage('people index'):
+        PeopleIndex().refresh()
+    with metrics.stage('company index'):
+        CompanyIndex().refresh()
+    with metrics.stage('alerts'):
+        AlertEngine().refresh()
+    # Written last, so the report covers every stage of the run
+    print(metrics.format_summary(metrics.write_report(file_path)))
+    return df, file_path
 
 def load_or_scrape_file(selection, scrape = False):
-    # Directory and file pattern
-    directory = "./utils/data/Scraped News/"
-    file_pattern = f"{selection}_data_*.csv"
-    
     # Get the latest file
-    latest_file = get_latest_file(directory, file_pattern)
+    latest_file = get_latest_file(SCRAPED_NEWS_DIRECTORY, f"{selection}_data_*.csv")
     if latest_file and not scrape:
         df = pd.read_csv(latest_file)
     else:
-        if selection == 'cnbc':
-            df = scrape_cnbc()
-        if selection == 'marketinsights':
-            df = scrape_marketinsights()
-        if selection == 'stockanalysis':
-            df = scrape_stockanalysis()
-        # Save the dataframe to a CSV file with the current date
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        file_path = f"{directory}/{selection}_data_{current_date}.csv"
-        df.to_csv(file_path, index=False)
+        df, _ = scrape_and_publish(selection, archive=False)
     return df
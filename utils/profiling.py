@@ -0,0 +1,85 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIRECTORY = "./utils/data/Profiling/"
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+
+class StackSampler:
+    """
+    Sampling profiler over every thread of the process.
+
+    cProfile only sees the thread it was enabled on, so scrapers that fetch
+    from a thread pool are also sampled: every `interval` seconds the stack of
+    each thread is recorded as a folded stack ('thread;outer;...;inner'), the
+    input format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_run(name, directory=PROFILE_DIRECTORY, interval=SAMPLE_INTERVAL, top=25):
+    """
+    Profile a block with cProfile and the stack sampler.
+
+    Writes <name>_<timestamp>.prof (open with pstats or snakeviz) and
+    <name>_<timestamp>.folded (flamegraph.pl / speedscope) to `directory`, and
+    prints the functions with the highest cumulative time.
+
+    :param name: Run name used in the file names, e.g. the source.
+    :param directory: Output directory.
+    :param interval: Seconds between stack samples.
+    :param top: Number of functions printed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"{name}_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}")
+    profiler = cProfile.Profile()
+    sampler = StackSampler(interval)
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiler.dump_stats(f"{stem}.prof")
+        sampler.write_folded(f"{stem}.folded")
+        print(f"Profile of {name} written to {stem}.prof and {stem}.folded")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
@@ -1,7 +1,17 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import glob
+from contextlib import nullcontext
+import re
+from ast import literal_eval
+from utils.jobs import publish_csv
+from utils import metrics
+from utils.profiling import profile_run
+import json
+import os
 
 def extract_heading(section):
         heading = section.find('h2', class_='elementor-heading-title')
@@ -62,18 +72,43 @@ def extract_relevant_sections(data, headings_of_interest):
                 select = False
     return extracted_data
 
+NEWSLETTER_DIRECTORY = './utils/data/Renatus Newsletter/'
+MISSING_CACHE_PATH = './utils/data/Renatus Newsletter/missing_urls.json'
+FIRST_ISSUE_DATE = datetime.strptime('16-06-2024', '%d-%m-%Y')
+DRIFT_DAYS = 2  # Issues are expected on Sundays but are sometimes published a day or two off
+RECENT_WEEKS = 4  # Window probed by a regular (non-backfill) run
+SETTLED_AFTER = timedelta(days=14)  # Only URLs older than this are remembered as missing
+MAX_WORKERS = 8
+REQUEST_TIMEOUT = 20
+# Site root, overridable to scrape a local replay server (benchmarks/replay_server.py)
+BASE_URL = os.environ.get('ARGUS_RENATUS_URL', 'https://renatus.ie')
+
+class NewsletterNotFound(Exception):
+    pass
+
 # Function to fetch the latest newsletter content
 def get_latest_newsletter(url):
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36',
     }
     
-    response = requests.get(url, headers=headers)
+    response = metrics.timed_get(url, 'newsletter fetch', headers=headers, timeout=REQUEST_TIMEOUT)
     
+    if response.status_code == 404:
+        raise NewsletterNotFound(f'No newsletter at {url}')
     if response.status_code != 200:
         raise Exception(f'Request failed with status code: {response.status_code}')
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
+    with metrics.stage('parse'):
+        return parse_newsletter(response.text)
+
+def parse_newsletter(html):
+    """
+    Extract the deal sections of a newsletter page.
+
+    :param html: Newsletter page HTML.
+    :return: Tuple of (soup, DataFrame with one column per section of interest).
+    """
+    soup = BeautifulSoup(html, 'html.parser')
     sections = soup.find_all('section')
     
     # Process sections
@@ -87,45 +122,225 @@ def get_latest_newsletter(url):
     return soup, df
 
 # Function to format the date for the URL
-def get_formatted_dates(start_date):
-    today = datetime.today()
-    storage = [start_date.strftime('%d-%m-%Y')]
-    while start_date < today:
-        start_date = start_date + timedelta(days=7)
-        storage.append(start_date.strftime('%d-%m-%Y'))
-    return storage
+def get_formatted_dates(start_date, end_date=None, drift_days=0):
+    """
+    Candidate issue dates from start_date to end_date, newest first.
+
+    :param start_date: Date of a known issue; later issues follow weekly.
+    :param end_date: Last date to consider, defaults to today.
+    :param drift_days: Also include this many days either side of each expected date.
+    :return: List of 'dd-mm-YYYY' strings.
+    """
+    end_date = end_date or datetime.today()
+    storage = []
+    expected = start_date
+    while expected <= end_date + timedelta(days=drift_days):
+        for offset in range(-drift_days, drift_days + 1):
+            candidate = expected + timedelta(days=offset)
+            if start_date - timedelta(days=drift_days) <= candidate <= end_date:
+                storage.append(candidate)
+        expected = expected + timedelta(days=7)
+    return [d.strftime('%d-%m-%Y') for d in sorted(set(storage), reverse=True)]
 
 # Function to generate the URL based on the formatted date
 def generate_url(date_str):
-    base_url = 'https://renatus.ie/renatus-private-equity-mampa-newsletter-'
+    base_url = f'{BASE_URL}/renatus-private-equity-mampa-newsletter-'
     url = f'{base_url}{date_str}/'
     return url
 
-def scrape_newsletters():
-    print('test')
-    start_date = datetime.strptime('16-06-2024', '%d-%m-%Y')
-    formatted_dates = get_formatted_dates(start_date)
-    print(formatted_dates)
-    generated = False
-    curr = -1
-    retries = 0
-    while not generated:
-        #utils/data/Renatus Newsletter
-        try:
-            url = generate_url(formatted_dates[curr])
-            print(f"Fetching newsletter from URL: {url}")
-            soup, df = get_latest_newsletter(url)
-            df.to_csv(f'./utils/data/Renatus Newsletter/renatus_{formatted_dates[curr]}.csv')
-            generated = True
-        except Exception as e:
-            curr -= 1
-            retries += 1
-            print(e)
-            if retries > 3:
-                break
+def load_missing_cache():
+    """URLs known not to host a newsletter, mapped to when they were last checked."""
+    try:
+        with open(MISSING_CACHE_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
-    
+def save_missing_cache(missing):
+    os.makedirs(os.path.dirname(MISSING_CACHE_PATH), exist_ok=True)
+    temp_path = f'{MISSING_CACHE_PATH}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(missing, f, indent=1, sort_keys=True)
+    os.replace(temp_path, MISSING_CACHE_PATH)
+
+DEAL_RECORDS_PATH = './utils/data/Renatus Newsletter/deal_records.csv'
+DEAL_RECORD_COLUMNS = ['Newsletter Date', 'Section', 'Position', 'Heading', 'Details', 'Who', 'What', 'Why', 'Adviser', 'Comment', 'Source', 'Links']
+DEAL_LABELS = {
+    'Deal Details': 'Details', 'Who': 'Who', 'What': 'What', 'Why': 'Why',
+    'Advisers': 'Adviser', 'Adviser': 'Adviser', 'Renatus Comment': 'Comment', 'Source': 'Source',
+}
+DEAL_LABEL_PATTERN = re.compile(r'(' + '|'.join(DEAL_LABELS) + r'):')
+
+def parse_deal_record(section, content, links):
+    """
+    Split one newsletter item into labelled fields.
+
+    Items are written as 'Label:text' runs (Deal Details, Who, What, Why,
+    Adviser(s), Renatus Comment, Source). The heading is the first sentence of the deal details,
+    or the first clause of 'Who' for fundraisings.
+
+    :param section: Newsletter section the item belongs to.
+    :param content: Item text as extracted by process_section.
+    :param links: Links string for the item.
+    :return: Dict with the DEAL_RECORD_COLUMNS fields except the date and position.
+    """
+    record = {field: '' for field in DEAL_LABELS.values()}
+    parts = DEAL_LABEL_PATTERN.split(content)
+    if parts[0].strip():
+        record['Details'] = parts[0].strip()
+    for label, text in zip(parts[1::2], parts[2::2]):
+        field = DEAL_LABELS[label]
+        record[field] = ' '.join([record[field], text.strip()]).strip()
+
+    if record['Details']:
+        heading, _, details = record['Details'].partition('. ')
+        if section == 'M&A Activity':
+            record['Details'] = details.strip()
+        heading = heading.strip()
+    else:
+        heading = record['Who'].split(',')[0].strip()
+    record['Heading'] = heading
+    record['Section'] = section
+    record['Links'] = links
+    return record
+
+def build_deal_records(extracted_df, newsletter_date):
+    """
+    Turn one newsletter's extracted sections into typed deal records.
+
+    :param extracted_df: DataFrame from get_latest_newsletter (sections as columns, 'Content'/'Links' rows).
+    :param newsletter_date: Date of the issue.
+    :return: DataFrame with DEAL_RECORD_COLUMNS.
+    """
+    records = []
+    for section in extracted_df.columns:
+        contents = extracted_df.at['Content', section]
+        links = extracted_df.at['Links', section]
+        for position, (content, link) in enumerate(zip(contents, links)):
+            record = parse_deal_record(section, content, link)
+            record['Newsletter Date'] = newsletter_date
+            record['Position'] = position
+            records.append(record)
+    df = pd.DataFrame(records, columns=DEAL_RECORD_COLUMNS)
+    df['Newsletter Date'] = pd.to_datetime(df['Newsletter Date'])
+    df['Position'] = df['Position'].astype(int)
+    return df
+
+def read_deal_records(path=DEAL_RECORDS_PATH):
+    """Read the deal records table with its column types restored."""
+    df = pd.read_csv(path, dtype={column: 'string' for column in DEAL_RECORD_COLUMNS if column not in ('Newsletter Date', 'Position')}, keep_default_na=False)
+    df['Newsletter Date'] = pd.to_datetime(df['Newsletter Date'])
+    df['Position'] = df['Position'].astype(int)
+    return df
+
+def save_deal_records(new_records, path=DEAL_RECORDS_PATH):
+    """
+    Merge deal records into the table shared by all newsletters.
+
+    Records of an issue that is already stored are replaced.
+
+    :param new_records: DataFrame with DEAL_RECORD_COLUMNS.
+    :param path: Table location.
+    """
+    if os.path.exists(path):
+        existing = read_deal_records(path)
+        existing = existing[~existing['Newsletter Date'].isin(new_records['Newsletter Date'].unique())]
+        new_records = pd.concat([existing, new_records], ignore_index=True)
+    # Written in DEAL_RECORD_COLUMNS order whatever the order of the stored table
+    new_records = new_records[DEAL_RECORD_COLUMNS].sort_values(['Newsletter Date', 'Section', 'Position'], ascending=[False, True, True])
+    temp_path = f'{path}.tmp'
+    new_records.to_csv(temp_path, index=False)
+    os.replace(temp_path, path)
+
+def rebuild_deal_records():
+    """
+    Build the deal records table from every saved newsletter snapshot.
+
+    Used once for snapshots saved before deal records were written at scrape time.
+    """
+    frames = []
+    for path in glob.glob(os.path.join(NEWSLETTER_DIRECTORY, 'renatus_*.csv')):
+        date_str = os.path.basename(path)[len('renatus_'):-len('.csv')]
+        extracted_df = pd.read_csv(path, index_col=0).applymap(literal_eval)
+        frames.append(build_deal_records(extracted_df, datetime.strptime(date_str, '%d-%m-%Y')))
+    if frames:
+        save_deal_records(pd.concat(frames, ignore_index=True))
+
+def newsletter_path(date_str):
+    return os.path.join(NEWSLETTER_DIRECTORY, f'renatus_{date_str}.csv')
+
+def probe_newsletter(date_str):
+    """
+    Fetch one candidate issue.
+
+    :return: Tuple of (date_str, DataFrame or None, 'found' | 'missing' | 'error').
+    """
+    url = generate_url(date_str)
+    try:
+        soup, df = get_latest_newsletter(url)
+    except NewsletterNotFound:
+        return date_str, None, 'missing'
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return date_str, None, 'error'
+    if df.empty:
+        return date_str, None, 'missing'
+    return date_str, df, 'found'
+
+def scrape_newsletters(backfill=False):
+    """
+    Probe renatus.ie for newsletters concurrently and save every issue found.
+
+    A regular run checks the last few weeks; a backfill run checks every week
+    since the first issue. Each expected Sunday is probed with +/- DRIFT_DAYS,
+    already saved issues are skipped, and settled dates that returned 404 are
+    remembered in a negative cache so they are never probed again.
+
+    :param backfill: Probe the full history instead of the recent window.
+    :return: List of saved file paths.
+    """
+    metrics.start_run('renatus')
+    today = datetime.today()
+    if backfill:
+        start_date = FIRST_ISSUE_DATE
+    else:
+        weeks_since_first = max(0, (today - FIRST_ISSUE_DATE).days // 7 - RECENT_WEEKS)
+        start_date = FIRST_ISSUE_DATE + timedelta(weeks=weeks_since_first)
+    formatted_dates = get_formatted_dates(start_date, today, DRIFT_DAYS)
+
+    missing = load_missing_cache()
+    to_probe = [
+        date_str for date_str in formatted_dates
+        if generate_url(date_str) not in missing and not os.path.exists(newsletter_path(date_str))
+    ]
+    metrics.cache('known dates', hit=True, count=len(formatted_dates) - len(to_probe))
+    metrics.cache('known dates', hit=False, count=len(to_probe))
+    print(f"Probing {len(to_probe)} of {len(formatted_dates)} candidate newsletter dates")
+
+    saved = []
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for date_str, df, outcome in executor.map(probe_newsletter, to_probe):
+            if outcome == 'found':
+                path = newsletter_path(date_str)
+                with metrics.stage('write'):
+                    publish_csv(df, path)
+                    records = build_deal_records(df, datetime.strptime(date_str, '%d-%m-%Y'))
+                    save_deal_records(records)
+                metrics.count_rows('deal records', rows_out=len(records))
+                saved.append(path)
+                print(f"Saved newsletter {date_str}")
+            elif outcome == 'missing' and today - datetime.strptime(date_str, '%d-%m-%Y') > SETTLED_AFTER:
+                missing[generate_url(date_str)] = today.isoformat(timespec='seconds')
+    save_missing_cache(missing)
+    # Reported next to the deal records table every found issue is merged into
+    print(metrics.format_summary(metrics.write_report(DEAL_RECORDS_PATH)))
+    return saved
 
 # Main block to fetch and print the latest newsletter
 if __name__ == "__main__":
-    scrape_newsletters()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Scrape Renatus newsletters.')
+    parser.add_argument('--backfill', action='store_true', help='Probe every week since the first issue.')
+    parser.add_argument('--profile', action='store_true', help='Write cProfile and folded-stack profiles to utils/data/Profiling.')
+    args = parser.parse_args()
+    with profile_run('renatus') if args.profile else nullcontext():
+        scrape_newsletters(backfill=args.backfill)
@@ -0,0 +1,46 @@
+import os
+import time
+
+import pandas as pd
+import streamlit as st
+
+class RenderTimer:
+    """
+    Where a page rerun spends its time.
+
+    Call lap(label) after each part of the page; the time since the previous
+    lap is added to that label, so repeated labels (e.g. one 'tables' lap per
+    table) accumulate. render() shows the totals in the sidebar.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.laps = {}
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, label):
+        now = time.perf_counter()
+        self.laps[label] = self.laps.get(label, 0.0) + now - self._last
+        self._last = now
+
+    def render(self):
+        if not self.enabled:
+            return
+        self.lap('other')
+        total = time.perf_counter() - self._start
+        timings = pd.DataFrame({
+            'Stage': list(self.laps),
+            'ms': [round(seconds * 1000, 1) for seconds in self.laps.values()],
+            'Share': [f"{seconds / total:.0%}" if total else '' for seconds in self.laps.values()],
+        })
+        with st.sidebar.expander(f"Render timing: {total * 1000:.0f} ms", expanded=True):
+            st.dataframe(timings, hide_index=True, use_container_width=True)
+
+def render_timer():
+    """
+    RenderTimer for the current rerun, enabled by ?timing=1 in the page URL or
+    by ARGUS_RENDER_TIMING=1.
+    """
+    params = st.experimental_get_query_params()
+    enabled = params.get('timing', ['0'])[0] not in ('0', '') or os.environ.get('ARGUS_RENDER_TIMING') == '1'
+    return RenderTimer(enabled)
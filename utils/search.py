@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+
+CACHE_PATH = "./utils/data/Cache/search_cache.sqlite"
+
+# How long results stay fresh, by SerpAPI 'tbs' time range (seconds)
+TTL_BY_TIME_RANGE = {
+    'qdr:h': 10 * 60,
+    'qdr:d': 60 * 60,
+    'qdr:w': 6 * 60 * 60,
+    'qdr:m': 24 * 60 * 60,
+    'qdr:y': 3 * 24 * 60 * 60,
+}
+DEFAULT_TTL = 24 * 60 * 60
+
+def normalize_params(params):
+    """
+    Cache key for a search: every parameter except the API key, with the query's
+    whitespace collapsed. Case is kept, SerpAPI reads upper-case OR and AND as operators.
+
+    :param params: SerpAPI parameters.
+    :return: JSON string, identical for equivalent searches.
+    """
+    key = {}
+    for name, value in params.items():
+        if name == 'api_key' or value is None or value == '':
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(map(str, value))
+        value = str(value)
+        if name == 'q':
+            value = ' '.join(value.split())
+        key[name] = value
+    return json.dumps(key, sort_keys=True)
+
+def ttl_for(params):
+    """Freshness window for a search, shorter for narrow time ranges."""
+    return TTL_BY_TIME_RANGE.get(params.get('tbs') or '', DEFAULT_TTL)
+
+class SerpApiBackend:
+    """Live searches through the SerpAPI client."""
+
+    def search(self, params):
+        from serpapi.google_search import GoogleSearch
+        return GoogleSearch(params).get_dict()
+
+class HttpBackend:
+    """
+    Searches against any server exposing SerpAPI's `/search.json` endpoint,
+    e.g. a local stub server in tests.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def search(self, params):
+        response = requests.get(f"{self.base_url}/search.json", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+def default_backend():
+    """HttpBackend when ARGUS_SEARCH_URL is set, SerpAPI otherwise."""
+    base_url = os.environ.get('ARGUS_SEARCH_URL')
+    return HttpBackend(base_url) if base_url else SerpApiBackend()
+
+class SearchCache:
+    """
+    Persistent search-result cache with single-flight requests.
+
+    Results are stored in SQLite keyed on normalize_params, so repeat searches
+    from any session or process are answered locally until their TTL expires.
+    Concurrent identical searches in this process wait on the first request
+    instead of each calling the backend.
+    """
+
+    def __init__(self, path=CACHE_PATH, backend=None):
+        self.backend = backend or default_backend()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, fetched_at REAL, response TEXT)")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+
+    def get(self, key, ttl):
+        with self._db_lock:
+            row = self._db.execute("SELECT fetched_at, response FROM results WHERE key = ?", (key,)).fetchone()
+        if row and time.time() - row[0] < ttl:
+            return json.loads(row[1])
+        return None
+
+    def put(self, key, response):
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, time.time(), json.dumps(response)))
+            self._db.commit()
+
+    def search(self, params, before_fetch=None):
+        """
+        Run a search, answering from the cache when a fresh result exists.
+
+        :param params: SerpAPI parameters (including api_key for live backends).
+        :param before_fetch: Called right before the backend is queried, e.g. a rate limiter;
+            not called for searches answered from the cache or by a concurrent identical search.
+        :return: Response dict as returned by the backend.
+        """
+        key = normalize_params(params)
+        cached = self.get(key, ttl_for(params))
+        if cached is not None:
+            return cached
+
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            if before_fetch is not None:
+                before_fetch()
+            response = self.backend.search(params)
+            if 'error' not in response:
+                self.put(key, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def cached_search(params, before_fetch=None):
+    """Search through the process-wide SearchCache, see SearchCache.search."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SearchCache()
+    return _default_cache.search(params, before_fetch)
@@ -0,0 +1,188 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
+
+SCRAPED_NEWS_GLOBS = [
+    "./utils/data/Scraped News/{source}_data_*.csv",
+    "./utils/data/Scraped News/Archive/{source}_data_*.csv",
+]
+VISITS_PATH = "./utils/data/Cache/news_visits.json"
+# Hashes of the snapshot each visitor last opened, kept apart from the snapshot,
+# which a same-day rescrape overwrites
+VISIT_HASHES_DIRECTORY = "./utils/data/Cache/Visits/"
+
+# source -> columns identifying an article across snapshots
+KEY_COLUMNS = {
+    'cnbc': ('Link',),
+    'marketinsights': ('link',),
+    # No article link is scraped, titles are unique enough on the IPO news listing
+    'stockanalysis': ('Title',),
+}
+# source -> columns whose change makes an article 'updated'; relative 'Source' texts
+# ('2 hours ago'), image URLs (resized per page layout) and raw page HTML change
+# between scrapes without the article changing and are left out
+CONTENT_COLUMNS = {
+    'cnbc': ('Title', 'Time', 'Article content'),
+    'marketinsights': ('title', 'ticker', 'source', 'Time', 'Article content', 'People', 'Industry', 'Contact Information', 'Country'),
+    'stockanalysis': ('Time', 'Description', 'Tickers', 'Executives', 'Country', 'Industry', 'Sector'),
+}
+
+def hash_path(snapshot_path):
+    """Location of the hash sidecar written next to a snapshot (not .csv, so snapshot globs skip it)."""
+    return os.path.splitext(snapshot_path)[0] + '.hashes.json'
+
+def _digest(values):
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=8).hexdigest()
+
+def compute_hashes(df, selection):
+    """
+    Identity and content hash of every article of a snapshot.
+
+    Times are hashed as UTC, so snapshots from before and after timestamps
+    were stored in UTC compare equal.
+
+    :param df: Snapshot as read from its CSV.
+    :param selection: 'cnbc', 'marketinsights' or 'stockanalysis'.
+    :return: DataFrame with Row, Key and Content, one row per article (first occurrence of a key).
+    """
+    df = df.copy()
+    if 'Time' in df:
+        times = normalize_timestamps(df['Time'], timezone=SOURCE_TIMEZONES[selection])
+        df['Time'] = times.dt.strftime('%Y-%m-%dT%H:%M:%SZ').where(times.notna(), df['Time'])
+    text = {column: df[column].astype('string').fillna('') if column in df else pd.Series('', index=df.index)
+            for column in KEY_COLUMNS[selection] + CONTENT_COLUMNS[selection]}
+    keys = [_digest(values) for values in zip(*(text[column] for column in KEY_COLUMNS[selection]))]
+    contents = [_digest(values) for values in zip(*(text[column] for column in CONTENT_COLUMNS[selection]))]
+    hashes = pd.DataFrame({'Row': range(len(df)), 'Key': keys, 'Content': contents})
+    # Listings repeat an article under several categories
+    return hashes.drop_duplicates('Key').reset_index(drop=True)
+
+def read_hashes(path):
+    with open(path) as f:
+        return pd.DataFrame(json.load(f), columns=['Row', 'Key', 'Content'])
+
+def _write_hashes(hashes, path):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(hashes.to_dict('list'), f)
+    os.replace(temp_path, path)
+
+def load_hashes(snapshot_path, selection):
+    """
+    Hashes of a snapshot from its sidecar, built and saved on first use.
+
+    Only the sidecar is read once it exists, not the article text.
+    """
+    path = hash_path(snapshot_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(snapshot_path):
+        return read_hashes(path)
+    columns = set(KEY_COLUMNS[selection] + CONTENT_COLUMNS[selection])
+    hashes = compute_hashes(pd.read_csv(snapshot_path, usecols=lambda c: c in columns), selection)
+    _write_hashes(hashes, path)
+    return hashes
+
+def diff_snapshots(old_path, new_path, selection):
+    """
+    Articles added, removed and updated between two snapshots of a source.
+
+    :param old_path: Earlier snapshot, or None to treat every article of new_path as added.
+    :param new_path: Later snapshot.
+    :return: DataFrame with Key, Status ('added', 'removed' or 'updated'), Old Row and New Row
+        (rows of the snapshot CSVs, NA where the article is absent).
+    """
+    new = load_hashes(new_path, selection)
+    return diff_hashes(load_hashes(old_path, selection) if old_path else None, new)
+
+def diff_hashes(old, new):
+    """
+    Articles added, removed and updated between the hashes of two snapshots, see diff_snapshots.
+
+    :param old: Hashes of the earlier snapshot, or None to treat every article as added.
+    :param new: Hashes of the later snapshot.
+    """
+    old = new.iloc[0:0] if old is None else old
+    merged = old.merge(new, on='Key', how='outer', suffixes=(' Old', ' New'), indicator=True)
+    status = merged['_merge'].map({'left_only': 'removed', 'right_only': 'added', 'both': 'updated'}).astype(str)
+    changed = (status != 'updated') | (merged['Content Old'] != merged['Content New'])
+    merged = merged[changed]
+    return pd.DataFrame({
+        'Key': merged['Key'],
+        'Status': status[changed],
+        'Old Row': merged['Row Old'].astype('Int64'),
+        'New Row': merged['Row New'].astype('Int64'),
+    }).reset_index(drop=True)
+
+def snapshot_history(selection):
+    """Every snapshot of a source, current and archived, oldest first."""
+    paths = []
+    for pattern in SCRAPED_NEWS_GLOBS:
+        paths.extend(glob.glob(pattern.format(source=selection)))
+    return sorted(paths, key=os.path.basename)
+
+def find_snapshot(selection, name):
+    """Path of a snapshot by file name, wherever it was archived to, or None."""
+    return next((path for path in snapshot_history(selection) if os.path.basename(path) == name), None)
+
+_visits_lock = threading.Lock()
+
+def _load_visits():
+    try:
+        with open(VISITS_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _visit_hashes_path(visitor, selection):
+    # Visitor names are free text, so the file is named after their digest
+    return os.path.join(VISIT_HASHES_DIRECTORY, f"{_digest([visitor])}_{selection}.hashes.json")
+
+def last_visit(visitor, selection):
+    """
+    Snapshot of a source a visitor last opened.
+
+    :return: Tuple of (visit with the snapshot's file name and mtime_ns, its hashes), or None.
+    """
+    with _visits_lock:
+        visit = _load_visits().get(visitor, {}).get(selection)
+        if not isinstance(visit, dict) or not os.path.exists(_visit_hashes_path(visitor, selection)):
+            return None
+        return visit, read_hashes(_visit_hashes_path(visitor, selection))
+
+def record_visit(visitor, selection, snapshot_path):
+    """Remember the snapshot a visitor opened, with a copy of its hashes."""
+    hashes = load_hashes(snapshot_path, selection)
+    with _visits_lock:
+        os.makedirs(VISIT_HASHES_DIRECTORY, exist_ok=True)
+        _write_hashes(hashes, _visit_hashes_path(visitor, selection))
+        visits = _load_visits()
+        visits.setdefault(visitor, {})[selection] = {
+            'snapshot': os.path.basename(snapshot_path), 'mtime_ns': os.stat(snapshot_path).st_mtime_ns,
+        }
+        os.makedirs(os.path.dirname(VISITS_PATH), exist_ok=True)
+        temp_path = f'{VISITS_PATH}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(visits, f, indent=1, sort_keys=True)
+        os.replace(temp_path, VISITS_PATH)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show the articles added, removed and updated between two snapshots.')
+    parser.add_argument('selection', choices=sorted(KEY_COLUMNS))
+    parser.add_argument('--old', help='Earlier snapshot, defaults to the one before --new.')
+    parser.add_argument('--new', help='Later snapshot, defaults to the latest.')
+    args = parser.parse_args()
+    history = snapshot_history(args.selection)
+    new_path = args.new or history[-1]
+    old_path = args.old or next((path for path in reversed(history) if os.path.basename(path) < os.path.basename(new_path)), None)
+    diff = diff_snapshots(old_path, new_path, args.selection)
+    print(f"{old_path} -> {new_path}")
+    print(diff['Status'].value_counts().to_string())
+    titles = pd.read_csv(new_path, usecols=lambda c: c in ('Title', 'title'))
+    for status, row in diff.loc[diff['Status'] != 'removed', ['Status', 'New Row']].itertuples(index=False):
+        print(f"  {status:8} {titles.iloc[int(row), 0]}")
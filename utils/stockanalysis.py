@@ -1,12 +1,38 @@
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+from utils.parsing import parse_pages
+from utils.timestamps import SOURCE_TIMEZONES, normalize_timestamps
 
+# Site root, overridable to scrape a local replay server (benchmarks/replay_server.py)
+BASE_URL = os.environ.get('ARGUS_STOCKANALYSIS_URL', 'https://stockanalysis.com')
+SCRAPED_NEWS_DIRECTORY = './utils/data/Scraped News/'
+# Progress of an interrupted crawl, removed once the crawl's snapshot is scraped
+CRAWL_CHECKPOINT_PATH = './utils/data/Scraped News/stockanalysis_crawl.json'
+CRAWL_WORKERS = 4  # Listing pages fetched at once
+MAX_CRAWL_PAGES = 200  # Safety bound on the pages walked by one crawl
+# Articles of the previous snapshot this recent are carried into the next one, the News page's longest lookback
+SNAPSHOT_WINDOW = pd.Timedelta(days=14)
 
-def scrape_ticker_information(ticker):
+
+def fetch_ticker_page(ticker):
+    """
+    Fetches the company page of a ticker.
+
+    Args:
+        ticker (str): Ticker, or a comma separated list of which the first is used.
+
+    Returns:
+        str: Page HTML, or None when the request failed.
+    """
     ticker = ticker.split(',')[0].strip() #TODO: Implement a smart way
     # URL of the website
-    url = f'https://stockanalysis.com/stocks/{ticker}/company/'
+    url = f'{BASE_URL}/stocks/{ticker}/company/'
 
     headerx = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_11_5) '
@@ -14,14 +40,36 @@ def scrape_ticker_information(ticker):
         }
     # Send a GET request to the URL
     try:
-        response = requests.get(url, headers = headerx)
+        response = metrics.timed_get(url, 'company fetch', headers = headerx)
         response.raise_for_status()  # Raise an exception if the request was unsuccessful
-        # Parse the HTML content of the page with BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-        return soup
+        return response.text
     except:
         return
 
+def parse_company_page(html):
+    """
+    Extracts the company details from a StockAnalysis company page.
+
+    Runs in the parse pool, so it returns plain values and no soup.
+
+    Args:
+        html (str): Page HTML.
+
+    Returns:
+        dict: Executives, Description, Country, Industry and Sector.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    country, industry, sector = get_info(soup)
+    details = {
+        'Executives': get_key_executives(soup),
+        'Description': get_summary(soup),
+        'Country': country,
+        'Industry': industry,
+        'Sector': sector,
+    }
+    soup.decompose()
+    return details
+
 def get_key_executives(soup):
     # Find the table containing key executives
     try:
@@ -64,6 +112,34 @@ def get_info(soup):
     except Exception as e:
         return pd.Series([None, None, None])
 
+def news_page_url(page):
+    """URL of a page of the IPO news listing, page 1 being the latest."""
+    return f"{BASE_URL}/ipos/news/" if page == 1 else f"{BASE_URL}/ipos/news/?page={page}"
+
+def get_news_page(page, scraped_at=None):
+    """
+    Scrapes one page of the StockAnalysis IPO news listing.
+
+    Args:
+        page (int): Page number, 1 being the latest news.
+        scraped_at (pd.Timestamp, optional): Scrape time relative times are resolved against.
+
+    Returns:
+        pd.DataFrame: The page's articles with 'Time' in UTC.
+    """
+    scraped_at = pd.Timestamp.now(tz='UTC') if scraped_at is None else scraped_at
+    response = metrics.timed_get(news_page_url(page), 'listing fetch')
+    response.raise_for_status()
+    with metrics.stage('parse'):
+        df = parse_latest_news(response.content)
+    metrics.count_rows('listing', rows_out=len(df))
+
+    # 'Aug 24, 2024, 05:00 AM EDT' to UTC
+    with metrics.stage('timestamps'):
+        df['Time'] = normalize_timestamps(df['Time'], scraped_at, SOURCE_TIMEZONES['stockanalysis'])
+    metrics.count_rows('timestamps', rows_in=len(df), rows_out=int(df['Time'].notna().sum()))
+    return df
+
 def get_latest_news():
     """
     Scrapes the latest IPO news articles from StockAnalysis website.
@@ -71,15 +147,138 @@ def get_latest_news():
     Returns:
         pd.DataFrame: DataFrame containing the extracted news articles.
     """
-    
-    # URL of the page to scrape
-    url = "https://stockanalysis.com/ipos/news/"
+    return get_news_page(1)
+
+def latest_snapshot():
+    """Path of the latest stockanalysis snapshot, or None."""
+    files = glob.glob(os.path.join(SCRAPED_NEWS_DIRECTORY, 'stockanalysis_data_*.csv'))
+    return max(files, key=os.path.getctime) if files else None
+
+def last_seen_articles():
+    """
+    Titles and newest time of the articles in the latest stockanalysis snapshot.
+
+    Returns:
+        tuple: (set of titles, newest UTC timestamp), or (set(), None) without a snapshot.
+    """
+    path = latest_snapshot()
+    if path is None:
+        return set(), None
+    df = pd.read_csv(path, usecols=['Title', 'Time'])
+    times = normalize_timestamps(df['Time'], timezone=SOURCE_TIMEZONES['stockanalysis'])
+    return set(df['Title'].dropna()), times.max() if times.notna().any() else None
+
+def load_crawl_checkpoint(since):
+    """Saved state of an unfinished crawl towards the same boundary, or None."""
+    try:
+        with open(CRAWL_CHECKPOINT_PATH) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if state.get('since') == (since.isoformat() if since is not None else None) else None
+
+def save_crawl_checkpoint(state):
+    os.makedirs(os.path.dirname(CRAWL_CHECKPOINT_PATH), exist_ok=True)
+    temp_path = f'{CRAWL_CHECKPOINT_PATH}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(temp_path, CRAWL_CHECKPOINT_PATH)
 
-    # Send a GET request to the webpage
-    response = requests.get(url)
+def clear_crawl_checkpoint():
+    if os.path.exists(CRAWL_CHECKPOINT_PATH):
+        os.remove(CRAWL_CHECKPOINT_PATH)
 
+def crawl_news(since=None, max_pages=MAX_CRAWL_PAGES):
+    """
+    Scrapes the IPO news listing page by page until it reaches known news.
+
+    Pages are fetched CRAWL_WORKERS at a time and read in order. The crawl
+    stops at the first page that is empty, repeats articles already crawled,
+    goes back past `since`, or reaches an article of the latest snapshot; with
+    neither a `since` nor a snapshot only the first page is read. Every
+    article read is returned, known ones included: the latest snapshot only
+    decides where the crawl stops. Progress is
+    saved to CRAWL_CHECKPOINT_PATH after every page, so an interrupted crawl
+    resumes from the page it stopped at.
+
+    Args:
+        since (pd.Timestamp, optional): Oldest time to crawl back to, in UTC.
+        max_pages (int): Most pages to walk.
+
+    Returns:
+        pd.DataFrame: The articles of every page read, latest first, with 'Time' in UTC.
+    """
+    state = load_crawl_checkpoint(since)
+    if state is None:
+        seen_titles, seen_time = last_seen_articles()
+        state = {
+            'since': since.isoformat() if since is not None else None,
+            'seen_titles': sorted(seen_titles),
+            'seen_time': seen_time.isoformat() if seen_time is not None else None,
+            'scraped_at': pd.Timestamp.now(tz='UTC').isoformat(),
+            'next_page': 1,
+            'done': False,
+            'articles': [],
+        }
+    else:
+        print(f"Resuming the stockanalysis crawl at page {state['next_page']}")
+    scraped_at = pd.Timestamp(state['scraped_at'])
+    seen_titles = set(state['seen_titles'])
+    seen_time = pd.Timestamp(state['seen_time']) if state['seen_time'] else None
+    # The older of the two boundaries wins, so --since can reach past the last snapshot
+    boundary = min((t for t in (since, seen_time) if t is not None), default=None)
+    crawled = {(article['Title'], article['Time']) for article in state['articles']}
+
+    with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as executor:
+        while not state['done'] and state['next_page'] <= max_pages:
+            # The first page alone decides whether a regular run needs older pages at all
+            batch = 1 if state['next_page'] == 1 else CRAWL_WORKERS
+            pages = range(state['next_page'], min(state['next_page'] + batch, max_pages + 1))
+            futures = [executor.submit(get_news_page, page, scraped_at) for page in pages]
+            for page, future in zip(pages, futures):
+                # A failed page raises here with the pages before it checkpointed
+                df = future.result()
+                keys = list(zip(df['Title'], df['Time'].map(lambda t: t.isoformat() if pd.notna(t) else None)))
+                new = pd.Series([key not in crawled for key in keys], index=df.index, dtype=bool)
+                known = df['Title'].isin(seen_titles)
+                if boundary is not None:
+                    known |= df['Time'].notna() & (df['Time'] <= boundary)
+                state['articles'].extend(
+                    {**record, 'Time': record['Time'].isoformat() if pd.notna(record['Time']) else None}
+                    for record in df[new].to_dict('records')
+                )
+                crawled.update(key for key, is_new in zip(keys, new) if is_new)
+                state['next_page'] = page + 1
+                state['done'] = (
+                    boundary is None
+                    or df.empty
+                    or not new.any()
+                    or bool(known.any())
+                )
+                save_crawl_checkpoint(state)
+                if state['done']:
+                    break
+            for future in futures:
+                future.cancel()
+
+    df = pd.DataFrame(state['articles'], columns=['Title', 'Time', 'Source', 'Description', 'Tickers', 'Image URL'])
+    df['Time'] = pd.to_datetime(df['Time'], utc=True, format='ISO8601')
+    metrics.count_rows('crawl', rows_in=len(crawled), rows_out=len(df))
+    print(f"Crawled {state['next_page'] - 1} stockanalysis pages, {int((~df['Title'].isin(seen_titles)).sum())} new articles")
+    return df.sort_values('Time', ascending=False, kind='stable').reset_index(drop=True)
+
+def parse_latest_news(html):
+    """
+    Extracts the news articles from the StockAnalysis IPO news page.
+
+    Args:
+        html (str | bytes): Page HTML.
+
+    Returns:
+        pd.DataFrame: DataFrame containing the extracted news articles.
+    """
     # Parse the content with BeautifulSoup
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = BeautifulSoup(html, "html.parser")
 
     # Extract news articles
     articles = soup.find_all('div', class_='gap-4 border-gray-300 bg-white p-4 shadow last:pb-1 last:shadow-none dark:border-dark-600 dark:bg-dark-800 sm:border-b sm:px-0 sm:shadow-none sm:last:border-b-0 lg:gap-5 sm:grid sm:grid-cols-news sm:py-6')
@@ -133,15 +332,69 @@ def get_latest_news():
         "Image URL": images
     })
 
-    # Convert 'Time' column to datetime
-    news_df['Time'] = pd.to_datetime(news_df['Time'], errors='coerce')
-
     return news_df
 
-def scrape_stockanalysis():
-    df = get_latest_news()
-    df['raw'] = df['Tickers'].apply(scrape_ticker_information)
-    df['Executives'] = df['raw'].apply(get_key_executives)
-    df['Description'] = df['raw'].apply(get_summary)
-    df[['Country', 'Industry', 'Sector']] = df['raw'].apply(get_info)
+def carried_over_articles(crawled_titles, window=SNAPSHOT_WINDOW):
+    """
+    Articles of the latest snapshot within `window` that the crawl did not read again.
+
+    They keep the company details scraped with them, so their pages are not fetched again.
+
+    Args:
+        crawled_titles (pd.Series): Titles of the crawled articles.
+        window (pd.Timedelta): How far back articles are carried over.
+
+    Returns:
+        pd.DataFrame: Snapshot rows with 'Time' in UTC, or None without a snapshot.
+    """
+    path = latest_snapshot()
+    if path is None:
+        return None
+    df = pd.read_csv(path)
+    df['Time'] = normalize_timestamps(df['Time'], timezone=SOURCE_TIMEZONES['stockanalysis'])
+    keep = ~df['Title'].isin(crawled_titles) & (df['Time'] >= pd.Timestamp.now(tz='UTC') - window)
+    return df[keep]
+
+def scrape_stockanalysis(since=None):
+    """
+    Scrapes the IPO news listing with company details into a full snapshot.
+
+    A regular run reads only the first listing page; after missed runs it
+    crawls older pages until it reaches the latest snapshot (see crawl_news).
+    The articles of the latest snapshot within SNAPSHOT_WINDOW that were not
+    read again are carried over, so a snapshot never loses recent news.
+
+    Args:
+        since (pd.Timestamp, optional): Also crawl back to this UTC time.
+
+    Returns:
+        pd.DataFrame: The news articles with executives, description, country, industry and sector.
+    """
+    df = crawl_news(since).drop_duplicates('Title').reset_index(drop=True)
+    carried = carried_over_articles(df['Title'])
+    # Company pages are fetched once per ticker, a long crawl repeats tickers a lot
+    tickers = df['Tickers'].fillna('').map(lambda ticker: ticker.split(',')[0].strip())
+    unique_tickers = [ticker for ticker in tickers.unique() if ticker]
+    metrics.cache('company pages', hit=True, count=int(tickers.ne('').sum()) - len(unique_tickers))
+    metrics.cache('company pages', hit=False, count=len(unique_tickers))
+    with ThreadPoolExecutor(max_workers=CRAWL_WORKERS) as executor:
+        pages = dict(zip(unique_tickers, executor.map(fetch_ticker_page, unique_tickers)))
+    # CPU-bound, so the pages are parsed in worker processes (utils/parsing.py)
+    with metrics.stage('parse'):
+        details = dict(zip(pages, parse_pages(parse_company_page, list(pages.values()))))
+    df['raw'] = tickers.map(pages)
+    for column in ('Executives', 'Description', 'Country', 'Industry', 'Sector'):
+        df[column] = tickers.map(lambda ticker: (details.get(ticker) or {}).get(column))
+    metrics.count_rows('company pages', rows_in=len(df), rows_out=int(df['raw'].notna().sum()))
+    if carried is not None and not carried.empty:
+        df = pd.concat([df, carried], ignore_index=True).sort_values('Time', ascending=False, kind='stable').reset_index(drop=True)
+        metrics.count_rows('carried over', rows_out=len(carried))
+    clear_crawl_checkpoint()
     return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape StockAnalysis IPO news, crawling back over missed pages, and publish the snapshot.')
+    parser.add_argument('--since', help='Crawl back to this date (YYYY-MM-DD, UTC) instead of only to the latest snapshot.')
+    args = parser.parse_args()
+    from utils.pipeline import scrape_and_publish
+    scrape_and_publish('stockanalysis', since=pd.Timestamp(args.since, tz='UTC') if args.since else None)
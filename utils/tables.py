@@ -0,0 +1,101 @@
+import math
+import pandas as pd
+import streamlit as st
+
+DEFAULT_PAGE_SIZE = 25
+TRUNCATE_AT = 200
+
+def truncate_text(df, columns, width=TRUNCATE_AT):
+    """
+    Shorten long text columns for display.
+
+    :param df: DataFrame to display.
+    :param columns: Columns to shorten; missing columns are ignored.
+    :param width: Maximum number of characters kept per cell.
+    :return: Copy of df with long values cut and suffixed with '…'.
+    """
+    df = df.copy()
+    for column in columns:
+        if column in df.columns:
+            text = df[column].astype('string')
+            long = text.str.len() > width
+            df[column] = text.where(~long, text.str.slice(0, width) + '…')
+    return df
+
+def search_rows(df, query, columns):
+    """
+    Keep rows where any of the given columns contains the query (case insensitive).
+
+    :param df: DataFrame to filter.
+    :param query: Text to look for; an empty query keeps every row.
+    :param columns: Columns to search.
+    :return: Filtered DataFrame.
+    """
+    if not query:
+        return df
+    mask = pd.Series(False, index=df.index)
+    for column in columns:
+        if column in df.columns:
+            mask |= df[column].astype('string').str.contains(query, case=False, regex=False, na=False)
+    return df[mask]
+
+def paginate(df, page, page_size=DEFAULT_PAGE_SIZE, sort_by=None, ascending=True):
+    """
+    Sort a DataFrame and return one page of it.
+
+    :param df: DataFrame to page through.
+    :param page: 1-based page number, clamped to the available pages.
+    :param page_size: Rows per page.
+    :param sort_by: Optional column to sort by.
+    :param ascending: Sort order.
+    :return: Tuple of (page DataFrame, number of pages).
+    """
+    if sort_by is not None and sort_by in df.columns:
+        df = df.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last')
+    pages = max(1, math.ceil(len(df) / page_size))
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], pages
+
+def paginated_table(df, key, text_columns=(), page_size=DEFAULT_PAGE_SIZE, static=False):
+    """
+    Render a DataFrame one page at a time with sorting, search and row expansion.
+
+    Only the visible page is sent to the browser, with long text columns
+    truncated. Picking a row in the expander shows its full contents.
+
+    :param df: DataFrame to render.
+    :param key: Unique widget key prefix.
+    :param text_columns: Long text columns to truncate and search.
+    :param page_size: Rows per page.
+    :param static: Render with st.table instead of st.dataframe.
+    """
+    controls = st.columns([3, 2, 1, 1])
+    query = controls[0].text_input("Search", key=f"{key}_search")
+    sort_by = controls[1].selectbox("Sort by", ['(none)'] + list(df.columns), key=f"{key}_sort")
+    ascending = controls[2].selectbox("Order", ['Asc', 'Desc'], key=f"{key}_order") == 'Asc'
+
+    df = search_rows(df, query, text_columns)
+    pages = max(1, math.ceil(len(df) / page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        # The search narrowed the rows, go back to the last available page
+        st.session_state[f"{key}_page"] = pages
+    page = controls[3].number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    page_df, pages = paginate(df, page, page_size, None if sort_by == '(none)' else sort_by, ascending)
+
+    st.caption(f"Showing {len(page_df)} of {len(df)} rows")
+    display_df = truncate_text(page_df, text_columns)
+    if static:
+        st.table(display_df.assign(hack='').set_index('hack'))
+    else:
+        st.dataframe(display_df)
+
+    if text_columns and not page_df.empty:
+        with st.expander("Expand a row"):
+            row_number = st.selectbox(
+                "Row", range(len(page_df)), key=f"{key}_expand",
+                format_func=lambda i: str(page_df.iloc[i, 0])[:100],
+            )
+            for column, value in page_df.iloc[row_number].items():
+                value = str(value).replace('$', '\\$')
+                st.markdown(f"**{column}:** {value}")
@@ -0,0 +1,157 @@
+import dateutil.parser
+import dateutil.tz
+import numpy as np
+import pandas as pd
+
+# Timezone each site displays its times in, used for values without an explicit zone
+SOURCE_TIMEZONES = {
+    'cnbc': 'America/New_York',
+    'stockanalysis': 'America/New_York',
+    'marketinsights': 'Europe/Paris',
+}
+# Zone abbreviations the sites append to times
+TZ_ABBREVIATIONS = {
+    'EST': 'America/New_York', 'EDT': 'America/New_York', 'ET': 'America/New_York',
+    'CST': 'America/Chicago', 'CDT': 'America/Chicago',
+    'PST': 'America/Los_Angeles', 'PDT': 'America/Los_Angeles',
+    'GMT': 'UTC', 'UTC': 'UTC', 'BST': 'Europe/London', 'CET': 'Europe/Paris', 'CEST': 'Europe/Paris',
+}
+# Clock times up to this far after the scrape are taken as today (site and scraper clocks differ)
+CLOCK_SKEW = pd.Timedelta(hours=1)
+
+# Format classes, tried in order; the first full match decides how a value is parsed
+PATTERNS = {
+    # '5 min ago', '1 hour ago', 'an hour ago', 'just now'
+    'relative': r'(?i)(?:(?:\d+|an?|one)\s*(?:s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?|w|weeks?)\s+ago|just now)',
+    # '10:05am', '10:05 PM', '14:30' (marketinsights, today's items)
+    'clock': r'(?i)\d{1,2}:\d{2}(?:\s*[ap]m)?',
+    # 'Aug. 23', 'Sept. 3', 'Aug 23' (marketinsights, older items, no year)
+    'month_day': r'[A-Z][a-z]{2,8}\.?\s+\d{1,2}',
+    # 'Thu, Aug 22 2024' (cnbc)
+    'weekday_date': r'[A-Z][a-z]{2}, [A-Z][a-z]{2} \d{1,2} \d{4}',
+    # 'Aug 24, 2024, 05:00 AM EDT' (stockanalysis)
+    'long_datetime': r'[A-Z][a-z]{2} \d{1,2}, \d{4}, \d{1,2}:\d{2} [AP]M(?: [A-Z]{2,5})?',
+    # '2024-08-23', '2024-08-23 14:43:00', '2024-08-23 18:43:00+00:00' (stored snapshots)
+    'iso': r'\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?',
+}
+RELATIVE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+ISO_OFFSET = r'\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})$'
+
+def classify(text):
+    """
+    Format class of every value, from PATTERNS.
+
+    :param text: Series of stripped strings, missing values as NA.
+    :return: Series of class names, 'other' when nothing matches and 'missing' for NA.
+    """
+    conditions = [text.str.fullmatch(pattern).fillna(False).to_numpy(dtype=bool) for pattern in PATTERNS.values()]
+    classes = np.select(conditions, list(PATTERNS), default='other')
+    classes[text.isna().to_numpy()] = 'missing'
+    return pd.Series(classes, index=text.index)
+
+def _localize(naive, timezone):
+    # Ambiguous wall times (the repeated DST hour) are read as standard time
+    localized = naive.dt.tz_localize(timezone, ambiguous=np.zeros(len(naive), dtype=bool), nonexistent='shift_forward')
+    return localized.dt.tz_convert('UTC')
+
+def _parse_relative(text, scraped_at, timezone):
+    parts = text.str.lower().str.extract(r'(?P<count>\d+|an?|one)\s*(?P<unit>[a-z])')
+    counts = pd.to_numeric(parts['count'].replace({'a': '1', 'an': '1', 'one': '1'}), errors='coerce').fillna(0)
+    seconds = counts * parts['unit'].map(RELATIVE_UNITS).fillna(0)
+    return scraped_at - pd.to_timedelta(seconds, unit='s')
+
+def _parse_clock(text, scraped_at, timezone):
+    parts = text.str.lower().str.extract(r'(?P<hour>\d{1,2}):(?P<minute>\d{2})\s*(?P<meridiem>[ap]m)?')
+    hours = parts['hour'].astype(int)
+    hours = hours.where(parts['meridiem'].isna(), hours % 12 + np.where(parts['meridiem'] == 'pm', 12, 0))
+    local_now = scraped_at.tz_convert(timezone).tz_localize(None)
+    naive = local_now.normalize() + pd.to_timedelta(hours * 60 + parts['minute'].astype(int), unit='min')
+    # A time later than the scrape was shown yesterday
+    naive = naive.where(naive <= local_now + CLOCK_SKEW, naive - pd.Timedelta(days=1))
+    return _localize(naive, timezone)
+
+def _parse_month_day(text, scraped_at, timezone):
+    parts = text.str.extract(r'(?P<month>[A-Za-z]{3})[a-z]*\.?\s+(?P<day>\d{1,2})')
+    month_day = parts['month'].str.title() + ' ' + parts['day']
+    local_today = scraped_at.tz_convert(timezone).tz_localize(None).normalize()
+    naive = pd.to_datetime(str(local_today.year) + ' ' + month_day, format='%Y %b %d', errors='coerce')
+    # No year is shown, so a date after the scrape (December items scraped in January) is from last year
+    rollover = naive.isna() | (naive > local_today + pd.Timedelta(days=1))
+    if rollover.any():
+        naive[rollover] = pd.to_datetime(str(local_today.year - 1) + ' ' + month_day[rollover], format='%Y %b %d', errors='coerce')
+    return _localize(naive, timezone)
+
+def _parse_weekday_date(text, scraped_at, timezone):
+    return _localize(pd.to_datetime(text, format='%a, %b %d %Y', errors='coerce'), timezone)
+
+def _parse_long_datetime(text, scraped_at, timezone):
+    parts = text.str.extract(r'(?P<body>.+?[AP]M)(?:\s+(?P<zone>[A-Z]{2,5}))?$')
+    naive = pd.to_datetime(parts['body'], format='%b %d, %Y, %I:%M %p', errors='coerce')
+    zones = parts['zone'].map(TZ_ABBREVIATIONS).fillna(timezone)
+    result = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns, UTC]')
+    # Positions, not labels, so a non-unique index (concatenated listings) works
+    for zone, rows in zones.groupby(zones).indices.items():
+        result.iloc[rows] = _localize(naive.iloc[rows], zone).array
+    return result
+
+def _parse_iso(text, scraped_at, timezone):
+    result = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns, UTC]')
+    aware = text.str.contains(ISO_OFFSET)
+    if aware.any():
+        result[aware] = pd.to_datetime(text[aware], format='ISO8601', utc=True, errors='coerce')
+    if (~aware).any():
+        result[~aware] = _localize(pd.to_datetime(text[~aware], format='ISO8601', errors='coerce'), timezone)
+    return result
+
+TZINFOS = {abbreviation: dateutil.tz.gettz(zone) for abbreviation, zone in TZ_ABBREVIATIONS.items()}
+
+def _parse_other_value(value, timezone):
+    try:
+        parsed = pd.Timestamp(dateutil.parser.parse(value, tzinfos=TZINFOS))
+    except (ValueError, OverflowError):
+        return pd.NaT
+    if parsed.tzinfo is None:
+        return parsed.tz_localize(timezone, ambiguous=False, nonexistent='shift_forward').tz_convert('UTC')
+    return parsed.tz_convert('UTC')
+
+def _parse_other(text, scraped_at, timezone):
+    # Unknown layouts are rare, these go through dateutil one by one
+    return pd.to_datetime(text.map(lambda value: _parse_other_value(value, timezone)), utc=True)
+
+PARSERS = {
+    'relative': _parse_relative,
+    'clock': _parse_clock,
+    'month_day': _parse_month_day,
+    'weekday_date': _parse_weekday_date,
+    'long_datetime': _parse_long_datetime,
+    'iso': _parse_iso,
+    'other': _parse_other,
+}
+
+def normalize_timestamps(values, scraped_at=None, timezone='UTC'):
+    """
+    Parse the time strings of any source into timezone-aware UTC timestamps.
+
+    Values are classified by format and every class is parsed in bulk with an
+    explicit format. Relative times ('5 min ago'), bare clock times and dates
+    without a year are resolved against the scrape time.
+
+    :param values: Series of time strings (or datetimes).
+    :param scraped_at: When the page was fetched, defaults to now; naive values are taken as UTC.
+    :param timezone: Zone of values that carry none, usually SOURCE_TIMEZONES[source].
+    :return: Series of datetime64[ns, UTC], NaT where a value could not be parsed.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.tz_convert('UTC') if values.dt.tz is not None else _localize(values, timezone)
+    scraped_at = pd.Timestamp.now(tz='UTC') if scraped_at is None else pd.Timestamp(scraped_at)
+    scraped_at = scraped_at.tz_localize('UTC') if scraped_at.tzinfo is None else scraped_at.tz_convert('UTC')
+
+    text = values.astype('string').str.strip().replace('', pd.NA)
+    classes = classify(text)
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+    # Positions, not labels, so a non-unique index (concatenated listings) works
+    for name, rows in classes.groupby(classes).indices.items():
+        if name != 'missing':
+            result.iloc[rows] = PARSERS[name](text.iloc[rows].astype(str), scraped_at, timezone).array
+    return result
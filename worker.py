@@ -0,0 +1,106 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import nullcontext
+
+from utils import jobs, metrics
+from utils.profiling import profile_run
+
+SOURCES = ('cnbc', 'marketinsights', 'stockanalysis', 'renatus')
+PROGRESS_INTERVAL = 5  # Seconds between progress writes while a job stays in stages it already reported
+HEARTBEAT_INTERVAL = 60  # Seconds between heartbeats of a running job, also during long stages such as the model load
+STALE_AFTER = 15 * 60  # Seconds without a heartbeat after which a running job's worker is assumed dead
+
+def progress_reporter(job_id, source):
+    """
+    Metrics progress listener writing the stage a job is in to its progress.
+
+    The first entry into each stage is written at once, later ones at most
+    every PROGRESS_INTERVAL seconds. The time of the write is part of the text,
+    so a long-running job shows fresh times while a stuck one does not.
+    """
+    lock = threading.Lock()
+    reported = {'stages': set(), 'at': 0.0}
+
+    def report(stage):
+        now = time.time()
+        with lock:
+            if stage in reported['stages'] and now - reported['at'] < PROGRESS_INTERVAL:
+                return
+            reported['stages'].add(stage)
+            reported['at'] = now
+        jobs.update_progress(job_id, f"Scraping {source}: {stage} at {time.strftime('%H:%M:%S', time.gmtime(now))} UTC")
+    return report
+
+def run_job(job):
+    """Run one scrape job and publish its snapshot, reporting each stage as its progress."""
+    jobs.update_progress(job['id'], f"Scraping {job['source']}")
+    metrics.set_progress_listener(progress_reporter(job['id'], job['source']))
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            jobs.heartbeat(job['id'])
+
+    heartbeat = threading.Thread(target=beat, daemon=True)
+    heartbeat.start()
+    try:
+        return _run_source(job['source'])
+    finally:
+        stopped.set()
+        metrics.set_progress_listener(None)
+
+def _run_source(source):
+    if source == 'renatus':
+        from utils.renatus import scrape_newsletters
+        saved = scrape_newsletters()
+        return saved[0] if saved else None
+    if source in SOURCES:
+        # Imported here so the transformer model is only loaded by the worker that needs it
+        from utils.pipeline import scrape_and_publish
+        _, snapshot = scrape_and_publish(source)
+        return snapshot
+    raise ValueError(f"Unknown source: {source}")
+
+def work(once=False, poll_interval=10, stale_after=STALE_AFTER, profile=False):
+    """
+    Execute queued scrape jobs until interrupted.
+
+    :param once: Exit when the queue is empty instead of polling.
+    :param poll_interval: Seconds to wait between polls of an empty queue.
+    :param stale_after: Seconds without a heartbeat after which a running job is assumed dead and requeued.
+    :param profile: Write a profile of every job to utils/data/Profiling.
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Worker {worker} started")
+    while True:
+        jobs.requeue_stale(stale_after)
+        job = jobs.claim_next(worker)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        print(f"Running job {job['id']} ({job['source']})")
+        try:
+            with profile_run(f"{job['source']}_job{job['id']}") if profile else nullcontext():
+                snapshot = run_job(job)
+            jobs.finish(job['id'], snapshot)
+            print(f"Job {job['id']} published {snapshot}")
+        except Exception as e:
+            traceback.print_exc()
+            jobs.fail(job['id'], e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run queued scrape jobs outside the Streamlit process.')
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty.')
+    parser.add_argument('--poll-interval', type=float, default=10, help='Seconds between polls of an empty queue.')
+    parser.add_argument('--enqueue', choices=SOURCES, nargs='*', default=[], help='Queue these sources before working.')
+    parser.add_argument('--profile', action='store_true', help='Write cProfile and folded-stack profiles per job to utils/data/Profiling.')
+    args = parser.parse_args()
+    for source in args.enqueue:
+        jobs.enqueue(source)
+    work(once=args.once, poll_interval=args.poll_interval, profile=args.profile)